@@ -1,21 +1,67 @@
-from flask import Blueprint, request, jsonify, send_file
-from models.forecaster import EnergyDemandForecaster
+from flask import Blueprint, Response, request, jsonify, send_file
+from models import persistence
+from models.forecaster import EnergyDemandForecaster, MultiSeriesForecaster, UnknownSeriesError
+from services import serialization
+from services.calendar_features import calendar_cache
+from services.ingestion import AGGREGATIONS, FORMATS, detect_format
+from services.instrumentation import metrics
+from services.training_jobs import (backtest_job, job_manager, train_forecaster_file_job, train_forecaster_job,
+                                    train_series_job)
 import pandas as pd
+import io
 import os
+import shutil
 import tempfile
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
+import threading
 
 forecast_bp = Blueprint('forecast', __name__)
 forecaster = EnergyDemandForecaster()
+series_forecaster = MultiSeriesForecaster()
+metrics.register_cache('forecast', forecaster.forecast_cache.stats)
+metrics.register_cache('plot', forecaster.plot_cache.stats)
+metrics.register_cache('backtest', forecaster.backtest_cache.stats)
+metrics.register_cache('linear_holidays', calendar_cache.stats)
+
+def get_forecaster():
+    """Forecaster of the series_id query parameter, or the default one.
+    Raises UnknownSeriesError for a series without a trained model."""
+    series_id = request.args.get('series_id')
+    if series_id is None:
+        return forecaster
+    return series_forecaster.get(series_id)
+
+def unknown_series_response(e):
+    return jsonify({
+        "success": False,
+        "message": e.args[0]
+    }), 404
 
 @forecast_bp.route('/train', methods=['POST'])
 def train_forecaster():
-    """Endpoint to train or retrain the forecaster"""
+    """Endpoint to start training or retraining the forecaster in the background"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         historical_data = data.get('historical_data')
+        series_data = data.get('series_data')
+        
+        if series_data:
+            # Long format: one row per (series_id, ds, y), one model per series
+            df = pd.DataFrame(series_data)
+            if not {'series_id', 'ds', 'y'}.issubset(df.columns):
+                return jsonify({
+                    "success": False,
+                    "message": "Series data must contain 'series_id', 'ds' (datetime) and 'y' (energy demand) columns"
+                }), 400
+                
+            job_id = job_manager.submit('forecaster_series', train_series_job, (series_forecaster.root, df),
+                                        on_complete=lambda metrics: series_forecaster.evict(metrics.keys()))
+            return jsonify({
+                "success": True,
+                "message": f"Forecaster training started for {df['series_id'].nunique()} series",
+                "job_id": job_id
+            }), 202
         
+        df = None
         if historical_data:
             # Convert to dataframe
             df = pd.DataFrame(historical_data)
@@ -26,42 +72,142 @@ def train_forecaster():
                     "message": "Data must contain 'ds' (datetime) and 'y' (energy demand) columns"
                 }), 400
                 
-            forecaster.train(df)
+        # Predictions keep using the current model until the job installs the new one
+        job_id = job_manager.submit('forecaster', train_forecaster_job, (forecaster.model_dir, df),
+                                    on_complete=lambda version: forecaster.load_model())
+        return jsonify({
+            "success": True,
+            "message": "Forecaster training started with " +
+                       ("provided data" if df is not None else "sample data"),
+            "job_id": job_id
+        }), 202
+            
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error training forecaster: {str(e)}"
+        }), 500
+
+@forecast_bp.route('/train/upload', methods=['POST'])
+def train_forecaster_upload():
+    """Start training from a CSV, NDJSON or Parquet upload, read in chunks"""
+    try:
+        upload = request.files.get('file')
+        stream = upload.stream if upload is not None else request.stream
+        fmt = request.args.get('format') or detect_format(
+            upload.content_type if upload is not None else request.content_type,
+            upload.filename if upload is not None else None)
+        if fmt not in FORMATS:
             return jsonify({
-                "success": True,
-                "message": "Forecaster trained successfully with provided data"
-            }), 200
-        else:
-            # Train with sample data
-            forecaster.train()
+                "success": False,
+                "message": f"Unknown upload format, pass ?format= with one of: {', '.join(FORMATS)}"
+            }), 400
+            
+        agg = request.args.get('agg', default='mean')
+        if agg not in AGGREGATIONS:
             return jsonify({
-                "success": True,
-                "message": "Forecaster trained with sample data"
-            }), 200
+                "success": False,
+                "message": f"agg must be one of: {', '.join(AGGREGATIONS)}"
+            }), 400
             
+        # The training process parses the file from disk, outside the request
+        os.makedirs(job_manager.jobs_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=job_manager.jobs_dir, suffix=f'.{fmt}')
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+            
+        def on_complete(result):
+            if 'series' in result:
+                series_forecaster.evict(result['series'].keys())
+            else:
+                forecaster.load_model()
+                
+        try:
+            job_id = job_manager.submit('forecaster', train_forecaster_file_job,
+                                        (forecaster.model_dir, series_forecaster.root, path, fmt, agg),
+                                        on_complete=on_complete)
+        except BaseException:
+            os.remove(path)
+            raise
+        return jsonify({
+            "success": True,
+            "message": "Forecaster training started from the uploaded file",
+            "job_id": job_id
+        }), 202
+        
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"Error training forecaster: {str(e)}"
         }), 500
 
+@forecast_bp.route('/train/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Get the status and progress (epoch, loss) of a training job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "message": f"Unknown training job {job_id}"
+        }), 404
+        
+    return jsonify({
+        "success": True,
+        "job": job
+    }), 200
+
+@forecast_bp.route('/series', methods=['GET'])
+def list_series():
+    """List the series with a trained model"""
+    return jsonify({
+        "success": True,
+        "series": series_forecaster.series_ids()
+    }), 200
+
 @forecast_bp.route('/predict', methods=['GET'])
 def get_forecast():
     """Get energy demand forecast for future periods"""
     try:
         periods = request.args.get('periods', default=24, type=int)
+        response_format = request.args.get('format', default='records')
+        if response_format not in ('records', 'columnar'):
+            return jsonify({
+                "success": False,
+                "message": "format must be 'records' or 'columnar'"
+            }), 400
         
-        forecast = forecaster.forecast(periods=periods)
-        
-        # Convert to list of dicts for JSON serialization
-        forecast_data = forecast.to_dict('records')
+        forecast = get_forecaster().forecast(periods=periods)
         
-        return jsonify({
-            "success": True,
-            "periods": periods,
-            "forecast": forecast_data
-        }), 200
+        try:
+            forecast = serialization.select_fields(forecast, request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "message": str(e)
+            }), 400
+            
+        with metrics.timer('serialization'):
+            if response_format == 'columnar':
+                # One array per column, encoded straight from the NumPy arrays
+                payload = serialization.dumps({
+                    "success": True,
+                    "periods": periods,
+                    "format": "columnar",
+                    "forecast": serialization.to_columns(forecast)
+                })
+                return Response(payload, status=200, mimetype='application/json')
+            
+            # Convert to list of dicts for JSON serialization
+            forecast_data = forecast.to_dict('records')
+            
+            return jsonify({
+                "success": True,
+                "periods": periods,
+                "forecast": forecast_data
+            }), 200
         
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -72,19 +218,141 @@ def get_forecast():
 def get_metrics():
     """Get performance metrics of the forecasting model"""
     try:
-        metrics = forecaster.get_performance_metrics()
+        metrics = get_forecaster().get_performance_metrics()
         
         return jsonify({
             "success": True,
             "metrics": metrics
         }), 200
         
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"Error getting metrics: {str(e)}"
         }), 500
 
+# Running NeuralProphet backtest jobs of this process, by model directory and settings
+_backtest_jobs = {}
+# Reentrant: a job that is already done runs its on_complete in the submitting thread
+_backtest_jobs_lock = threading.RLock()
+
+@forecast_bp.route('/backtest', methods=['GET'])
+def get_backtest():
+    """Rolling-origin backtest of the forecasting model: MAE, RMSE and MAPE
+    per horizon step, computed once per model version. NeuralProphet
+    backtests run in a background job (202 with its job id)."""
+    try:
+        params = {
+            'horizon': request.args.get('horizon', default=24, type=int),
+            'n_folds': request.args.get('folds', default=5, type=int),
+            'step': request.args.get('step', type=int),
+            'initial': request.args.get('initial', type=int)
+        }
+        target = get_forecaster()
+        
+        try:
+            backtest = target.cached_backtest(**params)
+            if backtest is None and target.snapshot().engine != 'linear':
+                # Refitting NeuralProphet per fold takes longer than a request may
+                return submit_backtest(target, params)
+            if backtest is None:
+                backtest = target.backtest(**params)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "message": str(e)
+            }), 400
+            
+        return jsonify({
+            "success": True,
+            "backtest": backtest
+        }), 200
+        
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error backtesting forecaster: {str(e)}"
+        }), 500
+
+def submit_backtest(target, params):
+    """Start a backtest job, or return the one already running for the same
+    model and settings. Its result is cached once it completes."""
+    key = (target.model_dir, target.snapshot().model_version, tuple(params.values()))
+    with _backtest_jobs_lock:
+        job_id = _backtest_jobs.get(key)
+        job = job_manager.get(job_id) if job_id else None
+        if job is None or job['status'] == 'failed':
+            def on_complete(result):
+                target.cache_backtest(result, **params)
+                with _backtest_jobs_lock:
+                    _backtest_jobs.pop(key, None)
+            
+            job_id = job_manager.submit('forecaster_backtest', backtest_job, (target.model_dir, *params.values()),
+                                        on_complete=on_complete)
+            _backtest_jobs[key] = job_id
+    return jsonify({
+        "success": True,
+        "message": "Backtest started, its result is served here once the job completes",
+        "job_id": job_id
+    }), 202
+
+@forecast_bp.route('/backtest/<job_id>', methods=['GET'])
+def get_backtest_job(job_id):
+    """Get the status and, once completed, the result of a backtest job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "message": f"Unknown backtest job {job_id}"
+        }), 404
+        
+    return jsonify({
+        "success": True,
+        "job": job
+    }), 200
+
+@forecast_bp.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Get hit/miss counters of the forecast cache"""
+    try:
+        series = get_forecaster()
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
+        
+    return jsonify({
+        "success": True,
+        "model_version": series.model_version,
+        "cache": series.forecast_cache.stats(),
+        "plot_cache": series.plot_cache.stats(),
+        "backtest_cache": series.backtest_cache.stats(),
+        "linear_holiday_cache": calendar_cache.stats()
+    }), 200
+
+def plot_response(kind, download_name, periods, include_history=True):
+    """PNG response of a plot with ETag/Last-Modified validators.
+    A request whose validators still match gets a 304 without rendering."""
+    series = get_forecaster()
+    # One snapshot, so the validators and the image describe the same model
+    # version even when a new one is published during the request
+    snapshot = series.snapshot()
+    etag = series.plot_etag(kind, periods, include_history, snapshot=snapshot)
+    last_modified = persistence.version_time(snapshot.model_version)
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+        
+    image = series.render_plot(kind, periods=periods, include_history=include_history, snapshot=snapshot)
+    return send_file(io.BytesIO(image), mimetype='image/png', as_attachment=True,
+                     download_name=download_name, etag=etag, last_modified=last_modified,
+                     conditional=True, max_age=0)
+
 @forecast_bp.route('/plot', methods=['GET'])
 def get_forecast_plot():
     """Get a plot visualization of the energy demand forecast"""
@@ -92,17 +360,10 @@ def get_forecast_plot():
         periods = request.args.get('periods', default=24, type=int)
         include_history = request.args.get('include_history', default='true').lower() == 'true'
         
-        # Create a temporary file for the plot
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            temp_path = tmp.name
-            
-        # Generate and save the plot
-        forecaster.plot_forecast(periods=periods, include_history=include_history, save_path=temp_path)
-        
-        # Send the file
-        return send_file(temp_path, mimetype='image/png', as_attachment=True, 
-                        download_name='energy_forecast.png'), 200
+        return plot_response('forecast', 'energy_forecast.png', periods, include_history)
         
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -115,19 +376,12 @@ def get_components_plot():
     try:
         periods = request.args.get('periods', default=24, type=int)
         
-        # Create a temporary file for the plot
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            temp_path = tmp.name
-            
-        # Generate and save the plot
-        forecaster.plot_components(periods=periods, save_path=temp_path)
-        
-        # Send the file
-        return send_file(temp_path, mimetype='image/png', as_attachment=True, 
-                        download_name='forecast_components.png'), 200
+        return plot_response('components', 'forecast_components.png', periods)
         
+    except UnknownSeriesError as e:
+        return unknown_series_response(e)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"Error generating components plot: {str(e)}"
-        }), 500 
\ No newline at end of file
+        }), 500
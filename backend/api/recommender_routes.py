@@ -1,37 +1,160 @@
 from flask import Blueprint, request, jsonify
+import os
+import shutil
+import tempfile
+import pandas as pd
 from models.recommender import RenewableEnergyRecommender
+from services.instrumentation import metrics
+from services.interactions import AGGREGATIONS, FORMATS, detect_format
+from services.training_jobs import job_manager, train_recommender_file_job, train_recommender_job
 
 recommender_bp = Blueprint('recommender', __name__)
 recommender = RenewableEnergyRecommender()
+metrics.register_cache('recommendation_store', recommender.store_lookups.stats)
+
+# Largest number of results per ID a batch request may ask for
+MAX_BATCH_COUNT = 100
+
+def valid_count(count):
+    """Whether a batch request's count is an integer from 1 to MAX_BATCH_COUNT"""
+    return isinstance(count, int) and not isinstance(count, bool) and 1 <= count <= MAX_BATCH_COUNT
+
+def invalid_count_response():
+    return jsonify({
+        "success": False,
+        "message": f"'count' must be an integer from 1 to {MAX_BATCH_COUNT}"
+    }), 400
 
 @recommender_bp.route('/train', methods=['POST'])
 def train_recommender():
-    """Endpoint to train or retrain the recommender system"""
+    """Endpoint to start training or retraining the recommender system in the background"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         interactions_df = data.get('interactions')
         products_df = data.get('products')
         
         if interactions_df and products_df:
-            recommender.train(interactions_df, products_df)
-            return jsonify({
-                "success": True,
-                "message": "Recommender system trained successfully"
-            }), 200
+            args = (recommender.model_dir, pd.DataFrame(interactions_df), pd.DataFrame(products_df))
+            message = "Recommender training started with provided data"
         else:
             # Train with sample data
-            recommender.train()
+            args = (recommender.model_dir, None, None)
+            message = "Recommender training started with sample data"
+            
+        # Requests keep using the current model until the job installs the new one
+        job_id = job_manager.submit('recommender', train_recommender_job, args,
+                                    on_complete=lambda version: recommender.load_model())
+        return jsonify({
+            "success": True,
+            "message": message,
+            "job_id": job_id
+        }), 202
+            
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error training recommender: {str(e)}"
+        }), 500
+
+@recommender_bp.route('/train/upload', methods=['POST'])
+def train_recommender_upload():
+    """Start training from a CSV, Parquet or NPY interaction file, read in chunks"""
+    try:
+        upload = request.files.get('file')
+        stream = upload.stream if upload is not None else request.stream
+        fmt = request.args.get('format') or detect_format(upload.filename if upload is not None else None)
+        agg = request.args.get('agg', default='sum')
+        if fmt not in FORMATS:
             return jsonify({
-                "success": True,
-                "message": "Recommender system trained with sample data"
-            }), 200
+                "success": False,
+                "message": f"Unknown interaction file format, pass ?format= with one of: {', '.join(FORMATS)}"
+            }), 400
+        if agg not in AGGREGATIONS:
+            return jsonify({
+                "success": False,
+                "message": f"agg must be one of: {', '.join(AGGREGATIONS)}"
+            }), 400
+            
+        products = request.files.get('products')
+        products_df = pd.read_csv(products.stream) if products is not None else None
+        if products_df is not None and 'id' not in products_df.columns:
+            return jsonify({
+                "success": False,
+                "message": "Products must contain an 'id' column"
+            }), 400
             
+        # The training process reads the file from disk in chunks
+        os.makedirs(job_manager.jobs_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=job_manager.jobs_dir, suffix=f'.{fmt}')
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+            
+        try:
+            job_id = job_manager.submit('recommender', train_recommender_file_job,
+                                        (recommender.model_dir, path, fmt, agg, products_df),
+                                        on_complete=lambda version: recommender.load_model())
+        except BaseException:
+            os.remove(path)
+            raise
+        return jsonify({
+            "success": True,
+            "message": "Recommender training started with the uploaded interactions",
+            "job_id": job_id
+        }), 202
+        
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"Error training recommender: {str(e)}"
         }), 500
 
+@recommender_bp.route('/train/<job_id>', methods=['GET'])
+def get_training_job(job_id):
+    """Get the status and progress of a training job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "message": f"Unknown training job {job_id}"
+        }), 404
+        
+    return jsonify({
+        "success": True,
+        "job": job
+    }), 200
+
+@recommender_bp.route('/interactions', methods=['POST'])
+def add_interactions():
+    """Endpoint to add new ratings to the trained recommender without a full retrain"""
+    try:
+        data = request.get_json() or {}
+        interactions = data.get('interactions')
+        products = data.get('products')
+        
+        if not interactions:
+            return jsonify({
+                "success": False,
+                "message": "Body must contain 'interactions' with user_id, product_id and rating"
+            }), 400
+            
+        updated = recommender.add_interactions(interactions, products)
+        return jsonify({
+            "success": True,
+            "message": f"Added {len(interactions)} interactions",
+            "updated_products": updated
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error adding interactions: {str(e)}"
+        }), 500
+
 @recommender_bp.route('/similar/<int:product_id>', methods=['GET'])
 def get_similar_products(product_id):
     """Get products similar to the given product ID"""
@@ -40,11 +163,46 @@ def get_similar_products(product_id):
         
         similar_products = recommender.get_similar_products(product_id, n=count)
         
+        with metrics.timer('serialization'):
+            return jsonify({
+                "success": True,
+                "product_id": product_id,
+                "similar_products": similar_products
+            }), 200
+        
+    except Exception as e:
         return jsonify({
-            "success": True,
-            "product_id": product_id,
-            "similar_products": similar_products
-        }), 200
+            "success": False,
+            "message": f"Error getting similar products: {str(e)}"
+        }), 500
+
+@recommender_bp.route('/similar/batch', methods=['POST'])
+def get_similar_products_batch():
+    """Get products similar to each of the given product IDs"""
+    try:
+        data = request.get_json() or {}
+        product_ids = data.get('product_ids')
+        count = data.get('count', 5)
+        
+        if not isinstance(product_ids, list):
+            return jsonify({
+                "success": False,
+                "message": "Body must contain 'product_ids' as a list of product IDs"
+            }), 400
+            
+        if not valid_count(count):
+            return invalid_count_response()
+            
+        similar_products = recommender.get_similar_products_batch(product_ids, n=count)
+        
+        with metrics.timer('serialization'):
+            return jsonify({
+                "success": True,
+                "results": [
+                    {"product_id": product_id, "similar_products": similar}
+                    for product_id, similar in zip(product_ids, similar_products)
+                ]
+            }), 200
         
     except Exception as e:
         return jsonify({
@@ -60,11 +218,46 @@ def recommend_for_user(user_id):
         
         recommendations = recommender.recommend_for_user(user_id, n=count)
         
+        with metrics.timer('serialization'):
+            return jsonify({
+                "success": True,
+                "user_id": user_id,
+                "recommendations": recommendations
+            }), 200
+        
+    except Exception as e:
         return jsonify({
-            "success": True,
-            "user_id": user_id,
-            "recommendations": recommendations
-        }), 200
+            "success": False,
+            "message": f"Error getting recommendations: {str(e)}"
+        }), 500
+
+@recommender_bp.route('/recommend/users', methods=['POST'])
+def recommend_for_users():
+    """Get product recommendations for each of the given user IDs"""
+    try:
+        data = request.get_json() or {}
+        user_ids = data.get('user_ids')
+        count = data.get('count', 5)
+        
+        if not isinstance(user_ids, list):
+            return jsonify({
+                "success": False,
+                "message": "Body must contain 'user_ids' as a list of user IDs"
+            }), 400
+            
+        if not valid_count(count):
+            return invalid_count_response()
+            
+        recommendations = recommender.recommend_for_users(user_ids, n=count)
+        
+        with metrics.timer('serialization'):
+            return jsonify({
+                "success": True,
+                "results": [
+                    {"user_id": user_id, "recommendations": recs}
+                    for user_id, recs in zip(user_ids, recommendations)
+                ]
+            }), 200
         
     except Exception as e:
         return jsonify({
@@ -1,23 +1,151 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+import gc
+import logging
 import os
+import threading
 
 from api.recommender_routes import recommender_bp
 from api.forecast_routes import forecast_bp
+from services import instrumentation
 
-app = Flask(__name__)
-# Enable CORS for all domains
-CORS(app, resources={r"/api/*": {"origins": "*"}})
+logger = logging.getLogger(__name__)
 
-# Register blueprints
-app.register_blueprint(recommender_bp, url_prefix='/api/recommender')
-app.register_blueprint(forecast_bp, url_prefix='/api/forecast')
+SERVICES = ('recommender', 'forecast')
+
+
+def load_models(services=SERVICES, warm_up=True):
+    """Load the models of the given services.
+
+    With warm_up the forecasting model is deserialized too, which imports
+    NeuralProphet (and torch) and matplotlib. Without it only the
+    forecaster's metadata is read and those are imported by the first
+    request that needs them.
+    """
+    from api import forecast_routes, recommender_routes
+
+    if 'recommender' in services:
+        recommender_routes.recommender.preload()
+    if 'forecast' in services:
+        if warm_up:
+            forecast_routes.forecaster.preload()
+        else:
+            forecast_routes.forecaster.load_model()
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() == 'true'
+
+
+def start_model_loading(app):
+    """Start loading the models of an app created without preloading in a
+    background thread of the calling process, unless loaded or loading.
+
+    Threads do not survive a fork, so a server that forks its workers after
+    creating the app (gunicorn's preload_app) calls this in each worker.
+    """
+    app.extensions['model_loading']()
+
+
+def create_app(preload_models=None, services=None, warm_up=None):
+    """Application factory.
+
+    With preload_models the models are loaded before this returns, which
+    under gunicorn's preload_app happens once in the master process, so the
+    forked workers share them copy-on-write. Otherwise they are loaded in a
+    background thread. /api/health reports ready only once they are loaded.
+    Defaults to the PRELOAD_MODELS environment variable. With
+    LOAD_MODELS_AFTER_FORK (set by gunicorn.conf.py) that thread is not
+    started here but by start_model_loading in each forked worker.
+    
+    services selects the APIs served ('recommender', 'forecast'), e.g. for
+    recommender-only workers that never import the forecasting stack;
+    defaults to the comma-separated API_SERVICES variable, or both.
+    warm_up (WARM_UP, by default on when preloading) imports the
+    forecasting and plotting libraries at startup; see load_models.
+    """
+    if preload_models is None:
+        preload_models = _env_flag('PRELOAD_MODELS', 'false')
+    if services is None:
+        services = [s.strip() for s in os.environ.get('API_SERVICES', ','.join(SERVICES)).split(',') if s.strip()]
+    unknown = set(services) - set(SERVICES)
+    if unknown:
+        raise ValueError(f"Unknown API services {sorted(unknown)}, expected some of {', '.join(SERVICES)}")
+    if warm_up is None:
+        warm_up = _env_flag('WARM_UP', str(preload_models))
+
+    app = Flask(__name__)
+    # Enable CORS for all domains
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+
+    # Register blueprints
+    if 'recommender' in services:
+        app.register_blueprint(recommender_bp, url_prefix='/api/recommender')
+    if 'forecast' in services:
+        app.register_blueprint(forecast_bp, url_prefix='/api/forecast')
+    
+    # Request timing, /api/metrics and sampled profiling of slow requests
+    instrumentation.init_app(app)
+
+    models_ready = threading.Event()
+    load_errors = []
+
+    def load():
+        try:
+            with instrumentation.metrics.timer('startup_load'):
+                load_models(services, warm_up)
+            models_ready.set()
+        except Exception as e:
+            logger.exception("Loading the models failed")
+            load_errors.append(str(e))
+
+    loading_pids = set()
+
+    def start_loading():
+        if models_ready.is_set() or os.getpid() in loading_pids:
+            return
+        loading_pids.add(os.getpid())
+        threading.Thread(target=load, name='load-models', daemon=True).start()
+
+    app.extensions['model_loading'] = start_loading
+
+    if preload_models:
+        load()
+        # Keep the loaded objects out of the collector's scans, which would
+        # otherwise touch (and un-share) their pages in every worker
+        gc.freeze()
+    elif not _env_flag('LOAD_MODELS_AFTER_FORK', 'false'):
+        start_loading()
+
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        if not models_ready.is_set():
+            return jsonify({
+                "status": "failed" if load_errors else "starting",
+                "message": load_errors[0] if load_errors else "Models are loading"
+            }), 503
+        return jsonify({"status": "healthy", "message": "Renewable Energy API is running"}), 200
+
+    return app
+
+
+_app_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # The module-level app of `gunicorn app:app`, `flask run` and
+    # `python app.py`, created on first access so that importing
+    # create_app or start_model_loading does not load the models
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _app_lock:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+    return globals()['app']
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "healthy", "message": "Renewable Energy API is running"}), 200
 
 if __name__ == '__main__':
+    app = __getattr__('app')
     port = int(os.environ.get('PORT', 5000))
     # Use host='0.0.0.0' to make Flask accessible from any address
-    app.run(host='0.0.0.0', port=port, debug=False) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=False)
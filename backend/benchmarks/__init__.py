@@ -0,0 +1,2 @@
+# Benchmarks package initialization
+# Run the scripts from the backend directory, e.g. `python -m benchmarks.recommend_for_user`
@@ -0,0 +1,81 @@
+"""Throughput of the batch recommender endpoints against one call per id.
+
+Requests go through the Flask test client, so routing and JSON encoding are
+included. The batch responses are checked against the single-id responses.
+
+Usage (from the backend directory):
+    python -m benchmarks.batch_recommendations --products 5000 --users 2000 --ids 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from api import recommender_routes
+from benchmarks.synthetic import make_interactions
+from models.recommender import RenewableEnergyRecommender
+
+
+def make_client(recommender):
+    """A test client for an app serving only the recommender blueprint"""
+    recommender_routes.recommender = recommender
+    app = Flask(__name__)
+    app.register_blueprint(recommender_routes.recommender_bp, url_prefix='/api/recommender')
+    return app.test_client()
+
+
+def time_calls(label, fn, n_ids):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms  {n_ids / elapsed:10.0f} ids/s")
+    return result
+
+
+def run(n_products, n_users, ratings_per_user, n_ids, count):
+    interactions, products = make_interactions(n_products, n_users, ratings_per_user)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recommender = RenewableEnergyRecommender()
+        recommender.model_dir = os.path.join(tmp, 'recommender')
+        recommender.store_path = os.path.join(tmp, 'recommendations.bin')
+        recommender.train(interactions, products)
+        client = make_client(recommender)
+
+        user_ids = [int(u) for u in list(recommender.user_mapping.keys())[:n_ids]]
+        product_ids = [int(p) for p in list(recommender.product_mapping.keys())[:n_ids]]
+
+        single_users = time_calls("users, one call per id", lambda: [
+            client.get(f'/api/recommender/recommend/user/{u}?count={count}').get_json()['recommendations']
+            for u in user_ids
+        ], len(user_ids))
+        batch_users = time_calls("users, batch call", lambda: [
+            r['recommendations'] for r in client.post('/api/recommender/recommend/users', json={
+                'user_ids': user_ids, 'count': count
+            }).get_json()['results']
+        ], len(user_ids))
+        assert single_users == batch_users
+
+        single_similar = time_calls("similar, one call per id", lambda: [
+            client.get(f'/api/recommender/similar/{p}?count={count}').get_json()['similar_products']
+            for p in product_ids
+        ], len(product_ids))
+        batch_similar = time_calls("similar, batch call", lambda: [
+            r['similar_products'] for r in client.post('/api/recommender/similar/batch', json={
+                'product_ids': product_ids, 'count': count
+            }).get_json()['results']
+        ], len(product_ids))
+        assert single_similar == batch_similar
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--ids', type=int, default=500)
+    parser.add_argument('--count', type=int, default=5)
+    args = parser.parse_args()
+    run(args.products, args.users, args.ratings_per_user, args.ids, args.count)
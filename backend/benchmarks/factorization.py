@@ -0,0 +1,85 @@
+"""Training time, model size and scoring speed of the recommender engines.
+
+Trains the item-neighbourhood model and every factorization engine on the
+same synthetic ratings, and reports training time, the size of the
+arrays each engine keeps for scoring, users scored per second and the
+RMSE of held-out ratings (the neighbourhood model predicts them from the
+user's ratings of similar products, or 0 without any). ials predicts
+preferences and svd treats unrated products as 0, so their RMSE is not
+on the rating scale and only comparable across runs.
+
+Usage (from the backend directory):
+    python -m benchmarks.factorization --products 5000 --users 50000 --engines neighbors als ials svd
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from benchmarks.synthetic import make_interactions
+from models.factorization import ENGINES, predict_factor_scores, train_factors
+from models.neighbor_search import ExactNeighborSearch
+from models.scoring import predict_user_scores
+
+
+def heldout_rmse(engine, model, train, test_rows, test_cols, test_ratings):
+    if engine == 'neighbors':
+        # Weighted average of the user's ratings of the item's neighbours
+        neighbors = model.transposed
+        rated = train[test_rows]
+        weights = np.asarray(rated.astype(bool).multiply(neighbors[:, test_cols].T).sum(axis=1)).ravel()
+        sums = np.asarray(rated.multiply(neighbors[:, test_cols].T).sum(axis=1)).ravel()
+        predicted = np.divide(sums, weights, out=np.zeros_like(sums), where=weights > 0)
+    else:
+        user_factors, item_factors = model
+        predicted = (user_factors[test_rows] * item_factors[test_cols]).sum(axis=1)
+    return float(np.sqrt(np.mean((predicted - test_ratings) ** 2)))
+
+
+def run(n_products, n_users, ratings_per_user, n_groups, n_factors, engines, n_scored):
+    interactions, _ = make_interactions(n_products, n_users, ratings_per_user, n_groups=n_groups)
+    rows = interactions['user_id'].to_numpy() - 1
+    cols = interactions['product_id'].to_numpy() - 1
+    ratings = interactions['rating'].to_numpy(dtype=np.float32)
+    test = np.random.default_rng(0).random(len(ratings)) < 0.05
+    train = csr_matrix((ratings[~test], (rows[~test], cols[~test])), shape=(n_users, n_products))
+    scored_rows = np.arange(min(n_scored, n_users))
+
+    for engine in engines:
+        start = time.perf_counter()
+        if engine == 'neighbors':
+            model = ExactNeighborSearch().build(train.T.tocsr())
+            size = model.matrix.data.nbytes + model.matrix.indices.nbytes + model.matrix.indptr.nbytes
+        else:
+            model = train_factors(engine, train, n_factors=n_factors)
+            size = model[0].nbytes + model[1].nbytes
+        train_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if engine == 'neighbors':
+            scored = predict_user_scores(model.transposed, train[scored_rows])
+        else:
+            scored = predict_factor_scores(model[0][scored_rows], model[1], train[scored_rows])
+        for _ in scored:
+            pass
+        score_time = time.perf_counter() - start
+
+        rmse = heldout_rmse(engine, model, train, rows[test], cols[test], ratings[test])
+        print(f"{engine:<10} train {train_time:8.2f} s  model {size / 2**20:8.1f} MiB  "
+              f"{len(scored_rows) / score_time:10.0f} users/s  held-out RMSE {rmse:.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=50, help="Taste groups in the synthetic ratings")
+    parser.add_argument('--factors', type=int, default=32)
+    parser.add_argument('--scored-users', type=int, default=2000, help="Users scored to measure throughput")
+    parser.add_argument('--engines', nargs='+', default=['neighbors', *ENGINES],
+                        choices=['neighbors', *ENGINES])
+    args = parser.parse_args()
+    run(args.products, args.users, args.ratings_per_user, args.groups, args.factors, args.engines,
+        args.scored_users)
@@ -0,0 +1,81 @@
+"""Accuracy and speed of the linear forecasting engine against NeuralProphet.
+
+Each engine is trained on synthetic hourly series of several lengths,
+with the last `horizon` hours held out, and reports training time,
+prediction latency and the held-out MAE, RMSE and MAPE. The linear engine
+is also timed fitting many series with one batched solve against fitting
+them one by one. NeuralProphet is skipped when it is not installed.
+
+Usage (from the backend directory):
+    python -m benchmarks.forecast_engines --days 30 365 --horizon 168 --series 1000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_series
+from models.forecaster import ENGINES, EnergyDemandForecaster
+from models.linear_forecaster import LinearForecastModel, fit_many
+
+
+def errors(predicted, actual):
+    residuals = predicted - actual
+    return (float(np.mean(np.abs(residuals))), float(np.sqrt(np.mean(residuals ** 2))),
+            float(np.mean(np.abs(residuals / actual))) * 100)
+
+
+def compare_engines(days, horizon, engines, n_predictions):
+    for n_days in days:
+        series = make_series(24 * n_days)
+        train, test = series.iloc[:-horizon], series.iloc[-horizon:]
+        for engine in engines:
+            with tempfile.TemporaryDirectory() as tmp:
+                forecaster = EnergyDemandForecaster(engine=engine)
+                forecaster.model_dir = tmp
+                start = time.perf_counter()
+                try:
+                    forecaster.train(train)
+                except ImportError as e:
+                    print(f"{engine:<14} skipped: {e}")
+                    continue
+                train_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for _ in range(n_predictions):
+                    forecaster.forecast_cache.invalidate()
+                    forecast = forecaster.forecast(periods=horizon)
+                predict_time = (time.perf_counter() - start) / n_predictions
+
+            mae, rmse, mape = errors(forecast['yhat1'].to_numpy(), test['y'].to_numpy())
+            print(f"{engine:<14} {n_days:5d} days  train {train_time:9.3f} s  predict {predict_time * 1000:8.2f} ms  "
+                  f"MAE {mae:7.2f}  RMSE {rmse:7.2f}  MAPE {mape:6.2f}%")
+
+
+def compare_batching(n_series, n_days):
+    frames = [make_series(24 * n_days, seed=i) for i in range(n_series)]
+
+    start = time.perf_counter()
+    for frame in frames:
+        LinearForecastModel().fit(frame)
+    separate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fit_many([LinearForecastModel() for _ in frames], frames)
+    batched = time.perf_counter() - start
+    print(f"linear fit of {n_series} series x {n_days} days: one by one {separate:.3f} s, "
+          f"batched {batched:.3f} s ({separate / batched:.1f}x faster, {n_series / batched:.0f} series/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365])
+    parser.add_argument('--horizon', type=int, default=168, help="Held-out hours")
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--predictions', type=int, default=20, help="Uncached forecasts timed per model")
+    parser.add_argument('--series', type=int, default=1000, help="Series in the batched fit comparison")
+    parser.add_argument('--series-days', type=int, default=90)
+    args = parser.parse_args()
+    compare_engines(args.days, args.horizon, args.engines, args.predictions)
+    compare_batching(args.series, args.series_days)
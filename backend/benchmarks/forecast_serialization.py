@@ -0,0 +1,67 @@
+"""Payload size and encode time of the forecast response formats.
+
+Compares the records format (to_dict('records') through jsonify) with the
+columnar format, with all columns and with only ds/yhat1, on a frame shaped
+like NeuralProphet's forecast output. The decoded yhat1 values are checked
+to be the same in every format.
+
+Usage (from the backend directory):
+    python -m benchmarks.forecast_serialization --periods 24 720 8760
+"""
+import argparse
+import json
+import time
+
+from flask import Flask, jsonify
+
+from benchmarks.synthetic import make_forecast
+from services import serialization
+
+
+def time_encode(encode, repeat):
+    """Best-of-repeat encode time and the payload"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = encode()
+        best = min(best, time.perf_counter() - start)
+    return best, payload
+
+
+def run(periods_list, repeat):
+    app = Flask(__name__)
+    encoder = 'orjson' if serialization.orjson is not None else 'json'
+    print(f"columnar encoder: {encoder}")
+
+    with app.app_context():
+        for periods in periods_list:
+            forecast = make_forecast(periods)
+            projected = serialization.select_fields(forecast, 'ds,yhat1')
+            formats = {
+                'records': lambda: jsonify({'success': True, 'periods': periods,
+                                            'forecast': forecast.to_dict('records')}).get_data(),
+                'columnar': lambda: serialization.dumps({'success': True, 'periods': periods,
+                                                         'forecast': serialization.to_columns(forecast)}),
+                'columnar ds,yhat1': lambda: serialization.dumps({'success': True, 'periods': periods,
+                                                                  'forecast': serialization.to_columns(projected)}),
+            }
+
+            print(f"\nperiods={periods}")
+            baseline = None
+            for label, encode in formats.items():
+                elapsed, payload = time_encode(encode, repeat)
+                decoded = json.loads(payload)['forecast']
+                yhat = [row['yhat1'] for row in decoded] if label == 'records' else decoded['yhat1']
+                if baseline is None:
+                    baseline = (elapsed, len(payload), yhat)
+                assert yhat == baseline[2]
+                print(f"  {label:<18} {len(payload) / 1024:10.1f} KiB  {elapsed * 1000:9.2f} ms  "
+                      f"({baseline[0] / elapsed:5.1f}x faster, {baseline[1] / len(payload):4.1f}x smaller)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--periods', type=int, nargs='+', default=[24, 720, 8760])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.periods, args.repeat)
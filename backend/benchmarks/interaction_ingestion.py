@@ -0,0 +1,151 @@
+"""Time and peak memory of building the recommender's rating matrix.
+
+Compares the original mapping and matrix build of
+RenewableEnergyRecommender.train (np.unique, dict lookups and list
+comprehensions over a DataFrame) with the vectorized builds of
+services/interactions.py, from the same DataFrame and from CSV, NPY and
+(with pyarrow) Parquet files read in chunks. The synthetic interactions
+contain repeated (user, product) pairs, whose ratings every method sums.
+
+Each method runs in a fresh process. Peak memory is the growth of the
+process's peak resident memory over its size once the input is loaded
+(the DataFrame, or nothing for files). Without /proc (not Linux), the
+peak also counts the parent process's peak, which is kept small by
+writing the input files in a child process.
+
+Usage (from the backend directory):
+    python -m benchmarks.interaction_ingestion --interactions 5000000
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from services.interactions import InteractionMatrix, read_interactions
+
+METHODS = ('loops', 'frame', 'csv', 'npy', 'parquet')
+
+
+def make_files(paths, n_interactions, n_users, n_products, seed=0):
+    """Write random interactions in every format of paths; returns the
+    formats written"""
+    rng = np.random.default_rng(seed)
+    array = np.empty(n_interactions, dtype=[('user_id', np.int64), ('product_id', np.int64),
+                                            ('rating', np.float32)])
+    array['user_id'] = rng.integers(1, n_users + 1, n_interactions) * 7919  # Sparse, unsorted ids
+    array['product_id'] = rng.integers(1, n_products + 1, n_interactions)
+    array['rating'] = rng.integers(1, 6, n_interactions)
+    np.save(paths['npy'], array)
+
+    written = ['npy']
+    for fmt in ('csv', 'parquet'):
+        if fmt in paths:
+            try:
+                getattr(pd.DataFrame(array), f'to_{fmt}')(paths[fmt], index=False)
+                written.append(fmt)
+            except ImportError:
+                pass
+    return written
+
+
+def loop_matrix(interactions_df):
+    """The matrix build train() used before the vectorized ingestion"""
+    user_mapping = {}
+    product_mapping = {}
+    for i, user_id in enumerate(np.unique(interactions_df['user_id'])):
+        user_mapping[user_id] = i
+    for i, product_id in enumerate(np.unique(interactions_df['product_id'])):
+        product_mapping[product_id] = i
+    rows = [user_mapping[user] for user in interactions_df['user_id']]
+    cols = [product_mapping[product] for product in interactions_df['product_id']]
+    ratings = interactions_df['rating'].values
+    return csr_matrix((ratings, (rows, cols)), shape=(len(user_mapping), len(product_mapping)))
+
+
+def _memory_mb(field):
+    """VmRSS or VmHWM (peak) of this process from /proc, or None elsewhere"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def _reset_peak():
+    """Start a new peak resident memory measurement; returns the baseline in MiB"""
+    try:
+        # Linux resets VmHWM to the current resident size
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return _memory_mb('VmRSS')
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb():
+    peak = _memory_mb('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(method, paths):
+    """Build the matrix with one method in this (fresh) process"""
+    interactions_df = pd.DataFrame(np.load(paths['npy'])) if method in ('loops', 'frame') else None
+    baseline = _reset_peak()
+
+    start = time.perf_counter()
+    if method == 'loops':
+        matrix = loop_matrix(interactions_df)
+    elif method == 'frame':
+        matrix = InteractionMatrix.from_frame(interactions_df).matrix
+    else:
+        matrix = read_interactions(paths[method])[0].matrix
+    seconds = time.perf_counter() - start
+
+    matrix.sum_duplicates()
+    return seconds, _peak_rss_mb() - baseline, matrix.nnz, float(matrix.sum())
+
+
+def run(n_interactions, n_users, n_products, methods):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {fmt: os.path.join(tmp, f'interactions.{fmt}') for fmt in ('npy', 'csv', 'parquet')
+                 if fmt == 'npy' or fmt in methods}
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            written = executor.submit(make_files, paths, n_interactions, n_users, n_products).result()
+        if 'parquet' in methods and 'parquet' not in written:
+            print("parquet skipped: requires pyarrow")
+            methods = [method for method in methods if method != 'parquet']
+
+        print(f"{n_interactions} interactions, {n_users} users, {n_products} products")
+        reference = None
+        for method in methods:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                seconds, peak_mb, nnz, total = executor.submit(measure, method, paths).result()
+            reference = reference or (nnz, total)
+            same = (nnz, total) == reference
+            print(f"{method:<8} {seconds:8.2f} s  peak +{peak_mb:8.0f} MiB  {n_interactions / seconds:12.0f} rows/s  "
+                  f"{nnz} pairs{'' if same else '  MISMATCH'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interactions', type=int, default=5_000_000)
+    parser.add_argument('--users', type=int, default=500_000)
+    parser.add_argument('--products', type=int, default=20_000)
+    parser.add_argument('--methods', nargs='+', default=list(METHODS), choices=METHODS)
+    args = parser.parse_args()
+    run(args.interactions, args.users, args.products, args.methods)
@@ -0,0 +1,126 @@
+"""Cold-start load time and memory of the saved recommender formats.
+
+Each format is loaded in a fresh Python process, which reports the time to
+load the model, the time to answer a first similar-products query and the
+growth of its resident memory over the imports alone.
+
+Formats compared:
+    dense-pickle   joblib pickle with a dense items x items similarity DataFrame
+    sparse-pickle  joblib pickle of the same components as the versioned format
+    versioned      models/persistence.py directory with memory-mapped arrays
+
+Usage (from the backend directory):
+    python -m benchmarks.model_load --products 5000 --users 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from benchmarks.synthetic import make_interactions
+from models.recommender import RenewableEnergyRecommender
+
+CHILD = r'''
+import json, os, resource, sys, time
+import joblib, numpy as np, pandas as pd
+from models.recommender import RenewableEnergyRecommender
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+fmt, path, product_id = sys.argv[1], sys.argv[2], int(sys.argv[3])
+base_rss = rss_mb()
+
+start = time.perf_counter()
+if fmt == 'versioned':
+    recommender = RenewableEnergyRecommender()
+    recommender.model_dir = path
+    recommender.load_model()
+    query = lambda: recommender.get_similar_products(product_id)
+else:
+    model_data = joblib.load(path)
+    if fmt == 'dense-pickle':
+        similarity = model_data['similarity_matrix']
+        query = lambda: similarity.loc[product_id].sort_values(ascending=False)[1:6]
+    else:
+        neighbors = model_data['neighbor_index']
+        mapping = model_data['product_mapping']
+        query = lambda: neighbors[mapping[product_id]]
+load_time = time.perf_counter() - start
+
+start = time.perf_counter()
+query()
+query_time = time.perf_counter() - start
+
+print(json.dumps({'load_s': load_time, 'first_query_s': query_time,
+                  'rss_mb': rss_mb() - base_rss}))
+'''
+
+
+def measure(fmt, path, product_id):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', CHILD, fmt, path, str(product_id)],
+                            cwd=backend_dir, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(n_products, n_users, ratings_per_user, dense):
+    interactions, products = make_interactions(n_products, n_users, ratings_per_user)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recommender = RenewableEnergyRecommender()
+        recommender.model_dir = os.path.join(tmp, 'recommender')
+        recommender.store_path = os.path.join(tmp, 'recommendations.bin')
+        recommender.train(interactions, products)
+
+        model_data = {
+            'user_item_matrix': recommender.user_item_matrix,
+            'products': recommender.products,
+            'user_mapping': recommender.user_mapping,
+            'product_mapping': recommender.product_mapping,
+            'item_norms_sq': recommender.item_norms_sq,
+            'neighbor_index': recommender.neighbor_index.matrix
+        }
+        paths = {'versioned': recommender.model_dir}
+        paths['sparse-pickle'] = os.path.join(tmp, 'sparse.pkl')
+        joblib.dump(model_data, paths['sparse-pickle'])
+
+        if dense:
+            product_ids = list(recommender.product_mapping.keys())
+            model_data['similarity_matrix'] = pd.DataFrame(
+                cosine_similarity(recommender.user_item_matrix.T),
+                index=product_ids, columns=product_ids)
+            del model_data['neighbor_index']
+            paths['dense-pickle'] = os.path.join(tmp, 'dense.pkl')
+            joblib.dump(model_data, paths['dense-pickle'])
+            del model_data
+
+        product_id = int(recommender.product_ids[0])
+        for fmt in ('dense-pickle', 'sparse-pickle', 'versioned'):
+            if fmt not in paths:
+                continue
+            result = measure(fmt, paths[fmt], product_id)
+            print(f"{fmt:<14} load {result['load_s'] * 1000:9.1f} ms  "
+                  f"first query {result['first_query_s'] * 1000:8.1f} ms  "
+                  f"RSS +{result['rss_mb']:8.1f} MB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--no-dense', dest='dense', action='store_false',
+                        help="Skip the dense similarity pickle (it needs items^2 memory)")
+    args = parser.parse_args()
+    run(args.products, args.users, args.ratings_per_user, args.dense)
@@ -0,0 +1,74 @@
+"""Recall and speed of the approximate neighbour search against the exact one.
+
+Builds the item index with the exact backend and with the ivf backend at
+several n_probe settings, and reports build time, items searched per
+second and recall@k (the share of each item's exact top k that the
+approximate index also returns).
+
+Usage (from the backend directory):
+    python -m benchmarks.neighbor_search --products 20000 --users 50000 --probes 1 2 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from benchmarks.synthetic import make_interactions
+from models.neighbor_search import ExactNeighborSearch, IVFNeighborSearch
+
+
+def recall_at_k(exact, approximate, k):
+    """Mean share of each item's exact top k found in the approximate top k"""
+    expected, found = _top_k_pairs(exact, k), _top_k_pairs(approximate, k)
+    if not len(expected):
+        return 1.0
+    return np.isin(expected, found).sum() / len(expected)
+
+
+def _top_k_pairs(index, k):
+    """The first k neighbours of every item, encoded as item * n + neighbour"""
+    indptr = index.matrix.indptr
+    counts = np.minimum(np.diff(indptr), k)
+    rows = np.repeat(np.arange(index.n_items), counts)
+    positions = np.repeat(indptr[:-1], counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    return rows.astype(np.int64) * index.n_items + index.matrix.indices[positions]
+
+
+def timed_build(search, item_user_matrix, n_neighbors):
+    start = time.perf_counter()
+    index = search.build(item_user_matrix, n_neighbors=n_neighbors)
+    return index, time.perf_counter() - start
+
+
+def run(n_products, n_users, ratings_per_user, n_groups, n_neighbors, k, probes, n_lists):
+    interactions, _ = make_interactions(n_products, n_users, ratings_per_user, n_groups=n_groups)
+    item_user_matrix = csr_matrix(
+        (interactions['rating'].to_numpy(dtype=np.float32),
+         (interactions['product_id'].to_numpy() - 1, interactions['user_id'].to_numpy() - 1)),
+        shape=(n_products, n_users))
+
+    exact, exact_time = timed_build(ExactNeighborSearch(), item_user_matrix, n_neighbors)
+    print(f"{'exact':<22} build {exact_time:8.2f} s  {n_products / exact_time:10.0f} items/s  recall@{k} 1.000")
+
+    for n_probe in probes:
+        search = IVFNeighborSearch(n_lists=n_lists, n_probe=n_probe)
+        index, build_time = timed_build(search, item_user_matrix, n_neighbors)
+        print(f"{f'ivf n_probe={n_probe}':<22} build {build_time:8.2f} s  "
+              f"{n_products / build_time:10.0f} items/s  recall@{k} {recall_at_k(exact, index, k):.3f}  "
+              f"({exact_time / build_time:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=50, help="Taste groups in the synthetic ratings")
+    parser.add_argument('--neighbors', type=int, default=100, help="Neighbours kept per product")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--lists', type=int, default=None, help="IVF clusters (default: sqrt(products))")
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    run(args.products, args.users, args.ratings_per_user, args.groups, args.neighbors, args.k,
+        args.probes, args.lists)
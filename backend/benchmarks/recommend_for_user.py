@@ -0,0 +1,94 @@
+"""Compare the vectorized recommend_for_user against the original per-item loop.
+
+The recommender keeps every neighbour here, so both must predict the same
+ratings (up to float32 rounding in the neighbourhood index).
+
+Usage (from the backend directory):
+    python -m benchmarks.recommend_for_user --sizes 250 500 1000 --queries 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from benchmarks.synthetic import make_interactions
+from models.recommender import RenewableEnergyRecommender
+
+
+def dense_similarity(recommender):
+    """The dense items x items similarity DataFrame the recommender used to keep"""
+    item_similarity = cosine_similarity(recommender.user_item_matrix.T)
+    return pd.DataFrame(item_similarity,
+                        index=list(recommender.product_mapping.keys()),
+                        columns=list(recommender.product_mapping.keys()))
+
+
+def legacy_recommend_for_user(recommender, similarity_matrix, user_id, n=5):
+    """The original O(items^2) implementation, kept as the reference"""
+    user_idx = recommender.user_mapping[user_id]
+    user_ratings = recommender.user_item_matrix[user_idx].toarray().flatten()
+
+    unrated_products = [pid for pid, idx in recommender.product_mapping.items()
+                        if user_ratings[idx] == 0]
+
+    predicted_ratings = {}
+    for pid in unrated_products:
+        similar_scores = similarity_matrix.loc[pid]
+        weighted_sum = 0
+        total_weight = 0
+
+        for other_pid, idx in recommender.product_mapping.items():
+            if user_ratings[idx] > 0:
+                weight = similar_scores[other_pid]
+                weighted_sum += weight * user_ratings[idx]
+                total_weight += abs(weight)
+
+        if total_weight > 0:
+            predicted_ratings[pid] = weighted_sum / total_weight
+
+    top_products = sorted(predicted_ratings.items(), key=lambda x: x[1], reverse=True)[:n]
+    return [(pid, float(rating)) for pid, rating in top_products]
+
+
+def run(sizes, n_users, ratings_per_user, n_queries, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_products in sizes:
+            interactions, products = make_interactions(n_products, n_users, ratings_per_user)
+
+            recommender = RenewableEnergyRecommender(n_neighbors=n_products)
+            recommender.model_dir = os.path.join(tmp, 'recommender')
+            recommender.store_path = os.path.join(tmp, 'recommendations.bin')
+            recommender.train(interactions, products)
+            similarity_matrix = dense_similarity(recommender)
+            users = list(recommender.user_mapping.keys())[:n_queries]
+
+            start = time.perf_counter()
+            legacy = [legacy_recommend_for_user(recommender, similarity_matrix, u, n) for u in users]
+            legacy_time = (time.perf_counter() - start) / len(users)
+
+            start = time.perf_counter()
+            fast = [recommender.recommend_for_user(u, n) for u in users]
+            fast_time = (time.perf_counter() - start) / len(users)
+
+            for expected, got in zip(legacy, fast):
+                # Near-equal ratings may swap places, so compare the ranked ratings
+                assert np.allclose([r for _, r in expected], [p['predicted_rating'] for p in got],
+                                   rtol=1e-5)
+
+            print(f"{n_products:>7} products  legacy {legacy_time * 1000:10.2f} ms/user  "
+                  f"vectorized {fast_time * 1000:8.2f} ms/user  speedup {legacy_time / fast_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=10)
+    parser.add_argument('--ratings-per-user', type=int, default=20)
+    parser.add_argument('--count', type=int, default=5)
+    args = parser.parse_args()
+    run(args.sizes, args.users, args.ratings_per_user, args.queries, args.count)
@@ -0,0 +1,117 @@
+"""Startup time and memory of the API with and without the forecasting stack.
+
+Each configuration starts in a fresh Python process, which reports the
+time and resident memory after importing the app, after create_app (with
+the models preloaded) and after a first recommender request, and which of
+the heavy libraries (NeuralProphet, torch, matplotlib) were imported.
+
+Configurations:
+    recommender  API_SERVICES=recommender, as run by recommender-only workers
+    lazy         both APIs, forecasting and plotting imported on first use
+    warm         both APIs, forecasting model and libraries loaded at startup
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --products 2000 --users 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import make_interactions, make_series
+from models.recommender import RenewableEnergyRecommender
+
+CHILD = r'''
+import json, os, resource, sys, time
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+config, recommender_dir, forecaster_dir, user_id = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+result = {'base_rss_mb': rss_mb()}
+
+start = time.perf_counter()
+import app
+result['import_s'] = time.perf_counter() - start
+result['import_rss_mb'] = rss_mb()
+
+from api import forecast_routes, recommender_routes
+recommender_routes.recommender.model_dir = recommender_dir
+recommender_routes.recommender.store_path = os.path.join(recommender_dir, 'recommendations.bin')
+forecast_routes.forecaster.model_dir = forecaster_dir
+
+services = ['recommender'] if config == 'recommender' else ['recommender', 'forecast']
+start = time.perf_counter()
+flask_app = app.create_app(preload_models=True, services=services, warm_up=config == 'warm')
+result['create_app_s'] = time.perf_counter() - start
+result['ready_rss_mb'] = rss_mb()
+
+client = flask_app.test_client()
+result['health_status'] = client.get('/api/health').status_code
+start = time.perf_counter()
+client.get(f'/api/recommender/recommend/user/{user_id}')
+result['first_request_s'] = time.perf_counter() - start
+result['first_request_rss_mb'] = rss_mb()
+result['heavy_modules'] = sorted(m for m in ('neuralprophet', 'torch', 'matplotlib', 'tensorflow') if m in sys.modules)
+print(json.dumps(result))
+'''
+
+
+def measure(config, recommender_dir, forecaster_dir, user_id):
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run([sys.executable, '-c', CHILD, config, recommender_dir, forecaster_dir, str(user_id)],
+                               cwd=backend_dir, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run(n_products, n_users, ratings_per_user, configs):
+    interactions, products = make_interactions(n_products, n_users, ratings_per_user)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recommender = RenewableEnergyRecommender()
+        recommender.model_dir = os.path.join(tmp, 'recommender')
+        recommender.store_path = os.path.join(recommender.model_dir, 'recommendations.bin')
+        recommender.train(interactions, products)
+
+        forecaster_dir = os.path.join(tmp, 'forecaster')
+        if 'warm' in configs:
+            try:
+                from models.forecaster import EnergyDemandForecaster
+                forecaster = EnergyDemandForecaster()
+                forecaster.model_dir = forecaster_dir
+                forecaster.train(make_series(24 * 60))
+            except ImportError as e:
+                print(f"warm configuration skipped: {e}")
+                configs = [c for c in configs if c != 'warm']
+
+        user_id = int(interactions['user_id'].iloc[0])
+        for config in configs:
+            result = measure(config, recommender.model_dir, forecaster_dir, user_id)
+            if 'error' in result:
+                print(f"{config:<12} failed: {result['error']}")
+                continue
+            print(f"{config:<12} import {result['import_s'] * 1000:8.0f} ms  "
+                  f"ready {result['create_app_s'] * 1000:8.0f} ms  "
+                  f"first request {result['first_request_s'] * 1000:7.1f} ms  "
+                  f"RSS {result['import_rss_mb']:7.1f} / {result['ready_rss_mb']:7.1f} / "
+                  f"{result['first_request_rss_mb']:7.1f} MB  "
+                  f"heavy: {', '.join(result['heavy_modules']) or 'none'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--ratings-per-user', type=int, default=10)
+    parser.add_argument('--configs', nargs='+', default=['recommender', 'lazy', 'warm'],
+                        choices=['recommender', 'lazy', 'warm'])
+    args = parser.parse_args()
+    run(args.products, args.users, args.ratings_per_user, args.configs)
@@ -0,0 +1,296 @@
+"""Benchmark suite for the recommender and forecaster hot paths.
+
+Runs every benchmark at several scales of synthetic data and writes wall
+time, peak RSS and throughput to JSON, to compare a change against a
+baseline run. Each (benchmark, scale) case runs in a fresh process, so
+its peak RSS (which includes generating its data and training the model
+it queries) is its own.
+
+Recommender scales (interactions = users * ratings per user):
+    small    100 products        1k interactions
+    medium   1k products        50k interactions
+    large    10k products      200k interactions
+    xlarge   100k products       1M interactions
+
+Forecaster scales are hourly series of 30 days and 1, 3 and 5 years. The
+forecaster benchmarks use the NumPy linear engine by default, so they run
+anywhere; --forecaster-engine neuralprophet measures NeuralProphet
+instead (recorded as skipped when it is not installed).
+
+Usage (from the backend directory):
+    python -m benchmarks.suite --scales small medium --output baseline.json
+    python -m benchmarks.suite --scales small medium --output new.json --compare baseline.json
+    python -m benchmarks.suite --benchmarks forecast --forecaster-engine neuralprophet
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+RECOMMENDER_SCALES = {
+    'small': {'n_products': 100, 'n_users': 200, 'ratings_per_user': 5},
+    'medium': {'n_products': 1_000, 'n_users': 5_000, 'ratings_per_user': 10},
+    'large': {'n_products': 10_000, 'n_users': 20_000, 'ratings_per_user': 10},
+    'xlarge': {'n_products': 100_000, 'n_users': 50_000, 'ratings_per_user': 20},
+}
+
+FORECASTER_SCALES = {
+    'small': {'hours': 24 * 30},
+    'medium': {'hours': 24 * 365},
+    'large': {'hours': 24 * 365 * 3},
+    'xlarge': {'hours': 24 * 365 * 5},
+}
+
+
+def _recommender_case(tmp, scale):
+    """An untrained recommender saving under tmp, with the scale's data"""
+    from benchmarks.synthetic import make_interactions
+    from models.recommender import RenewableEnergyRecommender
+
+    interactions, products = make_interactions(**RECOMMENDER_SCALES[scale], n_groups=20)
+    recommender = RenewableEnergyRecommender()
+    recommender.model_dir = os.path.join(tmp, 'recommender')
+    recommender.store_path = os.path.join(tmp, 'recommendations.bin')
+    return recommender, interactions, products
+
+
+def _forecaster_case(tmp, scale, engine):
+    """An untrained forecaster of the engine saving under tmp, with the scale's series"""
+    from benchmarks.synthetic import make_series
+    from models.forecaster import EnergyDemandForecaster
+
+    forecaster = EnergyDemandForecaster(engine=engine)
+    forecaster.model_dir = os.path.join(tmp, 'forecaster')
+    return forecaster, make_series(**FORECASTER_SCALES[scale])
+
+
+def _sample(ids, n, seed=0):
+    return np.random.default_rng(seed).choice(ids, min(n, len(ids)), replace=False).tolist()
+
+
+def bench_recommender_train(tmp, scale, n_calls):
+    recommender, interactions, products = _recommender_case(tmp, scale)
+    start = time.perf_counter()
+    recommender.train(interactions, products)
+    return time.perf_counter() - start, len(interactions), 'interactions'
+
+
+def bench_recommend_for_user(tmp, scale, n_calls):
+    recommender, interactions, products = _recommender_case(tmp, scale)
+    recommender.train(interactions, products)
+    users = _sample(interactions['user_id'].unique(), n_calls)
+    start = time.perf_counter()
+    for user_id in users:
+        recommender.recommend_for_user(user_id, n=10)
+    return time.perf_counter() - start, len(users), 'requests'
+
+
+def bench_get_similar_products(tmp, scale, n_calls):
+    recommender, interactions, products = _recommender_case(tmp, scale)
+    recommender.train(interactions, products)
+    product_ids = _sample(products['id'].to_numpy(), n_calls)
+    start = time.perf_counter()
+    for product_id in product_ids:
+        recommender.get_similar_products(product_id, n=10)
+    return time.perf_counter() - start, len(product_ids), 'requests'
+
+
+def bench_recommender_endpoints(tmp, scale, n_calls):
+    from benchmarks.batch_recommendations import make_client
+
+    recommender, interactions, products = _recommender_case(tmp, scale)
+    recommender.train(interactions, products)
+    client = make_client(recommender)
+    users = _sample(interactions['user_id'].unique(), n_calls // 2)
+    product_ids = _sample(products['id'].to_numpy(), n_calls // 2)
+    start = time.perf_counter()
+    for user_id in users:
+        _check(client.get(f'/api/recommender/recommend/user/{user_id}?count=10'))
+    for product_id in product_ids:
+        _check(client.get(f'/api/recommender/similar/{product_id}?count=10'))
+    return time.perf_counter() - start, len(users) + len(product_ids), 'requests'
+
+
+def bench_forecaster_train(tmp, scale, n_calls, engine):
+    forecaster, series = _forecaster_case(tmp, scale, engine)
+    start = time.perf_counter()
+    forecaster.train(series)
+    return time.perf_counter() - start, len(series), 'periods'
+
+
+def bench_forecast(tmp, scale, n_calls, engine):
+    forecaster, series = _forecaster_case(tmp, scale, engine)
+    forecaster.train(series)
+    # Uncached forecasts, so every call predicts
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        forecaster.forecast_cache.invalidate()
+        forecaster.forecast(periods=24)
+    return time.perf_counter() - start, n_calls, 'requests'
+
+
+def bench_forecast_endpoints(tmp, scale, n_calls, engine):
+    from flask import Flask
+
+    from api import forecast_routes
+
+    forecaster, series = _forecaster_case(tmp, scale, engine)
+    forecaster.train(series)
+    forecast_routes.forecaster = forecaster
+    app = Flask(__name__)
+    app.register_blueprint(forecast_routes.forecast_bp, url_prefix='/api/forecast')
+    client = app.test_client()
+    # Mixed horizons; repeated ones are served from the forecast cache
+    horizons = [24, 48, 168, 24 * 7 * 2]
+    start = time.perf_counter()
+    for i in range(n_calls):
+        _check(client.get(f'/api/forecast/predict?periods={horizons[i % len(horizons)]}'))
+    return time.perf_counter() - start, n_calls, 'requests'
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+
+BENCHMARKS = {
+    'recommender_train': bench_recommender_train,
+    'recommend_for_user': bench_recommend_for_user,
+    'get_similar_products': bench_get_similar_products,
+    'recommender_endpoints': bench_recommender_endpoints,
+    'forecaster_train': bench_forecaster_train,
+    'forecast': bench_forecast,
+    'forecast_endpoints': bench_forecast_endpoints,
+}
+
+FORECASTER_BENCHMARKS = {'forecaster_train', 'forecast', 'forecast_endpoints'}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(name, scale, n_calls, forecaster_engine='linear'):
+    """Run one benchmark in this (fresh) process and return its result"""
+    options = {'engine': forecaster_engine} if name in FORECASTER_BENCHMARKS else {}
+    params = {**FORECASTER_SCALES[scale], **options} if options else RECOMMENDER_SCALES[scale]
+    with tempfile.TemporaryDirectory() as tmp:
+        seconds, ops, unit = BENCHMARKS[name](tmp, scale, n_calls, **options)
+    return {
+        'benchmark': name,
+        'scale': scale,
+        'params': params,
+        'wall_time_s': seconds,
+        'ops': ops,
+        'unit': unit,
+        'throughput_per_s': ops / seconds if seconds else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_isolated(name, scale, n_calls, forecaster_engine='linear'):
+    """Run a case in a spawned process; a case that fails is recorded with its error"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        try:
+            return executor.submit(run_case, name, scale, n_calls, forecaster_engine).result()
+        except ImportError as e:
+            return {'benchmark': name, 'scale': scale, 'skipped': str(e)}
+        except Exception as e:
+            return {'benchmark': name, 'scale': scale, 'error': f"{type(e).__name__}: {e}"}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Cases whose wall time or peak RSS grew by more than tolerance over
+    the baseline, as printable lines. Cases run with different parameters
+    (e.g. another forecaster engine) are not compared."""
+    previous = {(r['benchmark'], r['scale']): r for r in baseline['results'] if 'wall_time_s' in r}
+    regressions = []
+    for result in results:
+        before = previous.get((result['benchmark'], result['scale']))
+        if before is None or 'wall_time_s' not in result or before.get('params') != result['params']:
+            continue
+        for field in ('wall_time_s', 'peak_rss_mb'):
+            if result[field] > before[field] * (1 + tolerance):
+                regressions.append(f"{result['benchmark']} [{result['scale']}] {field}: "
+                                   f"{before[field]:.3f} -> {result[field]:.3f} "
+                                   f"(+{result[field] / before[field] - 1:.0%})")
+    return regressions
+
+
+def run(benchmarks, scales, n_calls, output, baseline_path, tolerance, forecaster_engine='linear'):
+    results = []
+    for name in benchmarks:
+        for scale in scales:
+            result = run_isolated(name, scale, n_calls, forecaster_engine)
+            results.append(result)
+            if 'wall_time_s' in result:
+                print(f"{name:<24} {scale:<7} {result['wall_time_s']:9.3f} s  "
+                      f"{result['throughput_per_s']:12.1f} {result['unit']}/s  "
+                      f"peak RSS {result['peak_rss_mb']:8.1f} MB")
+            else:
+                print(f"{name:<24} {scale:<7} {'skipped' if 'skipped' in result else 'failed'}: "
+                      f"{result.get('skipped') or result.get('error')}")
+            if result.get('skipped') and name in FORECASTER_BENCHMARKS:
+                break
+
+    report = {'environment': environment(), 'n_calls': n_calls, 'forecaster_engine': forecaster_engine,
+              'results': results}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions over {tolerance:.0%} against {baseline_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--benchmarks', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--scales', nargs='+', default=['small', 'medium', 'large'],
+                        choices=list(RECOMMENDER_SCALES))
+    parser.add_argument('--calls', type=int, default=200, help="Requests timed per throughput benchmark")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file for the results")
+    parser.add_argument('--compare', dest='baseline', help="Baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed growth of wall time and peak RSS over the baseline")
+    parser.add_argument('--forecaster-engine', default='linear', choices=['linear', 'neuralprophet'],
+                        help="Engine of the forecaster benchmarks")
+    args = parser.parse_args()
+    sys.exit(run(args.benchmarks, args.scales, args.calls, args.output, args.baseline, args.tolerance,
+                 args.forecaster_engine))
@@ -0,0 +1,78 @@
+"""Synthetic data generators shared by the benchmark scripts"""
+import numpy as np
+import pandas as pd
+
+
+def make_interactions(n_products, n_users, ratings_per_user, seed=0, n_groups=None):
+    """Build a random catalogue and rating set of the requested size.
+
+    With n_groups, products and users are split into taste groups and each
+    user draws most of their ratings from their own group's products, which
+    gives the ratings the cluster structure of real catalogues.
+    """
+    rng = np.random.default_rng(seed)
+    products = pd.DataFrame({
+        'id': np.arange(1, n_products + 1),
+        'name': [f"Product {i}" for i in range(1, n_products + 1)],
+        'category': rng.choice(['solar', 'wind', 'storage', 'efficiency', 'hydro'], n_products),
+        'efficiency': rng.uniform(0.2, 1.0, n_products).round(2),
+        'price': rng.integers(20, 5000, n_products),
+    })
+
+    user_ids = np.repeat(np.arange(1, n_users + 1), ratings_per_user)
+    if n_groups:
+        product_ids = np.concatenate([
+            _grouped_choice(rng, n_products, n_groups, ratings_per_user) + 1 for _ in range(n_users)
+        ])
+    else:
+        product_ids = np.concatenate([
+            rng.choice(n_products, ratings_per_user, replace=False) + 1 for _ in range(n_users)
+        ])
+    interactions = pd.DataFrame({
+        'user_id': user_ids,
+        'product_id': product_ids,
+        'rating': rng.integers(1, 6, len(user_ids)),
+    })
+    return interactions, products
+
+
+def _grouped_choice(rng, n_products, n_groups, size, in_group=0.8):
+    """Distinct products, in_group of them from one random taste group"""
+    group = rng.integers(n_groups)
+    members = np.arange(group, n_products, n_groups)
+    own = rng.choice(members, min(int(size * in_group), len(members)), replace=False)
+    # Draw the rest from the whole catalogue, skipping products already drawn
+    others = rng.choice(n_products, size, replace=False)
+    others = others[~np.isin(others, own)][:size - len(own)]
+    if len(others) < size - len(own):
+        others = rng.choice(np.setdiff1d(np.arange(n_products), own), size - len(own), replace=False)
+    return np.concatenate([own, others])
+
+def make_forecast(periods, seed=0):
+    """A frame shaped like NeuralProphet's predict() output for future periods"""
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range('2024-01-01', periods=periods, freq='h')
+    hours = np.arange(periods)
+    components = {
+        'trend': 100 + 0.01 * hours,
+        'season_yearly': 10 * np.sin(2 * np.pi * hours / 8766),
+        'season_weekly': 20 * np.sin(2 * np.pi * hours / 168),
+        'season_daily': 30 * np.sin(2 * np.pi * hours / 24),
+    }
+    forecast = pd.DataFrame({'ds': ds, 'y': np.nan})
+    forecast['yhat1'] = sum(components.values()) + rng.normal(0, 1, periods)
+    for name, values in components.items():
+        forecast[name] = values
+    return forecast
+
+
+def make_series(hours, seed=0, start='2023-01-01'):
+    """An hourly demand series (ds, y) with daily and weekly seasonality"""
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range(start, periods=hours, freq='h')
+    t = np.arange(hours)
+    y = (100 + 0.002 * t
+         + 30 * np.sin(2 * np.pi * (t % 24 - 6) / 24)
+         + 15 * (ds.dayofweek < 5)
+         + rng.normal(0, 5, hours))
+    return pd.DataFrame({'ds': ds, 'y': y})
@@ -0,0 +1,41 @@
+"""gunicorn settings for production serving.
+
+    gunicorn --config gunicorn.conf.py app:app
+
+The app is created (and both models loaded) once in the master process
+before the workers are forked, so they share the loaded models
+copy-on-write instead of each loading its own copy. "app:create_app()"
+preloads the same way (PRELOAD_MODELS defaults to true here). An app
+created with preload_models=False loads its models in each worker after the fork
+(post_fork below), as a loading thread started in the master would not
+be carried into the workers.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+preload_app = True
+
+os.environ.setdefault('PRELOAD_MODELS', 'true')
+os.environ['LOAD_MODELS_AFTER_FORK'] = 'true'
+
+
+def post_fork(server, worker):
+    from app import start_model_loading
+
+    start_model_loading(worker.app.wsgi())
+
+# Processes, each serving `threads` requests concurrently
+workers = int(os.environ.get('GUNICORN_WORKERS', min(multiprocessing.cpu_count(), 4)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Training runs in background jobs, so requests only need the default timeout
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,39 @@
+class ProductCatalog:
+    """Precomputed product lookups used to build recommender responses.
+
+    Product rows are serialized to dicts once, so looking a product up by id
+    or listing a category's best products is constant time per result
+    instead of a scan of the products DataFrame.
+    """
+
+    def __init__(self, products):
+        self.records = products.to_dict('records')
+        self.positions = {record['id']: i for i, record in enumerate(self.records)}
+
+        # Positions per category, most efficient first
+        self.categories = {}
+        if 'category' in products.columns:
+            ranked = products.reset_index(drop=True)
+            if 'efficiency' in ranked.columns:
+                ranked = ranked.sort_values('efficiency', ascending=False, kind='stable')
+            for category, positions in ranked.groupby('category', sort=False).indices.items():
+                self.categories[category] = ranked.index.values[positions]
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, product_id):
+        return product_id in self.positions
+
+    def get(self, product_id):
+        """Return a fresh dict for the product with the given id"""
+        return dict(self.records[self.positions[product_id]])
+
+    def head(self, n):
+        """Return the first n products in catalogue order"""
+        return [dict(record) for record in self.records[:n]]
+
+    def top_in_category(self, category, n):
+        """Return the n most efficient products in a category"""
+        positions = self.categories.get(category, [])
+        return [dict(self.records[i]) for i in positions[:n]]
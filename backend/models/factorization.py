@@ -0,0 +1,163 @@
+"""Matrix factorization engines for the recommender.
+
+The user-item rating matrix is approximated by float32 user and item
+factor arrays, so memory grows with (users + items) * factors. A user's
+predicted ratings are one dot product with the item factors, and similar
+products are the nearest item factors by cosine similarity.
+
+    als   alternating least squares on the observed ratings (explicit
+          feedback, regularization weighted by each row's rating count)
+    ials  implicit-feedback ALS: every product is a 0/1 preference, rated
+          ones weighted by 1 + alpha * rating; scores are preferences
+    svd   truncated SVD of the rating matrix (unrated entries count as 0)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.linalg import svds
+
+from models.scoring import chunk_rows
+
+ENGINES = ('als', 'ials', 'svd')
+
+
+def train_factors(engine, user_item_matrix, n_factors=32, regularization=0.1, iterations=15,
+                  alpha=1.0, seed=0, n_jobs=None):
+    """Factorize a users x items CSR rating matrix with the given engine.
+    Returns float32 (user_factors, item_factors)."""
+    if engine in ('als', 'ials'):
+        return train_als(user_item_matrix, n_factors, regularization, iterations,
+                         alpha if engine == 'ials' else None, seed, n_jobs)
+    if engine == 'svd':
+        return train_svd(user_item_matrix, n_factors, seed)
+    raise ValueError(f"Unknown factorization engine {engine!r}, expected one of {', '.join(ENGINES)}")
+
+
+def train_als(user_item_matrix, n_factors=32, regularization=0.1, iterations=15, alpha=None, seed=0,
+              n_jobs=None):
+    """ALS alternating between user and item half-steps; implicit feedback
+    when alpha is given"""
+    ratings = csr_matrix(user_item_matrix, dtype=np.float32)
+    item_ratings = ratings.T.tocsr()
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.1, (ratings.shape[0], n_factors)).astype(np.float32)
+    item_factors = rng.normal(0, 0.1, (ratings.shape[1], n_factors)).astype(np.float32)
+
+    for _ in range(iterations):
+        user_factors = solve_factors(ratings, item_factors, regularization, alpha, n_jobs)
+        item_factors = solve_factors(item_ratings, user_factors, regularization, alpha, n_jobs)
+    return user_factors, item_factors
+
+
+def train_svd(user_item_matrix, n_factors=32, seed=0):
+    """Truncated SVD; user factors carry the singular values"""
+    ratings = csr_matrix(user_item_matrix, dtype=np.float32)
+    k = min(n_factors, min(ratings.shape) - 1)
+    if k < 1:
+        return (np.zeros((ratings.shape[0], 0), dtype=np.float32),
+                np.zeros((ratings.shape[1], 0), dtype=np.float32))
+    v0 = np.random.default_rng(seed).uniform(-1, 1, min(ratings.shape))
+    u, s, vt = svds(ratings, k=k, v0=v0)
+    order = np.argsort(-s)
+    return (u[:, order] * s[order]).astype(np.float32), vt[order].T.astype(np.float32)
+
+
+def fold_in(engine, user_item_matrix, item_user_matrix, user_factors, item_factors, users, items,
+            regularization=0.1, alpha=1.0, n_jobs=None):
+    """Update the factors of the given user rows, then of the given item rows,
+    in place after their ratings changed, without refactorizing"""
+    if engine in ('als', 'ials'):
+        alpha = alpha if engine == 'ials' else None
+        user_factors[users] = solve_factors(user_item_matrix[users], item_factors, regularization, alpha, n_jobs)
+        item_factors[items] = solve_factors(item_user_matrix[items], user_factors, regularization, alpha, n_jobs)
+    elif engine == 'svd':
+        # Project onto the fixed singular vectors (user factors carry s)
+        user_factors[users] = user_item_matrix[users] @ item_factors
+        singular_sq = np.square(user_factors).sum(axis=0)
+        item_factors[items] = np.divide(item_user_matrix[items] @ user_factors, singular_sq,
+                                        out=np.zeros((len(items), item_factors.shape[1]), dtype=np.float32),
+                                        where=singular_sq > 0)
+    else:
+        raise ValueError(f"Unknown factorization engine {engine!r}, expected one of {', '.join(ENGINES)}")
+
+
+def solve_factors(ratings, fixed, regularization=0.1, alpha=None, n_jobs=None, max_entries=16384):
+    """Least-squares factors for every row of a CSR rating matrix given the
+    fixed factors of its columns (one ALS half-step).
+
+    Row r solves (F_r^T F_r + regularization * n_r * I) x = F_r^T ratings_r
+    over its n_r rated columns. With alpha (implicit feedback) it solves
+    (F^T F + F_r^T (C_r - I) F_r + regularization * I) x = F_r^T C_r 1 with
+    confidences C_r = 1 + alpha * ratings_r. Rows without ratings get zero
+    factors. Rows with similar rating counts are solved together in batches
+    of about max_entries ratings, in parallel threads.
+    """
+    ratings = csr_matrix(ratings)
+    n_rows, n_factors = ratings.shape[0], fixed.shape[1]
+    result = np.zeros((n_rows, n_factors), dtype=np.float32)
+    counts = np.diff(ratings.indptr)
+    fixed = fixed.astype(np.float64)
+    # Implicit feedback: every column counts, so F^T F is shared by all rows
+    fixed_gram = fixed.T @ fixed if alpha is not None else None
+
+    # Group rows whose counts are within a factor of two, so padding every
+    # row of a batch to the batch's largest count at most doubles the work
+    rated = np.flatnonzero(counts)
+    rated = rated[np.argsort(counts[rated], kind='stable')]
+    buckets = np.log2(counts[rated]).astype(np.int64)
+    batches = []
+    for bucket_rows in np.split(rated, np.flatnonzero(np.diff(buckets)) + 1):
+        if len(bucket_rows):
+            size = max(1, max_entries // int(counts[bucket_rows[-1]]))
+            batches.extend(np.array_split(bucket_rows, -(-len(bucket_rows) // size)))
+
+    def solve_batch(rows):
+        batch = ratings[rows]
+        batch_counts = np.diff(batch.indptr)
+        # Rated columns' factors and ratings, padded with zeros to (rows, max count)
+        slots = np.arange(batch.nnz) - np.repeat(batch.indptr[:-1], batch_counts)
+        owners = np.repeat(np.arange(len(rows)), batch_counts)
+        padded = np.zeros((len(rows), batch_counts.max(), n_factors))
+        padded[owners, slots] = fixed[batch.indices]
+        values = np.zeros((len(rows), batch_counts.max(), 1))
+        values[owners, slots, 0] = batch.data
+
+        padded_t = padded.transpose(0, 2, 1)
+        if alpha is None:
+            gram = padded_t @ padded
+            gram += (regularization * batch_counts)[:, None, None] * np.eye(n_factors)
+        else:
+            gram = padded_t @ (alpha * values * padded)
+            gram += fixed_gram + regularization * np.eye(n_factors)
+            # Padding slots must not add to the right-hand side
+            values = np.where(padded.any(axis=2, keepdims=True), 1 + alpha * values, 0)
+        result[rows] = np.linalg.solve(gram, padded_t @ values)[:, :, 0]
+
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as executor:
+        list(executor.map(solve_batch, batches))
+    return result
+
+
+def predict_factor_scores(user_factors, item_factors, user_rows, chunk_size=None):
+    """Score every item for a batch of users from their factors.
+
+    Yields, like predict_user_scores, the candidate item indices (items the
+    user has not rated) and their predicted ratings per user row.
+    """
+    chunk_size = chunk_size or chunk_rows(len(item_factors))
+    rated = user_rows.tocsr()
+    for start in range(0, rated.shape[0], chunk_size):
+        stop = start + chunk_size
+        scores = user_factors[start:stop] @ item_factors.T
+        unrated = rated[start:stop].toarray() <= 0
+        for row_scores, row_unrated in zip(scores, unrated):
+            candidates = np.flatnonzero(row_unrated)
+            yield candidates, row_scores[candidates]
+
+
+def unit_rows(factors):
+    """Factors scaled to unit L2 norm (zero rows stay zero)"""
+    norms = np.linalg.norm(factors, axis=1, keepdims=True)
+    return np.divide(factors, norms, out=np.zeros_like(factors), where=norms > 0)
@@ -1,76 +1,168 @@
 import pandas as pd
 import numpy as np
-from neuralprophet import NeuralProphet
-import matplotlib.pyplot as plt
+import io
 import os
-import joblib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from functools import lru_cache
+import multiprocessing
+import threading
+from urllib.parse import quote, unquote
 
-class EnergyDemandForecaster:
-    def __init__(self):
-        self.model = None
-        self.forecast_periods = 24  # Default to forecasting 24 hours
-        self.model_path = os.path.join(os.path.dirname(__file__), 'saved_models', 'forecaster_model.pkl')
-        self.metrics = {}
-        
-    def _create_sample_data(self, days=60):
-        """Create sample energy demand data for training since no data exists"""
-        np.random.seed(42)
-        
-        # Generate dates for the past 60 days with hourly data
-        end_date = datetime.now().replace(minute=0, second=0, microsecond=0)
-        start_date = end_date - timedelta(days=days)
-        
-        # Generate datetime range
-        dates = pd.date_range(start=start_date, end=end_date, freq='H')
-        
-        # Base demand with daily and weekly seasonality
-        base_demand = 100  # Base load in kW
-        
-        # Create dataframe
-        df = pd.DataFrame({'ds': dates})
+from models import persistence
+from models.linear_forecaster import LinearForecastModel, fit_many
+from services import backtesting
+from services.forecast_cache import ForecastCache, LRUCache
+from services.instrumentation import metrics
+
+class ForecasterSnapshot:
+    """One trained forecasting model version, never modified once published.
+    
+    A request reads the model, version and history of a single snapshot, so
+    a retrain that publishes a new one cannot give it a mix of two models.
+    """
+    def __init__(self, model=None, saved=None, model_version=None, metrics=None, history=None,
+                 engine='neuralprophet'):
+        self._model = model
+        self._saved = saved  # Saved model the NeuralProphet model is read from on first use
+        self.model_version = model_version
+        self.metrics = metrics or {}
+        self.engine = engine  # Engine the model was trained with
+        self._history = history
+        # NeuralProphet models keep state while predicting, so calls on one
+        # model (and its first deserialization) are serialized
+        self.lock = threading.RLock()
         
-        # Add hour of day effect (peak in morning and evening)
-        hour_effect = np.sin(np.pi * df.ds.dt.hour / 12) * 30
+    @property
+    def model(self):
+        if self._model is None and self._saved is not None:
+            with self.lock:
+                if self._model is None:
+                    with metrics.timer('forecaster_load'):
+                        self._model = self._saved.object('model')
+        return self._model
         
-        # Add day of week effect (weekdays higher than weekends)
-        weekday_effect = (df.ds.dt.dayofweek < 5).astype(int) * 20
+    @property
+    def history(self):
+        """The data the model was trained on (ds, y), or None"""
+        if self._history is None and self._saved is not None and self._saved.has_array('history_ds'):
+            self._history = pd.DataFrame({
+                'ds': self._saved.array('history_ds'),
+                'y': self._saved.array('history_y')
+            })
+        return self._history
+
+
+ENGINES = ('neuralprophet', 'linear')
+
+
+class UnknownSeriesError(LookupError):
+    """No model has been trained for the requested series"""
+
+
+class EnergyDemandForecaster:
+    def __init__(self, engine=None):
+        self._snapshot = None  # Current ForecasterSnapshot, replaced as a whole
+        self._lock = threading.RLock()  # Serializes loading and training
+        self._saved_stamp = None  # persistence.current_stamp of the snapshot's version
+        # Model trained by train(): 'neuralprophet' or the NumPy 'linear' model
+        self.engine = engine or os.environ.get('FORECASTER_ENGINE', 'neuralprophet')
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown forecasting engine {self.engine!r}, expected one of {', '.join(ENGINES)}")
+        self.forecast_periods = 24  # Default to forecasting 24 hours
+        self.model_dir = os.path.join(os.path.dirname(__file__), 'saved_models', 'forecaster')
+        self.forecast_cache = ForecastCache()
+        # Rendered PNGs by (model_version, kind, periods, include_history)
+        self.plot_cache = LRUCache(max_entries=64)
+        # Backtest results by (model_version, horizon, n_folds, step, initial)
+        self.backtest_cache = LRUCache(max_entries=16)
+        self._backtest_lock = threading.Lock()  # One backtest of this forecaster at a time
         
-        # Add temperature effect (proxy with month - higher in summer/winter for AC/heating)
-        month = df.ds.dt.month
-        temp_effect = -np.abs((month - 6.5)) + 6.5  # Peak in summer (month 7)
-        temp_effect = temp_effect * 5  # Scale effect
+    def snapshot(self):
+        """Return the current model snapshot, loading or training it first if
+        there is none. Concurrent first calls load the model only once.
         
-        # Add some random noise
-        noise = np.random.normal(0, 5, size=len(df))
+        A version saved by another process (a training job, another server
+        worker) is loaded once the CURRENT pointer changes, which costs one
+        stat per call.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or self._saved_changed():
+            with self._lock:
+                if self._snapshot is None or self._saved_changed():
+                    if not self.load_model() and self._snapshot is None:
+                        self.train()
+                snapshot = self._snapshot
+        return snapshot
         
-        # Calculate final demand
-        y = base_demand + hour_effect + weekday_effect + temp_effect + noise
+    def _saved_changed(self):
+        return persistence.current_stamp(self.model_dir) != self._saved_stamp
         
-        # Add some growth trend
-        trend = np.linspace(0, 15, len(df))
-        y = y + trend
+    # Read-only views of the current snapshot (None before a model is loaded)
+    
+    @property
+    def model(self):
+        snapshot = self._snapshot
+        return snapshot.model if snapshot is not None else None
         
-        # Add special events (e.g., holidays with lower demand)
-        # Let's add a few random "holidays" with 30% lower demand
-        holiday_idx = np.random.choice(range(len(df)), size=5, replace=False)
-        y[holiday_idx] = y[holiday_idx] * 0.7
+    @property
+    def model_version(self):
+        snapshot = self._snapshot
+        return snapshot.model_version if snapshot is not None else None
         
-        # Add sudden spikes (e.g., extreme weather events)
-        spike_idx = np.random.choice(range(len(df)), size=3, replace=False)
-        y[spike_idx] = y[spike_idx] * 1.5
+    @property
+    def metrics(self):
+        snapshot = self._snapshot
+        return snapshot.metrics if snapshot is not None else {}
         
-        df['y'] = y
+    @property
+    def history(self):
+        snapshot = self._snapshot
+        return snapshot.history if snapshot is not None else None
         
-        return df
+    def _create_sample_data(self, days=60):
+        """Create sample energy demand data for training since no data exists"""
+        # Generate dates for the past days with hourly data
+        end_date = datetime.now().replace(minute=0, second=0, microsecond=0)
+        return _sample_data(end_date, days).copy()
     
-    def train(self, data=None):
-        """Train the forecaster with historical energy demand data"""
+    def train(self, data=None, on_epoch_end=None):
+        """Train the forecaster with historical energy demand data.
+        
+        on_epoch_end, if given, is called as on_epoch_end(epoch, epochs, loss)
+        after every training epoch (once for the linear engine, which is
+        solved in one step).
+        """
         if data is None:
             data = self._create_sample_data()
             
+        # Writers are serialized; readers keep using the current snapshot meanwhile
+        with self._lock:
+            model, fit_metrics = self.fit_model(data, on_epoch_end)
+            self._install(model, data, fit_metrics)
+            
+    def fit_model(self, data, on_epoch_end=None):
+        """Fit a new model of the forecaster's engine to data (ds, y) without
+        saving or installing it. Returns (model, fit metrics frame)."""
+        if self.engine == 'linear':
+            model = LinearForecastModel()
+            fit_metrics = model.fit(data, freq="H")
+            if on_epoch_end is not None:
+                # Solved in one step
+                on_epoch_end(1, 1, float(fit_metrics['rmse'].iloc[-1]))
+            return model, fit_metrics
+        return self._fit_neuralprophet(data, on_epoch_end)
+        
+    def _fit_neuralprophet(self, data, on_epoch_end=None):
+        epochs = 100
+        progress_callback = _epoch_callback(on_epoch_end, epochs) if on_epoch_end else None
+        
+        # Imported here, so serving a saved model does not need it up front
+        from neuralprophet import NeuralProphet
+        
         # Configure and train NeuralProphet model
-        self.model = NeuralProphet(
+        model = NeuralProphet(
             growth="linear",  # Allow for trend
             changepoints=10,  # Allow for trend changes
             n_changepoints=10,
@@ -78,76 +170,143 @@ class EnergyDemandForecaster:
             weekly_seasonality=True,
             daily_seasonality=True,
             batch_size=64,
-            epochs=100,
-            learning_rate=0.01
+            epochs=epochs,
+            learning_rate=0.01,
+            trainer_config={'callbacks': [progress_callback]} if progress_callback else {}
         )
         
         # Add country holidays
-        self.model.add_country_holidays(country_name='US')
+        model.add_country_holidays(country_name='US')
         
         # Fit the model
-        metrics = self.model.fit(data, freq="H")
-        self.metrics = {
-            'mae': metrics['mae'].iloc[-1],
-            'rmse': metrics['rmse'].iloc[-1]
-        }
-        
-        # Save the model
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        model_data = {
-            'model': self.model,
-            'metrics': self.metrics,
-            'last_train_date': data['ds'].max()
-        }
-        joblib.dump(model_data, self.model_path)
+        metrics = model.fit(data, freq="H")
+        if progress_callback is not None:
+            _remove_callback(model, progress_callback)
+        return model, metrics
+        
+    def _install(self, model, data, metrics):
+        """Save a fitted model with its training history and publish it"""
+        with self._lock:
+            history = pd.DataFrame({
+                'ds': pd.to_datetime(data['ds']).to_numpy(dtype='datetime64[ns]'),
+                'y': data['y'].to_numpy(dtype=np.float32)
+            }).sort_values('ds', ignore_index=True)
+            snapshot = ForecasterSnapshot(model=model, history=history, metrics={
+                'mae': float(metrics['mae'].iloc[-1]),
+                'rmse': float(metrics['rmse'].iloc[-1])
+            }, engine='linear' if isinstance(model, LinearForecastModel) else 'neuralprophet')
+            
+            # Save the model
+            snapshot.model_version = persistence.save_model(
+                self.model_dir,
+                metadata={
+                    'engine': snapshot.engine,
+                    'metrics': snapshot.metrics,
+                    'last_train_date': pd.Timestamp(data['ds'].max()).isoformat()
+                },
+                arrays={
+                    'history_ds': history['ds'].to_numpy(),
+                    'history_y': history['y'].to_numpy()
+                },
+                objects={'model': model}
+            )
+            self._saved_stamp = persistence.current_stamp(self.model_dir)
+            
+            # Install the new model only once it is fully trained and saved
+            self._publish(snapshot)
+            
+    def _publish(self, snapshot):
+        # A single reference assignment, so readers see the old or the new model.
+        # Cached results are keyed by model version and need no locking.
+        self._snapshot = snapshot
+        self.forecast_cache.invalidate()
+        self.plot_cache.invalidate()
+        self.backtest_cache.invalidate()
         
     def load_model(self):
-        """Load a trained model if it exists"""
-        if os.path.exists(self.model_path):
-            model_data = joblib.load(self.model_path)
-            self.model = model_data['model']
-            self.metrics = model_data.get('metrics', {})
-            return True
-        return False
+        """Load a trained model if it exists.
+        
+        Only the metadata is read here; the model is deserialized the first
+        time it is used.
+        """
+        stamp = persistence.current_stamp(self.model_dir)
+        saved = persistence.load_model(self.model_dir)
+        if saved is None:
+            self._saved_stamp = stamp
+            return False
+            
+        with self._lock:
+            self._publish(ForecasterSnapshot(saved=saved, model_version=saved.version,
+                                             metrics=saved.metadata.get('metrics', {}),
+                                             engine=saved.metadata.get('engine', 'neuralprophet')))
+            self._saved_stamp = stamp
+        return True
     
+    def preload(self):
+        """Load (or train) the model and deserialize it now rather than on
+        first use, e.g. before forking server workers. This also imports
+        NeuralProphet and matplotlib, which are otherwise imported by the
+        first request that needs them."""
+        snapshot = self.snapshot()
+        snapshot.model
+        snapshot.history
+        _pyplot()
+        
     def forecast(self, periods=None, return_components=False):
         """Generate energy demand forecast"""
-        if self.model is None:
-            if not self.load_model():
-                self.train()
-                
-        periods = periods or self.forecast_periods
+        return self._forecast(self.snapshot(), periods, return_components)
         
-        # Create future dataframe for prediction
-        future = self.model.make_future_dataframe(
-            df=pd.DataFrame(), periods=periods, freq='H'
-        )
+    def _forecast(self, snapshot, periods=None, return_components=False):
+        periods = periods or self.forecast_periods
         
-        # Make prediction
-        forecast = self.model.predict(future)
+        if not return_components:
+            cached = self.forecast_cache.get(snapshot.model_version, periods)
+            if cached is not None:
+                return cached
         
-        if return_components:
-            components = self.model.predict_components(future)
-            return forecast, components
+        with snapshot.lock:
+            # Create future dataframe for prediction, continuing from the training history
+            history = snapshot.history
+            model = snapshot.model
+            with metrics.timer('make_future_dataframe'):
+                future = model.make_future_dataframe(
+                    df=history if history is not None else pd.DataFrame(), periods=periods, freq='H'
+                )
+            
+            # Make prediction
+            with metrics.timer('forecast_predict'):
+                forecast = model.predict(future)
+            
+            if return_components:
+                with metrics.timer('forecast_predict_components'):
+                    components = model.predict_components(future)
+                return forecast, components
         
+        self.forecast_cache.put(snapshot.model_version, periods, forecast)
         return forecast
     
     def plot_forecast(self, periods=None, include_history=True, save_path=None):
         """Plot the forecasted energy demand"""
-        if self.model is None:
-            if not self.load_model():
-                self.train()
-                
+        return self._plot_forecast(self.snapshot(), periods, include_history, save_path)
+        
+    def _plot_forecast(self, snapshot, periods=None, include_history=True, save_path=None):
         periods = periods or self.forecast_periods
         
-        # Create a sample of historical data for plotting
+        # Last 7 days of the training history for visualization
         if include_history:
-            history = self._create_sample_data(days=7)  # Last 7 days for visualization
+            history = snapshot.history
+            if history is None:
+                # Models saved before the history was kept
+                history = self._create_sample_data(days=7)
+            else:
+                history = history[history['ds'] > history['ds'].iloc[-1] - pd.Timedelta(days=7)]
         else:
             history = None
             
         # Plot the forecast
-        fig = self.model.plot(self.forecast(periods), history)
+        forecast = self._forecast(snapshot, periods)
+        with snapshot.lock:
+            fig = snapshot.model.plot(forecast, history)
         
         if save_path:
             fig.savefig(save_path)
@@ -156,25 +315,289 @@ class EnergyDemandForecaster:
         
     def plot_components(self, periods=None, save_path=None):
         """Plot the components of the forecast"""
-        if self.model is None:
-            if not self.load_model():
-                self.train()
-                
+        return self._plot_components(self.snapshot(), periods, save_path)
+        
+    def _plot_components(self, snapshot, periods=None, save_path=None):
         periods = periods or self.forecast_periods
         
         # Plot the components
-        forecast = self.forecast(periods)
-        fig = self.model.plot_components(forecast)
+        forecast = self._forecast(snapshot, periods)
+        with snapshot.lock:
+            fig = snapshot.model.plot_components(forecast)
         
         if save_path:
             fig.savefig(save_path)
             
         return fig
         
+    def plot_etag(self, kind, periods, include_history=True, snapshot=None):
+        """Entity tag of a rendered plot, known without rendering it"""
+        snapshot = snapshot or self.snapshot()
+        return f"{snapshot.model_version}-{kind}-{periods}-{int(include_history)}"
+        
+    def render_plot(self, kind, periods=None, include_history=True, snapshot=None):
+        """Render the 'forecast' or 'components' plot to PNG bytes.
+        Images are cached per model version, and figures are closed after rendering.
+        Pass the snapshot a response's validators were derived from to render
+        that same model version."""
+        snapshot = snapshot or self.snapshot()
+        periods = periods or self.forecast_periods
+        key = (snapshot.model_version, kind, periods, include_history)
+        image = self.plot_cache.get(key)
+        if image is not None:
+            return image
+            
+        # Forecast first, so the plot reuses the cached forecast and
+        # plot_render does not include the prediction phases
+        self._forecast(snapshot, periods)
+        with metrics.timer('plot_render'):
+            # Select the non-interactive backend before NeuralProphet plots
+            plt = _pyplot()
+            if kind == 'components':
+                fig = self._plot_components(snapshot, periods)
+            else:
+                fig = self._plot_forecast(snapshot, periods, include_history)
+                
+            buffer = io.BytesIO()
+            try:
+                fig.savefig(buffer, format='png')
+            finally:
+                plt.close(fig)
+            
+        image = buffer.getvalue()
+        self.plot_cache.put(key, image)
+        return image
+        
     def get_performance_metrics(self):
         """Return model performance metrics"""
-        if not self.metrics and self.model is None:
-            if not self.load_model():
-                self.train()
+        return self.snapshot().metrics
+        
+    def backtest(self, horizon=None, n_folds=5, step=None, initial=None, max_workers=None):
+        """Rolling-origin backtest of the current model's engine on its
+        training history (see services.backtesting.run_backtest).
+        Results are cached per model version."""
+        snapshot = self.snapshot()
+        key = self._backtest_key(snapshot.model_version, horizon, n_folds, step, initial)
+        result = self.backtest_cache.get(key)
+        if result is not None:
+            return result
+        
+        # Concurrent requests wait for one backtest instead of each running their own
+        with self._backtest_lock:
+            result = self.backtest_cache.get(key)
+            if result is None:
+                _, horizon, n_folds, step, initial = key
+                with metrics.timer('backtest'):
+                    result = backtesting.run_backtest(self._backtest_history(snapshot), snapshot.engine,
+                                                      horizon=horizon, n_folds=n_folds, step=step,
+                                                      initial=initial, max_workers=max_workers)
+                result['model_version'] = snapshot.model_version
+                self.backtest_cache.put(key, result)
+        return result
+        
+    def cached_backtest(self, horizon=None, n_folds=5, step=None, initial=None):
+        """Return the cached backtest of the current model, or None. Raises
+        ValueError if the model cannot be backtested with these settings."""
+        snapshot = self.snapshot()
+        key = self._backtest_key(snapshot.model_version, horizon, n_folds, step, initial)
+        result = self.backtest_cache.get(key)
+        if result is None:
+            _, horizon, n_folds, step, initial = key
+            backtesting.plan_folds(self._backtest_history(snapshot), horizon, n_folds, step, initial)
+        return result
+        
+    def cache_backtest(self, result, horizon=None, n_folds=5, step=None, initial=None):
+        """Cache a backtest result run elsewhere, e.g. in a background job"""
+        self.backtest_cache.put(self._backtest_key(result['model_version'], horizon, n_folds, step, initial),
+                                result)
+        
+    def _backtest_key(self, model_version, horizon, n_folds, step, initial):
+        horizon = horizon or self.forecast_periods
+        return (model_version, horizon, n_folds, step or horizon, initial)
+        
+    @staticmethod
+    def _backtest_history(snapshot):
+        if snapshot.history is None:
+            raise ValueError("The model was saved without its training history and cannot be backtested")
+        return snapshot.history
+
+
+
+class MultiSeriesForecaster:
+    """Manages one EnergyDemandForecaster per named series (site, meter, ...).
+    
+    Each series is saved under its own directory. Models are loaded on first
+    use and the least recently used ones are dropped from memory once more
+    than max_loaded are held.
+    """
+    def __init__(self, max_loaded=32, max_workers=None, engine=None):
+        self.root = os.path.join(os.path.dirname(__file__), 'saved_models', 'forecaster_series')
+        self.engine = engine or os.environ.get('FORECASTER_ENGINE', 'neuralprophet')
+        self.max_loaded = max_loaded
+        self.max_workers = max_workers  # Training processes, defaults to the CPU count
+        self._loaded = OrderedDict()  # series_id -> EnergyDemandForecaster
+        self._lock = threading.Lock()
+        
+    def series_dir(self, series_id):
+        """Directory of a series' saved models"""
+        return os.path.join(self.root, 'series-' + quote(str(series_id), safe=''))
+        
+    def series_ids(self):
+        """IDs of all series with a saved model"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name[len('series-'):]) for name in os.listdir(self.root)
+                      if name.startswith('series-'))
+        
+    def get(self, series_id):
+        """Return the forecaster of a series, loading it on first use.
+        Raises UnknownSeriesError if the series has never been trained."""
+        series_id = str(series_id)
+        with self._lock:
+            forecaster = self._loaded.get(series_id)
+            if forecaster is not None:
+                self._loaded.move_to_end(series_id)
+                return forecaster
                 
-        return self.metrics 
+        forecaster = EnergyDemandForecaster()
+        forecaster.model_dir = self.series_dir(series_id)
+        if not forecaster.load_model():
+            raise UnknownSeriesError(f"No trained model for series {series_id}")
+            
+        with self._lock:
+            # Another thread may have loaded it meanwhile; keep the first one
+            forecaster = self._loaded.setdefault(series_id, forecaster)
+            self._loaded.move_to_end(series_id)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return forecaster
+        
+    def evict(self, series_ids=None):
+        """Drop loaded models so the next use reads the latest saved version"""
+        with self._lock:
+            if series_ids is None:
+                self._loaded.clear()
+            for series_id in series_ids or []:
+                self._loaded.pop(str(series_id), None)
+                
+    def train(self, data):
+        """Train one model per series from a long-format frame with
+        series_id, ds and y columns, in parallel across CPU cores (the
+        linear engine fits series sharing timestamps in one batched solve).
+        Returns the metrics of every trained series."""
+        missing = {'series_id', 'ds', 'y'} - set(data.columns)
+        if missing:
+            raise ValueError(f"Data must contain 'series_id', 'ds' and 'y' columns (missing {sorted(missing)})")
+            
+        groups = [(str(series_id), frame[['ds', 'y']].reset_index(drop=True))
+                  for series_id, frame in data.groupby('series_id', sort=True)]
+        
+        results = {}
+        if self.engine == 'linear':
+            models = [LinearForecastModel() for _ in groups]
+            fitted = fit_many(models, [frame for _, frame in groups])
+            for (series_id, frame), model, fit_metrics in zip(groups, models, fitted):
+                forecaster = EnergyDemandForecaster(engine=self.engine)
+                forecaster.model_dir = self.series_dir(series_id)
+                forecaster._install(model, frame, fit_metrics)
+                results[series_id] = forecaster.metrics
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = {series_id: executor.submit(_train_series, self.series_dir(series_id), frame,
+                                                      self.engine)
+                           for series_id, frame in groups}
+                for series_id, future in futures.items():
+                    results[series_id] = future.result()
+                    
+        self.evict(results.keys())
+        return results
+
+
+
+@lru_cache(maxsize=4)
+def _sample_data(end_date, days):
+    """Synthetic hourly demand for the days up to end_date"""
+    rng = np.random.RandomState(42)
+    start_date = end_date - timedelta(days=days)
+    
+    # Generate datetime range
+    dates = pd.date_range(start=start_date, end=end_date, freq='h')
+    
+    # Base demand with daily and weekly seasonality
+    base_demand = 100  # Base load in kW
+    
+    # Add hour of day effect (peak in morning and evening)
+    hour_effect = np.sin(np.pi * dates.hour.to_numpy() / 12) * 30
+    
+    # Add day of week effect (weekdays higher than weekends)
+    weekday_effect = (dates.dayofweek.to_numpy() < 5).astype(int) * 20
+    
+    # Add temperature effect (proxy with month - higher in summer/winter for AC/heating)
+    temp_effect = (-np.abs(dates.month.to_numpy() - 6.5) + 6.5) * 5  # Peak in summer (month 7)
+    
+    # Add some random noise
+    noise = rng.normal(0, 5, size=len(dates))
+    
+    # Calculate final demand, with some growth trend
+    y = base_demand + hour_effect + weekday_effect + temp_effect + noise
+    y = y + np.linspace(0, 15, len(dates))
+    
+    # Add special events (e.g., holidays with lower demand)
+    # Let's add a few random "holidays" with 30% lower demand
+    holiday_idx = rng.choice(range(len(dates)), size=5, replace=False)
+    y[holiday_idx] = y[holiday_idx] * 0.7
+    
+    # Add sudden spikes (e.g., extreme weather events)
+    spike_idx = rng.choice(range(len(dates)), size=3, replace=False)
+    y[spike_idx] = y[spike_idx] * 1.5
+    
+    return pd.DataFrame({'ds': dates, 'y': y})
+
+def _pyplot():
+    """matplotlib.pyplot with the non-interactive backend, imported on first use"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _train_series(model_dir, data, engine=None):
+    """Train and save the model of one series (runs in a worker process)"""
+    try:
+        import torch
+        # One thread per process, the pool already uses every core
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+        
+    forecaster = EnergyDemandForecaster(engine=engine)
+    forecaster.model_dir = model_dir
+    forecaster.train(data)
+    return forecaster.metrics
+
+def _epoch_callback(on_epoch_end, epochs):
+    """Wrap on_epoch_end(epoch, epochs, loss) in a Lightning callback"""
+    try:
+        import pytorch_lightning as pl
+    except ImportError:
+        try:
+            import lightning.pytorch as pl
+        except ImportError:
+            return None
+            
+    class EpochProgress(pl.Callback):
+        def on_train_epoch_end(self, trainer, pl_module):
+            loss = trainer.callback_metrics.get('Loss')
+            on_epoch_end(trainer.current_epoch + 1, epochs, float(loss) if loss is not None else None)
+            
+    return EpochProgress()
+
+
+def _remove_callback(model, callback):
+    """Detach the progress callback so the fitted model can be pickled"""
+    config = getattr(model, 'trainer_config', None) or {}
+    if callback in config.get('callbacks', []):
+        config['callbacks'].remove(callback)
+    trainer = getattr(model, 'trainer', None)
+    if trainer is not None and callback in trainer.callbacks:
+        trainer.callbacks.remove(callback)
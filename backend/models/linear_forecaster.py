@@ -0,0 +1,197 @@
+"""Pure-NumPy forecasting engine: a linear model fitted in closed form.
+
+    y(t) = trend(t) + daily + weekly (+ yearly) seasonality + holiday effect
+
+The trend is piecewise linear with changepoints spread over the first 80%
+of the history, seasonalities are Fourier series, and holidays add one
+offset. The coefficients are fitted by ridge-regularized least squares,
+which takes milliseconds, and series sharing one time index are fitted
+together with a single solve (fit_many).
+
+LinearForecastModel has the methods of NeuralProphet that the forecaster
+uses (fit, make_future_dataframe, predict, plot, plot_components), and its
+forecasts have the same columns: ds, y, yhat1 and the components trend,
+season_daily, season_weekly, season_yearly and events_additive.
+"""
+import numpy as np
+import pandas as pd
+
+from services.calendar_features import calendar_cache
+
+HOUR = np.timedelta64(1, 'h')
+
+# Seasonality -> period in hours
+PERIODS = {'daily': 24.0, 'weekly': 24.0 * 7, 'yearly': 24.0 * 365.25}
+
+COMPONENTS = ('trend', 'season_daily', 'season_weekly', 'season_yearly', 'events_additive')
+
+
+class LinearForecastModel:
+    """Linear trend, Fourier seasonality and holiday model.
+
+    n_changepoints              trend changepoints
+    daily_order, weekly_order,  Fourier terms per seasonality; yearly
+    yearly_order                seasonality is only fitted with a year of history
+    holidays                    fit an offset for the country's holidays
+    regularization              ridge penalty of the seasonal and holiday terms
+    changepoint_regularization  ridge penalty of the trend changes
+    """
+
+    def __init__(self, n_changepoints=10, daily_order=6, weekly_order=4, yearly_order=6, holidays=True,
+                 regularization=1.0, changepoint_regularization=10.0):
+        self.n_changepoints = n_changepoints
+        self.orders = {'daily': daily_order, 'weekly': weekly_order, 'yearly': yearly_order}
+        self.holidays = holidays
+        self.regularization = regularization
+        self.changepoint_regularization = changepoint_regularization
+        self.coef = None
+
+    def _setup(self, ds):
+        """Fix the time scale, changepoints and terms from the training timestamps"""
+        self.start = ds.min()
+        self.end = ds.max()
+        self.span = max((self.end - self.start) / HOUR, 1.0)
+        self.changepoints = np.linspace(0, 0.8, self.n_changepoints + 1)[1:]
+        self.seasonalities = [name for name, order in self.orders.items()
+                              if order and (name != 'yearly' or self.span >= PERIODS['yearly'])]
+
+    def _design(self, ds):
+        """Feature matrix of timestamps, with the column range of every component"""
+        t = (ds - self.start) / HOUR / self.span
+        columns = [np.ones_like(t), t, np.maximum(t[:, None] - self.changepoints, 0)]
+        segments = {'trend': slice(0, 2 + len(self.changepoints))}
+
+        # Absolute hours, so every series shares the seasonal phases
+        hours = (ds - np.datetime64('1970-01-01T00:00')) / HOUR
+        width = segments['trend'].stop
+        for name in self.seasonalities:
+            order = self.orders[name]
+            angles = 2 * np.pi * hours[:, None] * np.arange(1, order + 1) / PERIODS[name]
+            columns += [np.sin(angles), np.cos(angles)]
+            segments[f'season_{name}'] = slice(width, width + 2 * order)
+            width += 2 * order
+
+        if self.holidays:
+            dates = pd.DatetimeIndex(ds).normalize()
+            years = range(dates.year.min(), dates.year.max() + 1) if len(dates) else []
+            columns.append(dates.isin(calendar_cache.holidays(years)).astype(np.float64))
+            segments['events_additive'] = slice(width, width + 1)
+            width += 1
+
+        return np.column_stack(columns), segments
+
+    def _penalty(self, segments):
+        penalty = np.full(segments['trend'].stop, 0.0)
+        penalty[2:] = self.changepoint_regularization
+        width = sum(s.stop - s.start for s in segments.values())
+        return np.concatenate([penalty, np.full(width - len(penalty), self.regularization)])
+
+    def fit(self, df, freq='H'):
+        """Fit on a frame with ds and y columns; returns the in-sample mae and
+        rmse as a one-row frame, like NeuralProphet's fit"""
+        return fit_many([self], [df])[0]
+
+    def make_future_dataframe(self, df, periods, freq='H'):
+        """The `periods` hours after the last timestamp of df (or of the
+        training data), with an empty y column"""
+        last = pd.Timestamp(df['ds'].max()) if len(df) else pd.Timestamp(self.end)
+        ds = pd.date_range(last + pd.Timedelta(hours=1), periods=periods, freq='h')
+        return pd.DataFrame({'ds': ds, 'y': np.nan})
+
+    def predict_components(self, df):
+        """Contribution of each component at the timestamps of df"""
+        X, segments = self._design(_timestamps(df['ds']))
+        components = pd.DataFrame({'ds': df['ds'].to_numpy()})
+        for name in COMPONENTS:
+            segment = segments.get(name)
+            components[name] = X[:, segment] @ self.coef[segment] if segment else 0.0
+        return components
+
+    def predict(self, df):
+        """Forecast frame with ds, y, yhat1 and the component columns"""
+        components = self.predict_components(df)
+        forecast = pd.DataFrame({'ds': components['ds'],
+                                 'y': df['y'].to_numpy() if 'y' in df else np.nan})
+        forecast['yhat1'] = components[list(COMPONENTS)].sum(axis=1)
+        for name in COMPONENTS:
+            forecast[name] = components[name]
+        return forecast
+
+    def plot(self, forecast, df=None):
+        """Figure of the forecast, with the history of df if given"""
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(10, 6))
+        if df is not None and len(df):
+            ax.plot(df['ds'], df['y'], 'k.', markersize=3, label='history')
+        ax.plot(forecast['ds'], forecast['yhat1'], label='yhat1')
+        ax.set_xlabel('ds')
+        ax.set_ylabel('y')
+        ax.legend()
+        fig.autofmt_xdate()
+        return fig
+
+    def plot_components(self, forecast):
+        """One panel per fitted component of a forecast"""
+        import matplotlib.pyplot as plt
+
+        names = [name for name in COMPONENTS if name in forecast and forecast[name].any()]
+        fig, axes = plt.subplots(len(names), 1, figsize=(10, 3 * len(names)), squeeze=False)
+        for ax, name in zip(axes[:, 0], names):
+            ax.plot(forecast['ds'], forecast[name])
+            ax.set_ylabel(name)
+        fig.autofmt_xdate()
+        return fig
+
+
+def fit_many(models, frames):
+    """Fit each model to its frame (ds, y); returns their metrics frames.
+
+    Rows with a missing value are dropped. Series left with the same
+    timestamps share one design matrix, so all of them are fitted with a
+    single least-squares solve.
+    """
+    groups = {}
+    results = [None] * len(models)
+    for i, (model, df) in enumerate(zip(models, frames)):
+        ds, y = _timestamps(df['ds']), df['y'].to_numpy(dtype=np.float64)
+        keep = ~(np.isnan(y) | np.isnat(ds))
+        ds, y = ds[keep], y[keep]
+        order = np.argsort(ds, kind='stable')
+        ds, y = ds[order], y[order]
+        if not len(ds):
+            raise ValueError("No data to fit the model on")
+        key = (ds.tobytes(), type(model), _settings(model))
+        groups.setdefault(key, (ds, []))[1].append((i, y))
+
+    for ds, members in groups.values():
+        first = models[members[0][0]]
+        first._setup(ds)
+        X, segments = first._design(ds)
+        Y = np.column_stack([y for _, y in members])
+        # Ridge normal equations, one right-hand side per series
+        coef = np.linalg.solve(X.T @ X + np.diag(first._penalty(segments)), X.T @ Y)
+        residuals = Y - X @ coef
+
+        for column, (i, _) in enumerate(members):
+            model = models[i]
+            if model is not first:
+                model._setup(ds)
+            model.coef = coef[:, column]
+            results[i] = pd.DataFrame({
+                'mae': [float(np.mean(np.abs(residuals[:, column])))],
+                'rmse': [float(np.sqrt(np.mean(residuals[:, column] ** 2)))]
+            })
+    return results
+
+
+def _timestamps(column):
+    """A ds column as datetime64[ns]; parsing is skipped for datetime columns"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.to_numpy(dtype='datetime64[ns]')
+    return pd.to_datetime(column).to_numpy(dtype='datetime64[ns]')
+
+
+def _settings(model):
+    return (model.n_changepoints, tuple(model.orders.items()), model.holidays, model.regularization,
+            model.changepoint_regularization)
@@ -0,0 +1,191 @@
+"""Neighbour-search backends that build the recommender's item index.
+
+Both backends produce an ItemNeighborhoodIndex, so serving, user scoring
+and the precomputed store work the same whichever built it.
+
+    exact  every item is compared with every other item (the default)
+    ivf    items are clustered on a low-dimensional embedding of their
+           rating vectors; each item is only compared with the items of
+           the n_probe clusters nearest to its own, trading recall for speed
+
+Incremental updates recompute the changed rows exactly with either backend.
+"""
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from models.neighbors import ItemNeighborhoodIndex, normalize_rows, top_k_per_row
+
+
+class ExactNeighborSearch:
+    """Brute-force cosine similarity over all item pairs"""
+
+    name = 'exact'
+
+    def params(self):
+        return {}
+
+    def build(self, item_user_matrix, n_neighbors=100, block_size=256, norms=None):
+        return ItemNeighborhoodIndex.build(item_user_matrix, n_neighbors=n_neighbors,
+                                           block_size=block_size, norms=norms)
+
+    def update(self, index, item_user_matrix, rows, n_neighbors=100, block_size=256, norms=None):
+        return index.update(item_user_matrix, rows, n_neighbors=n_neighbors,
+                            block_size=block_size, norms=norms)
+
+
+class IVFNeighborSearch(ExactNeighborSearch):
+    """Inverted-file approximate search in pure NumPy.
+
+    n_lists    clusters (default: sqrt of the number of items)
+    n_probe    clusters searched per item; more gives higher recall and
+               slower builds, n_probe >= n_lists is exact
+    dim        dimensions of the embedding used for clustering
+    n_power    power iterations refining the embedding's random projection
+               (0 is a plain random projection, which clusters sparse
+               ratings poorly)
+    n_iter     k-means iterations
+    """
+
+    name = 'ivf'
+
+    def __init__(self, n_lists=None, n_probe=8, dim=64, n_power=2, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.dim = dim
+        self.n_power = n_power
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def params(self):
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe, 'dim': self.dim,
+                'n_power': self.n_power, 'n_iter': self.n_iter, 'seed': self.seed}
+
+    def build(self, item_user_matrix, n_neighbors=100, block_size=256, norms=None):
+        item_vectors = normalize_rows(csr_matrix(item_user_matrix, dtype=np.float32), norms)
+        n_items = item_vectors.shape[0]
+        n_lists = min(self.n_lists or max(1, int(round(np.sqrt(n_items)))), n_items)
+        if self.n_probe >= n_lists:
+            return super().build(item_user_matrix, n_neighbors, block_size, norms)
+
+        rng = np.random.default_rng(self.seed)
+        embedding = _embed(item_vectors, self.dim, self.n_power, rng)
+        centroids, assignment = _spherical_kmeans(embedding, n_lists, self.n_iter, rng)
+
+        # Lists searched for the items of each list: itself and its nearest lists
+        probes, _ = top_k_per_row(centroids @ centroids.T, self.n_probe)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        members = [order[bounds[c]:bounds[c + 1]] for c in range(n_lists)]
+
+        item_rows = [np.empty(0, dtype=np.int64)]
+        counts = [np.empty(0, dtype=np.int64)]
+        indices = [np.empty(0, dtype=np.int32)]
+        data = [np.empty(0, dtype=np.float32)]
+        for c in range(n_lists):
+            if not len(members[c]):
+                continue
+            # Sorted, so ties are broken by the lower item index as in the exact search
+            candidates = np.sort(np.concatenate([members[c]] + [members[p] for p in probes[c] if p != c]))
+            candidate_vectors_t = item_vectors[candidates].T.tocsc()
+
+            for start in range(0, len(members[c]), block_size):
+                block_rows = members[c][start:start + block_size]
+                block = (item_vectors[block_rows] @ candidate_vectors_t).toarray()
+                # An item is not its own neighbour
+                block[candidates[None, :] == block_rows[:, None]] = 0
+
+                neighbors, scores = top_k_per_row(block, n_neighbors)
+                keep = scores > 0
+                item_rows.append(block_rows)
+                counts.append(keep.sum(axis=1))
+                indices.append(candidates[neighbors[keep]].astype(np.int32))
+                data.append(scores[keep].astype(np.float32))
+
+        # Reassemble the rows in item order; each row keeps its ranked order
+        item_rows, counts = np.concatenate(item_rows), np.concatenate(counts)
+        entry_rows = np.repeat(item_rows, counts)
+        entry_order = np.argsort(entry_rows, kind='stable')
+        row_counts = np.zeros(n_items, dtype=np.int64)
+        row_counts[item_rows] = counts
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(row_counts, out=indptr[1:])
+        return ItemNeighborhoodIndex(csr_matrix((np.concatenate(data)[entry_order],
+                                                 np.concatenate(indices)[entry_order], indptr),
+                                                shape=(n_items, n_items)))
+
+
+BACKENDS = {
+    ExactNeighborSearch.name: ExactNeighborSearch,
+    IVFNeighborSearch.name: IVFNeighborSearch,
+}
+
+
+def get_neighbor_search(name='exact', **params):
+    """Create a backend by name ('exact' or 'ivf')"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown neighbour search {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**params)
+
+
+def neighbor_search_from_env():
+    """Backend selected by RECOMMENDER_NEIGHBOR_SEARCH ('exact' by default),
+    with RECOMMENDER_IVF_PROBES setting n_probe of the ivf backend"""
+    name = os.environ.get('RECOMMENDER_NEIGHBOR_SEARCH', 'exact')
+    if name == IVFNeighborSearch.name and 'RECOMMENDER_IVF_PROBES' in os.environ:
+        return get_neighbor_search(name, n_probe=int(os.environ['RECOMMENDER_IVF_PROBES']))
+    return get_neighbor_search(name)
+
+
+def _embed(item_vectors, dim, n_power, rng, chunk_size=65536):
+    """Unit-norm `dim`-dimensional embedding of sparse item rows.
+
+    The rows are projected onto random Gaussian directions, then refined
+    with power iterations towards their leading singular subspace (as in a
+    randomized SVD), so items rated by the same users end up close.
+    """
+    n_items, n_users = item_vectors.shape
+    by_user = item_vectors.tocsc()
+    embedding = np.zeros((n_items, dim), dtype=np.float32)
+    # The projection matrix is generated in chunks of users, never whole
+    for start in range(0, n_users, chunk_size):
+        stop = min(start + chunk_size, n_users)
+        directions = rng.standard_normal((stop - start, dim), dtype=np.float32)
+        embedding += by_user[:, start:stop] @ directions
+
+    for _ in range(n_power):
+        embedding, _ = np.linalg.qr(embedding)
+        embedding = item_vectors @ (item_vectors.T @ embedding)
+    if n_power:
+        embedding, _ = np.linalg.qr(embedding)
+    return _unit_rows(embedding.astype(np.float32))
+
+
+def _spherical_kmeans(embedding, n_lists, n_iter, rng, chunk_size=65536):
+    """Cluster unit rows by cosine similarity; returns centroids and assignment"""
+    n_items = len(embedding)
+    centroids = embedding[rng.choice(n_items, n_lists, replace=False)].copy()
+    assignment = np.zeros(n_items, dtype=np.int64)
+
+    for iteration in range(n_iter + 1):
+        for start in range(0, n_items, chunk_size):
+            chunk = embedding[start:start + chunk_size]
+            assignment[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        if iteration == n_iter:
+            break
+
+        indicator = csr_matrix((np.ones(n_items, dtype=np.float32), (assignment, np.arange(n_items))),
+                               shape=(n_lists, n_items))
+        sums = indicator @ embedding
+        empty = np.asarray(indicator.sum(axis=1)).ravel() == 0
+        # Reseed empty clusters with random items
+        sums[empty] = embedding[rng.choice(n_items, int(empty.sum()), replace=False)]
+        centroids = _unit_rows(sums)
+
+    return centroids, assignment
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
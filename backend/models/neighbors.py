@@ -0,0 +1,138 @@
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+
+
+class ItemNeighborhoodIndex:
+    """Top-K most similar items per item, stored as a compact CSR matrix.
+
+    Row i holds the neighbours of item i ordered from most to least similar.
+    Only positive cosine similarities are kept and an item is never its own
+    neighbour. Indices are int32 and scores float32, so memory grows with
+    items * K instead of items^2.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self._transposed = None
+
+    @property
+    def n_items(self):
+        return self.matrix.shape[0]
+
+    @property
+    def n_neighbors(self):
+        return int(np.diff(self.matrix.indptr).max(initial=0))
+
+    @classmethod
+    def build(cls, item_user_matrix, n_neighbors=100, block_size=256, norms=None):
+        """Build the index from an items x users rating matrix.
+
+        Similarities are computed block_size rows at a time, so only a
+        block_size x items slice of the similarity matrix is ever dense.
+        norms are the items' L2 norms, computed from the matrix if omitted.
+        """
+        item_vectors = normalize_rows(csr_matrix(item_user_matrix, dtype=np.float32), norms)
+        n_items = item_vectors.shape[0]
+        counts, indices, data = _similar_rows(item_vectors, np.arange(n_items),
+                                              n_neighbors, block_size)
+
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(csr_matrix((data, indices, indptr), shape=(n_items, n_items)))
+
+    def update(self, item_user_matrix, rows, n_neighbors=100, block_size=256, norms=None):
+        """Return a new index with the neighbours of `rows` recomputed.
+
+        item_user_matrix may have more items than the index (new items must
+        be among rows). Every other row is copied unchanged, so this is exact
+        as long as rows covers all items whose similarities changed.
+        """
+        item_vectors = normalize_rows(csr_matrix(item_user_matrix, dtype=np.float32), norms)
+        n_items = item_vectors.shape[0]
+        rows = np.unique(rows)
+        new_counts, new_indices, new_data = _similar_rows(item_vectors, rows,
+                                                          n_neighbors, block_size)
+
+        # Keep the entries of rows that are not recomputed, then merge in the
+        # new rows with a stable sort so each row keeps its ranked order
+        old_counts = np.zeros(n_items, dtype=np.int64)
+        old_counts[:self.n_items] = np.diff(self.matrix.indptr)
+        old_rows = np.repeat(np.arange(n_items), old_counts)
+        keep = ~np.isin(old_rows, rows)
+
+        entry_rows = np.concatenate([old_rows[keep], np.repeat(rows, new_counts)])
+        order = np.argsort(entry_rows, kind='stable')
+        indices = np.concatenate([self.matrix.indices[keep], new_indices])[order]
+        data = np.concatenate([self.matrix.data[keep], new_data])[order]
+
+        counts = old_counts
+        counts[rows] = new_counts
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return ItemNeighborhoodIndex(csr_matrix((data, indices, indptr), shape=(n_items, n_items)))
+
+    @property
+    def transposed(self):
+        """CSR transpose of the index, used to score many users at once"""
+        if self._transposed is None:
+            self._transposed = self.matrix.T.tocsr()
+        return self._transposed
+
+    def neighbors(self, item_idx, n=None):
+        """Return the (indices, scores) of an item's neighbours, best first"""
+        start, stop = self.matrix.indptr[item_idx], self.matrix.indptr[item_idx + 1]
+        if n is not None:
+            stop = min(stop, start + n)
+        return self.matrix.indices[start:stop], self.matrix.data[start:stop]
+
+
+def top_k_per_row(block, k):
+    """Return the column indices and scores of the k largest values per row.
+
+    Each row is ordered by descending score, ties broken by column index.
+    """
+    n_rows, n_cols = block.shape
+    k = min(k, n_cols)
+    if k < n_cols:
+        cols = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    else:
+        cols = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    scores = np.take_along_axis(block, cols, axis=1)
+
+    order = np.lexsort((cols, -scores), axis=1)
+    return np.take_along_axis(cols, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def normalize_rows(matrix, norms=None):
+    """Scale every row of a sparse matrix to unit L2 norm"""
+    if norms is None:
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms = np.asarray(norms, dtype=np.float64)
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return diags(inverse.astype(matrix.dtype)) @ matrix
+
+
+def _similar_rows(item_vectors, rows, n_neighbors, block_size):
+    """Compute the ranked positive neighbours of the given rows.
+
+    item_vectors must have unit-norm rows. Returns the neighbour count per
+    row and the concatenated int32 indices and float32 scores.
+    """
+    item_vectors_t = item_vectors.T.tocsc()
+    counts = []
+    indices = [np.empty(0, dtype=np.int32)]
+    data = [np.empty(0, dtype=np.float32)]
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        block = (item_vectors[block_rows] @ item_vectors_t).toarray()
+        # An item is not its own neighbour
+        block[np.arange(len(block_rows)), block_rows] = 0
+
+        neighbors, scores = top_k_per_row(block, n_neighbors)
+        keep = scores > 0
+        counts.append(keep.sum(axis=1))
+        indices.append(neighbors[keep].astype(np.int32))
+        data.append(scores[keep].astype(np.float32))
+
+    counts = np.concatenate(counts) if counts else np.empty(0, dtype=np.int64)
+    return counts, np.concatenate(indices), np.concatenate(data)
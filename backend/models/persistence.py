@@ -0,0 +1,226 @@
+"""Versioned on-disk model format.
+
+A model is saved as a directory of versions:
+
+    <root>/CURRENT              name of the live version
+    <root>/<version>/metadata.json
+    <root>/<version>/<name>.npy  raw arrays, loaded with mmap_mode='r'
+    <root>/<version>/<name>.pkl  objects that are not arrays (joblib)
+
+Every save writes a new version directory and then replaces CURRENT with
+os.replace, so readers always see either the old or the new model in full.
+Loading memory-maps the arrays and opens the object files, whose contents
+are read on first access; a reader that has loaded a version keeps reading
+it from those open files after the directory is deleted.
+
+Saves delete the versions older than the newest `keep`, except up to
+MODEL_MAX_RETAINED (3 by default) replaced less than
+MODEL_RETENTION_SECONDS (15 minutes by default) ago, for readers that have
+read CURRENT but not yet opened its version. Frequent saves therefore keep
+at most keep + MODEL_MAX_RETAINED versions on disk.
+"""
+from datetime import datetime, timezone
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import joblib
+import numpy as np
+from scipy.sparse import csr_matrix
+
+FORMAT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+METADATA_FILE = 'metadata.json'
+
+# Seconds a replaced version may be kept for processes about to open it
+RETENTION_SECONDS = float(os.environ.get('MODEL_RETENTION_SECONDS', 15 * 60))
+# Most replaced versions kept that way, however recent
+MAX_RETAINED = int(os.environ.get('MODEL_MAX_RETAINED', 3))
+
+
+def _write_atomic(path, data):
+    """Write bytes to path through a temp file and a rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_model(root, metadata, arrays=None, objects=None, keep=2, retention=None, max_retained=None):
+    """Save a new model version under root and make it the current one.
+
+    arrays maps names to numpy arrays or scipy CSR matrices, objects maps
+    names to picklable objects. Older versions are deleted, except the
+    newest `keep` and at most `max_retained` (MAX_RETAINED by default) of
+    those replaced less than `retention` seconds ago (RETENTION_SECONDS by
+    default). Returns the version name.
+    """
+    os.makedirs(root, exist_ok=True)
+    # Zero-padded nanoseconds first, so versions sort in the order they were saved
+    version = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+
+    try:
+        sparse = {}
+        for name, array in (arrays or {}).items():
+            if isinstance(array, csr_matrix):
+                sparse[name] = list(array.shape)
+                for part in ('data', 'indices', 'indptr'):
+                    _save_array(os.path.join(staging, f'{name}.{part}.npy'), getattr(array, part))
+            else:
+                _save_array(os.path.join(staging, f'{name}.npy'), np.asarray(array))
+
+        for name, obj in (objects or {}).items():
+            joblib.dump(obj, os.path.join(staging, f'{name}.pkl'))
+
+        with open(os.path.join(staging, METADATA_FILE), 'w') as f:
+            json.dump({
+                'format_version': FORMAT_VERSION,
+                'version': version,
+                'sparse': sparse,
+                'metadata': metadata,
+            }, f, default=str)
+
+        os.rename(staging, os.path.join(root, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(root, CURRENT_FILE), version.encode())
+    _prune_versions(root, keep, RETENTION_SECONDS if retention is None else retention,
+                    MAX_RETAINED if max_retained is None else max_retained)
+    return version
+
+
+def _save_array(path, array):
+    np.save(path, array, allow_pickle=array.dtype == object)
+
+
+def _prune_versions(root, keep, retention, max_retained):
+    current = current_version(root)
+    versions = sorted(name for name in os.listdir(root)
+                      if os.path.isdir(os.path.join(root, name)) and not name.startswith('.'))
+    cutoff = time.time_ns() - retention * 1e9
+    retained = 0
+    # Newest first; a version stopped being current when the next one was saved
+    for name, successor in reversed(list(zip(versions[:-keep], versions[1:]))):
+        if name == current:
+            continue
+        if retained < max_retained and _saved_ns(successor) > cutoff:
+            retained += 1
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _saved_ns(version):
+    try:
+        return int(version.split('-')[0])
+    except ValueError:
+        return 0
+
+
+def current_version(root):
+    """Return the name of the current version, or None if nothing is saved"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_stamp(root):
+    """A cheap fingerprint of the CURRENT pointer that changes with every
+    save, or None if nothing is saved"""
+    return file_stamp(os.path.join(root, CURRENT_FILE))
+
+
+def file_stamp(path):
+    """The inode and mtime of a file, which change whenever it is replaced
+    or rewritten, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def version_time(version):
+    """Return when a version was saved, as a UTC datetime"""
+    return datetime.fromtimestamp(int(version.split('-')[0]) / 1e9, tz=timezone.utc)
+
+
+def load_model(root):
+    """Open the current model version, or return None if nothing is saved"""
+    version = current_version(root)
+    if version is None:
+        return None
+    return SavedModel(os.path.join(root, version))
+
+
+class SavedModel:
+    """A saved model version. Its arrays are memory-mapped and its object
+    files opened when it is loaded, and read on first access."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            info = json.load(f)
+        if info['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model format version {info['format_version']}")
+        self.version = info['version']
+        self.metadata = info['metadata']
+        self._sparse = info['sparse']
+        self._cache = {}
+        self._lock = threading.Lock()
+        # Held open, so the version stays readable once its directory is deleted
+        self._arrays = {}
+        self._objects = {}
+        for filename in os.listdir(path):
+            name, ext = os.path.splitext(filename)
+            if ext == '.npy':
+                self._arrays[name] = _load_array(os.path.join(path, filename))
+            elif ext == '.pkl':
+                self._objects[name] = open(os.path.join(path, filename), 'rb')
+
+    def array(self, name):
+        """Return a saved array (memory-mapped) or CSR matrix"""
+        if name not in self._cache:
+            if name in self._sparse:
+                data, indices, indptr = (self._arrays[f'{name}.{part}']
+                                         for part in ('data', 'indices', 'indptr'))
+                self._cache[name] = csr_matrix((data, indices, indptr),
+                                               shape=tuple(self._sparse[name]), copy=False)
+            else:
+                self._cache[name] = self._arrays[name]
+        return self._cache[name]
+
+    def has_array(self, name):
+        return name in self._sparse or name in self._arrays
+
+    def object(self, name):
+        """Return a saved object"""
+        with self._lock:
+            if name not in self._cache:
+                f = self._objects.pop(name)
+                with f:
+                    f.seek(0)
+                    self._cache[name] = joblib.load(f)
+            return self._cache[name]
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Object arrays (e.g. string ids) cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
@@ -1,18 +1,238 @@
+import atexit
 import numpy as np
 import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
 from scipy.sparse import csr_matrix
-import joblib
 import os
+import threading
+
+from models import persistence
+from models.catalog import ProductCatalog
+from models.factorization import ENGINES, fold_in, predict_factor_scores, train_factors, unit_rows
+from models.neighbor_search import neighbor_search_from_env
+from models.neighbors import ItemNeighborhoodIndex
+from models.scoring import predict_user_scores, top_k_indices
+from services.instrumentation import HitCounter, metrics
+from services.interactions import InteractionMatrix
+from services.recommendation_store import RecommendationStore
+
+
+class RecommenderSnapshot:
+    """One trained model version, never modified once published.
+    
+    Requests read every array of a single snapshot, so a retrain that
+    publishes a new one cannot give them a mix of two models. Members read
+    on first use (products, lookups) are derived from the snapshot alone, so
+    two threads building one at the same time get equal results.
+    """
+    def __init__(self, user_item_matrix, user_ids, product_ids, item_norms_sq, neighbor_index=None,
+                 user_factors=None, item_factors=None, engine='neighbors', model_version=None, saved=None,
+                 products=None, user_mapping=None, product_mapping=None, store_path=None,
+                 store_version=None, stale_user_ids=(), stale_product_ids=()):
+        self.user_item_matrix = user_item_matrix
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+        self.item_norms_sq = item_norms_sq  # Squared L2 norm of every product's rating column
+        # Either the item neighbourhood index or the factors of a factorization engine
+        self.neighbor_index = neighbor_index
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.engine = engine
+        self._unit_item_factors = None
+        self.model_version = model_version
+        self._saved = saved  # Saved model that lazy members are read from
+        self._products = products
+        self._catalog = None
+        self._user_mapping = user_mapping
+        self._product_mapping = product_mapping
+        self.store_path = store_path
+        self.store = None
+        self._store_stamp = None  # persistence.file_stamp of the opened store file
+        # Besides a store of this version, one materialized from store_version
+        # serves every user and product except those updated since
+        self.store_version = store_version
+        self.stale_user_ids = frozenset(stale_user_ids)
+        self.stale_product_ids = frozenset(stale_product_ids)
+        
+    @property
+    def products(self):
+        if self._products is None and self._saved is not None:
+            with metrics.timer('recommender_load'):
+                self._products = self._saved.object('products')
+        return self._products
+        
+    @property
+    def catalog(self):
+        """Product lookups, built on first use"""
+        if self._catalog is None and self.products is not None:
+            self._catalog = ProductCatalog(self.products)
+        return self._catalog
+        
+    @property
+    def user_mapping(self):
+        if self._user_mapping is None:
+            self._user_mapping = {user_id: i for i, user_id in enumerate(self.user_ids.tolist())}
+        return self._user_mapping
+        
+    @property
+    def product_mapping(self):
+        if self._product_mapping is None:
+            self._product_mapping = {product_id: i for i, product_id in enumerate(self.product_ids.tolist())}
+        return self._product_mapping
+        
+    def score_users(self, rows):
+        """Yield (candidate item indices, predicted ratings) per user row"""
+        if self.item_factors is not None:
+            return predict_factor_scores(self.user_factors[rows], self.item_factors,
+                                         self.user_item_matrix[rows])
+        return predict_user_scores(self.neighbor_index.transposed, self.user_item_matrix[rows])
+        
+    def similar_items(self, item_idx, n):
+        """Return the (indices, scores) of an item's n most similar items, best first"""
+        if self.item_factors is None:
+            return self.neighbor_index.neighbors(item_idx, n)
+            
+        if self._unit_item_factors is None:
+            self._unit_item_factors = unit_rows(self.item_factors)
+        scores = self._unit_item_factors @ self._unit_item_factors[item_idx]
+        # Like the neighbourhood index, keep positive similarities to other items
+        scores[item_idx] = 0
+        top = top_k_indices(scores, n)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+        
+    def get_store(self):
+        """Return the precomputed store, opening it once it has been written
+        and again whenever it is replaced (e.g. materialized by another
+        process), which costs one stat per call. A store materialized from
+        a version other than this one or store_version is ignored."""
+        if self.store_path:
+            stamp = persistence.file_stamp(self.store_path)
+            if stamp != self._store_stamp:
+                try:
+                    self.store = RecommendationStore.open(self.store_path) if stamp is not None else None
+                except FileNotFoundError:
+                    self.store = None
+                self._store_stamp = stamp
+        store = self.store
+        if store is not None and store.model_version not in (self.model_version, self.store_version):
+            return None
+        return store
+        
+    def stored_recommendations(self, user_id, n):
+        """Precomputed (product_ids, predicted_ratings) of a user, or None"""
+        store = self.get_store()
+        if store is None or (store.model_version != self.model_version and user_id in self.stale_user_ids):
+            return None
+        return store.recommend_for_user(user_id, n)
+        
+    def stored_similar_products(self, product_id, n):
+        """Precomputed (product_ids, similarity_scores) of a product, or None"""
+        store = self.get_store()
+        if store is None or (store.model_version != self.model_version and product_id in self.stale_product_ids):
+            return None
+        return store.similar_products(product_id, n)
+        
+    def updated(self, user_ids, product_ids):
+        """store_version and stale ids of a snapshot derived from this one by
+        an update that changed the results of the given users and products"""
+        store = self.get_store()
+        base = store.model_version if store is not None else (self.model_version or self.store_version)
+        if base is not None and base != self.model_version:
+            # Still relative to the same store, so earlier updates stay stale too
+            user_ids = self.stale_user_ids.union(user_ids)
+            product_ids = self.stale_product_ids.union(product_ids)
+        return {'store_version': base, 'stale_user_ids': user_ids, 'stale_product_ids': product_ids}
+
 
 class RenewableEnergyRecommender:
-    def __init__(self):
-        self.user_item_matrix = None
-        self.products = None
-        self.user_mapping = {}
-        self.product_mapping = {}
-        self.similarity_matrix = None
-        self.model_path = os.path.join(os.path.dirname(__file__), 'saved_models', 'recommender_model.pkl')
+    def __init__(self, n_neighbors=100, block_size=256, neighbor_search=None, engine=None, n_factors=32):
+        self._snapshot = None  # Current RecommenderSnapshot, replaced as a whole
+        self._lock = threading.RLock()  # Serializes loading, training and updates
+        self._saved_stamp = None  # persistence.current_stamp of the snapshot's version
+        self.n_neighbors = n_neighbors  # Neighbours kept per product in the similarity index
+        self.block_size = block_size  # Products per block when building the index
+        # Backend that finds each product's neighbours (see models/neighbor_search.py)
+        self.neighbor_search = neighbor_search or neighbor_search_from_env()
+        # 'neighbors' (item-item similarity) or a factorization engine ('als', 'ials', 'svd')
+        self.engine = engine or os.environ.get('RECOMMENDER_ENGINE', 'neighbors')
+        if self.engine != 'neighbors' and self.engine not in ENGINES:
+            raise ValueError(f"Unknown recommender engine {self.engine!r}")
+        self.n_factors = n_factors  # Latent factors per user and product
+        self.model_dir = os.path.join(os.path.dirname(__file__), 'saved_models', 'recommender')
+        self.store_path = os.path.join(os.path.dirname(__file__), 'saved_models', 'recommendations.bin')
+        self.store_lookups = HitCounter()  # Requests answered from the precomputed store
+        # Seconds incremental updates are batched in memory before they are saved
+        self.save_interval = float(os.environ.get('RECOMMENDER_SAVE_INTERVAL', 5))
+        self._unsaved = None  # Snapshot of incremental updates waiting to be saved
+        self._save_timer = None
+        atexit.register(self.save)
+        
+    def snapshot(self):
+        """Return the current model snapshot, loading or training it first if
+        there is none. Concurrent first calls load the model only once.
+        
+        A version saved by another process (a training job, another server
+        worker) is loaded once the CURRENT pointer changes, which costs one
+        stat per call. While incremental updates wait to be saved it is not:
+        their save replaces it, as a later save always does.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or self._saved_changed():
+            with self._lock:
+                if self._snapshot is None or self._saved_changed():
+                    if not self.load_model() and self._snapshot is None:
+                        self.train()
+                snapshot = self._snapshot
+        return snapshot
+        
+    def _saved_changed(self):
+        return self._unsaved is None and persistence.current_stamp(self.model_dir) != self._saved_stamp
+        
+    # Read-only views of the current snapshot (None before a model is loaded)
+    
+    def _current(self, name, default=None):
+        snapshot = self._snapshot
+        return getattr(snapshot, name) if snapshot is not None else default
+        
+    @property
+    def model_version(self):
+        return self._current('model_version')
+        
+    @property
+    def user_item_matrix(self):
+        return self._current('user_item_matrix')
+        
+    @property
+    def product_ids(self):
+        return self._current('product_ids')
+        
+    @property
+    def item_norms_sq(self):
+        return self._current('item_norms_sq')
+        
+    @property
+    def neighbor_index(self):
+        return self._current('neighbor_index')
+        
+    @property
+    def products(self):
+        return self._current('products')
+        
+    @property
+    def catalog(self):
+        return self._current('catalog')
+        
+    @property
+    def user_mapping(self):
+        return self._current('user_mapping', {})
+        
+    @property
+    def product_mapping(self):
+        return self._current('product_mapping', {})
+        
+    @property
+    def store(self):
+        return self._current('store')
         
     def _create_sample_data(self):
         """Create sample data for initial training since no data exists"""
@@ -52,134 +272,367 @@ class RenewableEnergyRecommender:
         return pd.DataFrame(products), pd.DataFrame(interactions)
         
     def train(self, interactions_df=None, products_df=None):
-        """Train the recommender system with user-item interactions"""
+        """Train the recommender system with user-item interactions.
+        
+        interactions_df is a frame with user_id, product_id and rating
+        columns (the ratings of a repeated pair are summed), or an
+        InteractionMatrix read by services.interactions.read_interactions.
+        """
         if interactions_df is None or products_df is None:
             products_df, interactions_df = self._create_sample_data()
         
-        self.products = products_df
+        # Writers are serialized; readers keep using the current snapshot meanwhile
+        with self._lock:
+            # Create user-item matrix, dropping ids from any previous training
+            interactions = interactions_df if isinstance(interactions_df, InteractionMatrix) \
+                else InteractionMatrix.from_frame(interactions_df)
+            user_item_matrix = interactions.matrix
         
-        # Create user-item matrix
-        for i, user_id in enumerate(np.unique(interactions_df['user_id'])):
-            self.user_mapping[user_id] = i
+            item_norms_sq = _column_norms_sq(user_item_matrix)
             
-        for i, product_id in enumerate(np.unique(interactions_df['product_id'])):
-            self.product_mapping[product_id] = i
+            neighbor_index = user_factors = item_factors = None
+            if self.engine in ENGINES:
+                user_factors, item_factors = train_factors(self.engine, user_item_matrix,
+                                                           n_factors=self.n_factors)
+            else:
+                # Keep the top-K most similar items per item, built block by block
+                neighbor_index = self.neighbor_search.build(user_item_matrix.T,
+                                                            n_neighbors=self.n_neighbors,
+                                                            block_size=self.block_size,
+                                                            norms=np.sqrt(item_norms_sq))
+        
+            # The id mappings are built from the id arrays on first use
+            self._publish(RecommenderSnapshot(
+                user_item_matrix,
+                interactions.user_ids,
+                interactions.product_ids,
+                item_norms_sq,
+                neighbor_index,
+                user_factors,
+                item_factors,
+                self.engine,
+                products=products_df
+            ))
+        
+    def add_interactions(self, interactions_df, products_df=None):
+        """Add new ratings to the trained model without a full retrain.
+        
+        A rating for a (user, product) pair that is already rated replaces
+        the old one, and a rating of 0 removes it. Only the similarity rows of products whose similarities
+        can have changed (the rated products and products co-rated with them)
+        are recomputed; with a factorization engine, the factors of the rated
+        users and products are re-solved. Returns the number of recomputed
+        products.
+        
+        The update is served at once but saved together with the updates
+        that follow within save_interval seconds (see save). With the
+        neighbourhood engine, precomputed results stay in use for every user
+        and product whose results it did not change.
+        """
+        interactions_df = pd.DataFrame(interactions_df)
+        if 'user_id' not in interactions_df.columns or 'product_id' not in interactions_df.columns \
+                or 'rating' not in interactions_df.columns:
+            raise ValueError("Interactions must contain 'user_id', 'product_id' and 'rating' columns")
+        interactions_df = interactions_df.drop_duplicates(['user_id', 'product_id'], keep='last')
+        
+        # Updates build on the latest snapshot, so they must not interleave
+        with self._lock:
+            current = self.snapshot()
             
-        # Create sparse matrix
-        rows = [self.user_mapping[user] for user in interactions_df['user_id']]
-        cols = [self.product_mapping[product] for product in interactions_df['product_id']]
-        ratings = interactions_df['rating'].values
-        
-        self.user_item_matrix = csr_matrix((ratings, (rows, cols)), 
-                                          shape=(len(self.user_mapping), len(self.product_mapping)))
-        
-        # Calculate similarity between items
-        item_similarity = cosine_similarity(self.user_item_matrix.T)
-        self.similarity_matrix = pd.DataFrame(item_similarity, 
-                                             index=list(self.product_mapping.keys()),
-                                             columns=list(self.product_mapping.keys()))
-        
-        # Save model
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        model_data = {
-            'user_item_matrix': self.user_item_matrix,
-            'products': self.products,
-            'user_mapping': self.user_mapping,
-            'product_mapping': self.product_mapping,
-            'similarity_matrix': self.similarity_matrix
+            products, catalog = current.products, current.catalog
+            if products_df is not None:
+                products = pd.concat([products, pd.DataFrame(products_df)], ignore_index=True)
+                products = products.drop_duplicates('id', keep='last').reset_index(drop=True)
+                catalog = ProductCatalog(products)
+                
+            unknown = [pid for pid in interactions_df['product_id'].unique() if pid not in catalog]
+            if unknown:
+                raise ValueError(f"Unknown product IDs: {unknown[:10]}")
+                
+            # New users and products get the next free row/column
+            user_mapping = dict(current.user_mapping)
+            product_mapping = dict(current.product_mapping)
+            for user_id in interactions_df['user_id'].unique():
+                if user_id not in user_mapping:
+                    user_mapping[user_id] = len(user_mapping)
+            for product_id in interactions_df['product_id'].unique():
+                if product_id not in product_mapping:
+                    product_mapping[product_id] = len(product_mapping)
+                    
+            rows = np.array([user_mapping[user] for user in interactions_df['user_id']])
+            cols = np.array([product_mapping[product] for product in interactions_df['product_id']])
+            ratings = interactions_df['rating'].to_numpy()
+            
+            # Replace the old ratings by adding the difference
+            shape = (len(user_mapping), len(product_mapping))
+            matrix = current.user_item_matrix.astype(np.result_type(current.user_item_matrix.dtype, ratings.dtype))
+            matrix.resize(shape)
+            old_ratings = np.asarray(matrix[rows, cols]).ravel()
+            matrix = (matrix + csr_matrix((ratings - old_ratings, (rows, cols)), shape=shape)).tocsr()
+            matrix.eliminate_zeros()
+            
+            item_norms_sq = np.zeros(shape[1])
+            item_norms_sq[:len(current.item_norms_sq)] = current.item_norms_sq
+            np.add.at(item_norms_sq, cols, ratings.astype(np.float64) ** 2 - old_ratings.astype(np.float64) ** 2)
+            
+            item_user_matrix = matrix.T.tocsr()
+            touched = np.unique(cols)
+            
+            neighbor_index = user_factors = item_factors = None
+            if current.item_factors is not None:
+                # Only the factors of the rated users and products are updated
+                affected = touched
+                user_factors = _resized(current.user_factors, shape[0])
+                item_factors = _resized(current.item_factors, shape[1])
+                fold_in(current.engine, matrix, item_user_matrix, user_factors, item_factors,
+                        np.unique(rows), touched)
+            else:
+                # Similarities change for the rated products and everything co-rated with
+                # them, before or after the update: a rating of 0 removes the pair, so
+                # the raters themselves are included
+                users = np.union1d(rows, item_user_matrix[touched].indices)
+                affected = np.union1d(touched, matrix[users].indices)
+                neighbor_index = self.neighbor_search.update(current.neighbor_index, item_user_matrix, affected,
+                                                             n_neighbors=self.n_neighbors,
+                                                             block_size=self.block_size,
+                                                             norms=np.sqrt(item_norms_sq))
+            
+            user_ids = np.array(list(user_mapping.keys()))
+            product_ids = np.array(list(product_mapping.keys()))
+            stale = {}
+            if neighbor_index is not None:
+                # The changed products' neighbours, and the scores of everyone who rated one
+                stale = current.updated(user_ids[np.union1d(rows, item_user_matrix[affected].indices)].tolist(),
+                                        product_ids[affected].tolist())
+            
+            self._publish(RecommenderSnapshot(
+                matrix,
+                user_ids,
+                product_ids,
+                item_norms_sq,
+                neighbor_index,
+                user_factors,
+                item_factors,
+                current.engine,
+                products=products,
+                user_mapping=user_mapping,
+                product_mapping=product_mapping,
+                **stale
+            ), defer=True)
+        return len(affected)
+        
+    def _publish(self, snapshot, defer=False):
+        """Make a new snapshot the current one and save it. With defer the
+        save waits up to save_interval seconds, so it covers the updates
+        published meanwhile as well."""
+        snapshot.store_path = self.store_path
+        if defer and self.save_interval > 0:
+            self._unsaved = snapshot
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_interval, self.save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+        else:
+            # A full snapshot replaces any updates still waiting to be saved
+            self._cancel_save()
+            self._save(snapshot)
+        
+        # A single reference assignment, so readers see the old or the new model
+        self._snapshot = snapshot
+        
+    def save(self):
+        """Save the incremental updates that are waiting to be saved, if any"""
+        with self._lock:
+            snapshot = self._unsaved
+            self._cancel_save()
+            if snapshot is not None:
+                self._save(snapshot)
+                
+    def _cancel_save(self):
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        self._unsaved = None
+        
+    def _save(self, snapshot):
+        arrays = {
+            'user_item_matrix': snapshot.user_item_matrix,
+            'user_ids': snapshot.user_ids,
+            'product_ids': snapshot.product_ids,
+            'item_norms_sq': snapshot.item_norms_sq
         }
-        joblib.dump(model_data, self.model_path)
+        metadata = {
+            'n_users': len(snapshot.user_ids),
+            'n_products': len(snapshot.product_ids)
+        }
+        if snapshot.item_factors is not None:
+            arrays['user_factors'] = snapshot.user_factors
+            arrays['item_factors'] = snapshot.item_factors
+            metadata.update(engine=snapshot.engine, n_factors=snapshot.item_factors.shape[1])
+        else:
+            arrays['neighbor_index'] = snapshot.neighbor_index.matrix
+            metadata.update(engine='neighbors', n_neighbors=self.n_neighbors,
+                            neighbor_search=self.neighbor_search.name,
+                            neighbor_search_params=self.neighbor_search.params())
+        if snapshot.store_version is not None:
+            # Other processes keep serving the older store for what is not stale
+            metadata['store_version'] = snapshot.store_version
+            arrays['stale_user_ids'] = np.array(list(snapshot.stale_user_ids))
+            arrays['stale_product_ids'] = np.array(list(snapshot.stale_product_ids))
+            
+        snapshot.model_version = persistence.save_model(
+            self.model_dir,
+            metadata=metadata,
+            arrays=arrays,
+            objects={'products': snapshot.products}
+        )
+        self._saved_stamp = persistence.current_stamp(self.model_dir)
+        
+    def materialize(self, width=50):
+        """Precompute the top recommendations for every user and product into
+        the memory-mapped store served by the recommendation endpoints"""
+        # The store is tagged with the model version, so pending updates are saved first
+        self.save()
+        snapshot = self.snapshot()
+        snapshot.store = RecommendationStore.materialize(snapshot, self.store_path, width=width)
+        return snapshot.store
         
     def load_model(self):
-        """Load a trained model if it exists"""
-        if os.path.exists(self.model_path):
-            model_data = joblib.load(self.model_path)
-            self.user_item_matrix = model_data['user_item_matrix']
-            self.products = model_data['products']
-            self.user_mapping = model_data['user_mapping']
-            self.product_mapping = model_data['product_mapping']
-            self.similarity_matrix = model_data['similarity_matrix']
-            return True
-        return False
+        """Load a trained model if it exists.
+        
+        Arrays are memory-mapped and the products table and id mappings are
+        only read when first needed, so loading is cheap.
+        """
+        with metrics.timer('recommender_load'):
+            stamp = persistence.current_stamp(self.model_dir)
+            saved = persistence.load_model(self.model_dir)
+            if saved is None:
+                self._saved_stamp = stamp
+                return False
+                
+            factorized = saved.has_array('item_factors')
+            snapshot = RecommenderSnapshot(
+                saved.array('user_item_matrix'),
+                saved.array('user_ids'),
+                saved.array('product_ids'),
+                saved.array('item_norms_sq'),
+                None if factorized else ItemNeighborhoodIndex(saved.array('neighbor_index')),
+                saved.array('user_factors') if factorized else None,
+                saved.array('item_factors') if factorized else None,
+                saved.metadata.get('engine', 'neighbors'),
+                model_version=saved.version,
+                saved=saved,
+                store_path=self.store_path,
+                store_version=saved.metadata.get('store_version'),
+                stale_user_ids=saved.array('stale_user_ids').tolist() if saved.has_array('stale_user_ids') else (),
+                stale_product_ids=saved.array('stale_product_ids').tolist()
+                                  if saved.has_array('stale_product_ids') else ()
+            )
+        with self._lock:
+            self._snapshot = snapshot
+            self._saved_stamp = stamp
+        return True
+        
+    def preload(self):
+        """Load (or train) the model and read everything that is otherwise
+        loaded on first use, e.g. before forking server workers"""
+        snapshot = self.snapshot()
+        snapshot.catalog
+        snapshot.user_mapping
+        snapshot.product_mapping
+        if snapshot.neighbor_index is not None:
+            snapshot.neighbor_index.transposed
+        snapshot.get_store()
         
     def get_similar_products(self, product_id, n=5):
         """Get top n similar products to a given product"""
-        if self.similarity_matrix is None:
-            if not self.load_model():
-                self.train()
-                
-        if product_id not in self.similarity_matrix.index:
-            return []
-            
-        similar_scores = self.similarity_matrix.loc[product_id].sort_values(ascending=False)
-        similar_products = similar_scores.index.tolist()[1:n+1]  # exclude the product itself
+        return self.get_similar_products_batch([product_id], n)[0]
         
-        result = []
-        for pid in similar_products:
-            product = self.products[self.products['id'] == pid].iloc[0].to_dict()
-            product['similarity_score'] = float(similar_scores[pid])
-            result.append(product)
+    def get_similar_products_batch(self, product_ids, n=5):
+        """Get top n similar products for each of the given product IDs"""
+        snapshot = self.snapshot()
+        results = []
+        for product_id in product_ids:
+            stored = snapshot.stored_similar_products(product_id, n)
+            self.store_lookups.record(stored is not None)
+            if stored is not None:
+                results.append(self._build_results(snapshot, *stored, 'similarity_score'))
+                continue
+                
+            if product_id not in snapshot.product_mapping:
+                results.append([])
+                continue
+                
+            with metrics.timer('similarity_scoring'):
+                neighbors, scores = snapshot.similar_items(snapshot.product_mapping[product_id], n)
+            results.append(self._build_results(snapshot, snapshot.product_ids[neighbors], scores,
+                                               'similarity_score'))
             
-        return result
+        return results
         
     def recommend_for_user(self, user_id, n=5):
         """Recommend top n products for a user"""
-        if self.user_item_matrix is None:
-            if not self.load_model():
-                self.train()
+        return self.recommend_for_users([user_id], n)[0]
+        
+    def recommend_for_users(self, user_ids, n=5):
+        """Recommend top n products for each of the given user IDs"""
+        snapshot = self.snapshot()
+        
+        # Serve precomputed recommendations when available, score the rest live
+        results = [None] * len(user_ids)
+        known = []
+        for i, user_id in enumerate(user_ids):
+            stored = snapshot.stored_recommendations(user_id, n)
+            self.store_lookups.record(stored is not None)
+            if stored is not None:
+                results[i] = self._build_results(snapshot, *stored, 'predicted_rating')
+            elif user_id in snapshot.user_mapping:
+                known.append(i)
+            else:
+                # For new users, return top products based on average rating
+                results[i] = snapshot.catalog.head(n)
                 
-        # For new users, return top rated products
-        if user_id not in self.user_mapping:
-            # Return top products based on average rating
-            top_products = self.products.head(n).to_dict('records')
-            return top_products
+        if not known:
+            return results
             
-        user_idx = self.user_mapping[user_id]
-        user_ratings = self.user_item_matrix[user_idx].toarray().flatten()
-        
-        # Get products the user hasn't rated yet
-        unrated_products = [pid for pid, idx in self.product_mapping.items() 
-                           if user_ratings[idx] == 0]
-        
-        # Calculate predicted ratings for unrated products
-        predicted_ratings = {}
-        for pid in unrated_products:
-            similar_scores = self.similarity_matrix.loc[pid]
-            weighted_sum = 0
-            total_weight = 0
+        # Score every unrated product for all known users at once
+        with metrics.timer('user_scoring'):
+            scored = snapshot.score_users([snapshot.user_mapping[user_ids[i]] for i in known])
+            ranked = []
+            for candidates, predicted in scored:
+                # Get top n products with highest predicted ratings
+                top = top_k_indices(predicted, n)
+                ranked.append((candidates[top], predicted[top]))
+                
+        for i, (top_candidates, top_predicted) in zip(known, ranked):
+            results[i] = self._build_results(snapshot, snapshot.product_ids[top_candidates],
+                                             top_predicted, 'predicted_rating')
             
-            for other_pid, idx in self.product_mapping.items():
-                if user_ratings[idx] > 0:  # User has rated this product
-                    weight = similar_scores[other_pid]
-                    weighted_sum += weight * user_ratings[idx]
-                    total_weight += abs(weight)
-                    
-            if total_weight > 0:
-                predicted_rating = weighted_sum / total_weight
-                predicted_ratings[pid] = predicted_rating
-        
-        # Get top n products with highest predicted ratings
-        top_products = sorted(predicted_ratings.items(), key=lambda x: x[1], reverse=True)[:n]
+        return results
         
+    def _build_results(self, snapshot, product_ids, scores, score_field):
+        """Turn ranked product IDs and scores into response dicts"""
         result = []
-        for pid, rating in top_products:
-            product = self.products[self.products['id'] == pid].iloc[0].to_dict()
-            product['predicted_rating'] = float(rating)
+        for pid, score in zip(product_ids, scores):
+            product = snapshot.catalog.get(pid)
+            product[score_field] = float(score)
             result.append(product)
-            
         return result
     
     def recommend_by_category(self, category, n=5):
         """Recommend top n products in a specific category"""
-        if self.products is None:
-            if not self.load_model():
-                self.train()
-                
-        category_products = self.products[self.products['category'] == category]
+        snapshot = self.snapshot()
         
-        if len(category_products) == 0:
-            return []
-            
-        # For simplicity, sort by efficiency and return top n
-        top_products = category_products.sort_values('efficiency', ascending=False).head(n)
-        return top_products.to_dict('records') 
+        # For simplicity, rank by efficiency and return top n
+        return snapshot.catalog.top_in_category(category, n)
+
+def _resized(factors, n_rows):
+    """Copy of a factor array with zero rows appended up to n_rows"""
+    resized = np.zeros((n_rows, factors.shape[1]), dtype=np.float32)
+    resized[:len(factors)] = factors
+    return resized
+
+
+def _column_norms_sq(matrix):
+    """Squared L2 norm of every column of a sparse matrix"""
+    return np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float64).ravel()
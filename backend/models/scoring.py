@@ -0,0 +1,66 @@
+import numpy as np
+
+# Dense users x items cells scored at a time (8 MB per float64 array)
+MAX_CHUNK_CELLS = 1 << 20
+
+
+def chunk_rows(n_items, max_cells=MAX_CHUNK_CELLS):
+    """Users to score at a time so a dense users x items chunk has at most
+    max_cells cells (at least one user)"""
+    return max(1, max_cells // max(n_items, 1))
+
+
+def top_k_indices(scores, k):
+    """Return the positions of the k highest scores, best first.
+
+    Uses argpartition so only the top k entries are sorted. Ties are broken by
+    position (lowest first), which matches a stable descending sort.
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        kth_score = scores[candidates].min()
+        # argpartition picks arbitrary members of a tie at the boundary, so
+        # rebuild the selection to keep the lowest positions among equals
+        above = np.flatnonzero(scores > kth_score)
+        ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def predict_user_scores(similarity_t, user_rows, chunk_size=None):
+    """Predict ratings for a batch of users from their sparse rating rows.
+
+    similarity_t is the transpose of an items x items sparse matrix of
+    non-negative item similarities, user_rows a users x items CSR matrix of
+    ratings (only positive ratings count as rated). Users are scored
+    chunk_size rows at a time (by default as many as chunk_rows allows for
+    the catalogue) with two sparse matrix products. Yields, per user row,
+    the candidate item indices (unrated items with a non-zero total weight)
+    and their predicted ratings.
+    """
+    chunk_size = chunk_size or chunk_rows(user_rows.shape[1])
+    ratings = user_rows.tocsr(copy=True)
+    ratings.data = np.where(ratings.data > 0, ratings.data, 0)
+    ratings.eliminate_zeros()
+    rated = ratings.copy()
+    rated.data = np.ones_like(rated.data, dtype=np.float64)
+
+    for start in range(0, ratings.shape[0], chunk_size):
+        stop = start + chunk_size
+        weighted_sum = (ratings[start:stop] @ similarity_t).toarray()
+        total_weight = (rated[start:stop] @ similarity_t).toarray()
+        unrated = rated[start:stop].toarray() == 0
+
+        for row_sum, row_weight, row_unrated in zip(weighted_sum, total_weight, unrated):
+            candidates = np.flatnonzero(row_unrated & (row_weight > 0))
+            yield candidates, row_sum[candidates] / row_weight[candidates]
@@ -0,0 +1,144 @@
+"""Rolling-origin backtests of the forecasting engines.
+
+The model is refitted on the training history up to each of n_folds
+cutoffs, step hours apart with the last one `horizon` hours before the end
+of the history, and forecasts the `horizon` hours after its cutoff:
+
+    fold 1  [train ............]  [test]
+    fold 2  [train .................]  [test]
+    fold 3  [train ......................]  [test]
+
+Forecast errors are reported per horizon step (1 to `horizon` hours ahead)
+over all folds, as MAE, RMSE and MAPE (in percent, over actual values that
+are not zero).
+
+NeuralProphet folds are trained in parallel in a process pool, one torch
+thread per worker process. Linear folds are fitted in milliseconds and run
+in this process, where calendar_cache keeps the holiday dates between folds.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+HOUR = pd.Timedelta(hours=1)
+
+
+def fold_cutoffs(ds, horizon, n_folds, step, initial):
+    """Cutoff timestamps of the folds that leave at least `initial` hours
+    of history to train on, oldest first"""
+    start, end = ds.min(), ds.max()
+    cutoffs = [end - (horizon + k * step) * HOUR for k in reversed(range(n_folds))]
+    return [cutoff for cutoff in cutoffs if cutoff - start >= initial * HOUR]
+
+
+def plan_folds(history, horizon, n_folds, step=None, initial=None):
+    """Check the backtest settings against a history frame and resolve
+    them. Returns the cleaned history, its timestamps, step, initial and
+    the fold cutoffs; raises ValueError if no fold fits."""
+    if horizon < 1 or n_folds < 1:
+        raise ValueError("horizon and n_folds must be positive")
+    step = step or horizon
+    initial = initial if initial is not None else max(7 * 24, 3 * horizon)
+    if step < 1 or initial < 0:
+        raise ValueError("step must be positive and initial not negative")
+
+    history = history.dropna().sort_values('ds', ignore_index=True)
+    ds = pd.to_datetime(history['ds'])
+    cutoffs = fold_cutoffs(ds, horizon, n_folds, step, initial) if len(history) else []
+    if not cutoffs:
+        raise ValueError(f"The history is too short for a {horizon} hour backtest "
+                         f"with at least {initial} hours of training data")
+    return history, ds, step, initial, cutoffs
+
+
+def run_backtest(history, engine, horizon=24, n_folds=5, step=None, initial=None, max_workers=None):
+    """Backtest an engine on a history frame (ds, y).
+
+    step defaults to the horizon, so test windows do not overlap, and
+    initial (the least training history of a fold, in hours) to a week or
+    three horizons, whichever is longer. Raises ValueError when the
+    history is too short for a single fold.
+    """
+    history, ds, step, initial, cutoffs = plan_folds(history, horizon, n_folds, step, initial)
+    folds = [(history[ds <= cutoff], history[(ds > cutoff) & (ds <= cutoff + horizon * HOUR)], cutoff)
+             for cutoff in cutoffs]
+    args = [(engine, train, test, cutoff, horizon) for train, test, cutoff in folds]
+
+    if engine == 'linear' or max_workers == 1 or len(folds) == 1:
+        results = [_run_fold(*fold_args) for fold_args in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(folds), max_workers or os.cpu_count()),
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker) as executor:
+            results = list(executor.map(_run_fold, *zip(*args)))
+
+    actual = np.array([fold_actual for fold_actual, _ in results])  # (folds, horizon)
+    predicted = np.array([fold_predicted for _, fold_predicted in results])
+    errors = predicted - actual
+
+    return {
+        'engine': engine,
+        'horizon': horizon,
+        'step': step,
+        'initial': initial,
+        'folds': [{
+            'cutoff': cutoff.isoformat(),
+            'train_rows': len(train),
+            'test_rows': len(test),
+            **_error_metrics(fold_errors, fold_actual)
+        } for (train, test, cutoff), fold_errors, fold_actual in zip(folds, errors, actual)],
+        'metrics': _error_metrics(errors, actual),
+        'per_step': [{'step': i + 1, **_error_metrics(errors[:, i], actual[:, i])} for i in range(horizon)]
+    }
+
+
+def _error_metrics(errors, actual):
+    """MAE, RMSE, MAPE and the number of forecasts with a known actual value
+    (None where there is none)"""
+    known = ~np.isnan(errors)
+    errors, actual = errors[known], actual[known]
+    if not len(errors):
+        return {'mae': None, 'rmse': None, 'mape': None, 'n': 0}
+    nonzero = actual != 0
+    return {
+        'mae': float(np.mean(np.abs(errors))),
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mape': float(np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100) if nonzero.any() else None,
+        'n': int(len(errors))
+    }
+
+
+def _init_worker():
+    """Set up a fold worker process"""
+    try:
+        import torch
+        # One thread per process, the pool already uses every core
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+
+def _run_fold(engine, train, test, cutoff, horizon):
+    """Fit one fold and forecast its horizon. Returns the actual and the
+    predicted values per horizon step (NaN where the history has no value)."""
+    # Imported here, models.forecaster imports this module
+    from models.forecaster import EnergyDemandForecaster
+
+    model, _ = EnergyDemandForecaster(engine=engine).fit_model(train)
+    future = model.make_future_dataframe(df=train, periods=horizon, freq='H')
+    forecast = model.predict(future)
+
+    return (_by_step(test['ds'], test['y'], cutoff, horizon),
+            _by_step(forecast['ds'], forecast['yhat1'], cutoff, horizon))
+
+
+def _by_step(ds, values, cutoff, horizon):
+    """Values placed at their horizon step after the cutoff"""
+    steps = ((pd.to_datetime(ds) - cutoff) / HOUR).to_numpy()
+    result = np.full(horizon, np.nan)
+    valid = (steps >= 1) & (steps <= horizon) & (steps == np.round(steps))
+    result[steps[valid].astype(np.int64) - 1] = np.asarray(values, dtype=np.float64)[valid]
+    return result
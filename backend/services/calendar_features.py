@@ -0,0 +1,59 @@
+"""Holiday calendar of the linear forecaster engine.
+
+Holiday dates come from the `holidays` package (installed with
+NeuralProphet) and are looked up once per year, then reused by every fit,
+prediction and backtest fold of the linear engine in this process.
+NeuralProphet derives its holiday regressors itself (add_country_holidays)
+and does not use this cache.
+"""
+import threading
+
+import pandas as pd
+
+
+class HolidayCache:
+    """Holiday dates per year, with hit/miss counters of the lookups"""
+
+    def __init__(self, country='US'):
+        self.country = country
+        self._holidays = {}  # year -> dates of that year's holidays
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def holidays(self, years):
+        """Return the holiday dates of the given years as a DatetimeIndex"""
+        dates = []
+        for year in years:
+            with self._lock:
+                cached = self._holidays.get(year)
+                if cached is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if cached is None:
+                cached = self._holidays[year] = _country_holidays(self.country, year)
+            dates.extend(cached)
+        return pd.DatetimeIndex(dates)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._holidays)
+            }
+
+
+def _country_holidays(country, year):
+    try:
+        import holidays
+    except ImportError:
+        # No holiday calendar available; every day is a working day
+        return []
+    return [pd.Timestamp(day) for day in holidays.country_holidays(country, years=year)]
+
+
+calendar_cache = HolidayCache()
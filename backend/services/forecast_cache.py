@@ -0,0 +1,91 @@
+from collections import OrderedDict
+import threading
+
+
+class LRUCache:
+    """Thread-safe LRU cache with hit/miss statistics.
+
+    The forecaster keeps one for rendered plot images and one for backtest
+    results, each keyed by model version and the request's options.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        # Called with the lock held
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+
+class ForecastCache(LRUCache):
+    """LRU cache of forecast DataFrames keyed by model version and horizon.
+
+    A request for a shorter horizon is answered by slicing a cached longer
+    forecast of the same model version, since each future row is predicted
+    independently of the horizon length.
+    """
+
+    def __init__(self, max_entries=32):
+        super().__init__(max_entries)
+
+    def get(self, model_version, periods):
+        """Return a copy of the cached forecast, or None on a miss"""
+        with self._lock:
+            key = (model_version, periods)
+            if key not in self._entries:
+                # Any longer horizon of the same model covers this request
+                key = min((k for k in self._entries if k[0] == model_version and k[1] >= periods),
+                          key=lambda k: k[1], default=None)
+            if key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            forecast = self._entries[key]
+        return forecast.iloc[:periods].copy()
+
+    def put(self, model_version, periods, forecast):
+        """Store a forecast, replacing shorter horizons it covers"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == model_version and k[1] < periods]:
+                del self._entries[key]
+            self._store((model_version, periods), forecast.copy())
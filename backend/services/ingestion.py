@@ -0,0 +1,127 @@
+"""Streaming ingestion of forecaster training data.
+
+Uploads (CSV, NDJSON or Parquet) are parsed in chunks. Each chunk is
+validated, downcast to datetime64/float32 and aggregated to the model
+frequency before the next one is read, so peak memory depends on the chunk
+size and the number of resampled periods rather than on the upload size.
+"""
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/vnd.apache.parquet': 'parquet',
+    'application/x-parquet': 'parquet',
+}
+
+AGGREGATIONS = ('mean', 'sum', 'max')
+
+
+def detect_format(content_type, filename=None):
+    """Return the upload format for a content type or file name, or None"""
+    fmt = CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+    if fmt is None and filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        fmt = {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson', 'parquet': 'parquet'}.get(extension)
+    return fmt
+
+
+def iter_chunks(stream, fmt, chunk_size=100_000):
+    """Yield DataFrame chunks of at most chunk_size rows from a binary stream"""
+    if fmt == 'csv':
+        yield from pd.read_csv(stream, chunksize=chunk_size)
+    elif fmt == 'ndjson':
+        yield from pd.read_json(stream, lines=True, chunksize=chunk_size, dtype=False)
+    elif fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet uploads require the pyarrow package")
+        if stream.seekable():
+            for batch in pq.ParquetFile(stream).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+            return
+        # The Parquet footer is at the end of the file, so spool the upload first
+        with tempfile.TemporaryFile() as spool:
+            shutil.copyfileobj(stream, spool)
+            spool.seek(0)
+            for batch in pq.ParquetFile(spool).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def _clean_chunk(chunk, by_series):
+    """Validate a chunk and downcast it, dropping rows without a valid ds and y"""
+    required = ['ds', 'y'] + (['series_id'] if by_series else [])
+    missing = [column for column in required if column not in chunk.columns]
+    if missing:
+        raise ValueError(f"Data must contain 'ds' (datetime) and 'y' (energy demand) columns "
+                         f"(missing {missing})")
+
+    cleaned = pd.DataFrame({
+        'ds': pd.to_datetime(chunk['ds'], errors='coerce'),
+        'y': pd.to_numeric(chunk['y'], errors='coerce').astype(np.float32),
+    })
+    if by_series:
+        cleaned['series_id'] = chunk['series_id'].astype(str)
+    valid = cleaned['ds'].notna() & np.isfinite(cleaned['y'])
+    return cleaned[valid], int((~valid).sum())
+
+
+def read_training_data(stream, fmt, freq='h', agg='mean', chunk_size=100_000):
+    """Read an upload into a training frame resampled to freq.
+
+    Values falling in the same period are combined with agg ('mean', 'sum'
+    or 'max'). If the first chunk has a series_id column, periods are kept
+    per series. Returns the frame (ds, y[, series_id]) and ingestion stats.
+    """
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation {agg!r}, expected one of {', '.join(AGGREGATIONS)}")
+
+    partials = None  # Per-period sum, count and max of the rows read so far
+    by_series = None
+    rows = dropped = 0
+
+    for chunk in iter_chunks(stream, fmt, chunk_size):
+        if by_series is None:
+            by_series = 'series_id' in chunk.columns
+        chunk, n_dropped = _clean_chunk(chunk, by_series)
+        rows += len(chunk)
+        dropped += n_dropped
+
+        keys = (['series_id'] if by_series else []) + ['ds']
+        chunk['ds'] = chunk['ds'].dt.floor(freq)
+        chunk['y'] = chunk['y'].astype(np.float64)  # Accumulate sums in double precision
+        grouped = chunk.groupby(keys, sort=False)['y'].agg(['sum', 'count', 'max'])
+
+        if partials is None:
+            partials = grouped
+        else:
+            # A period can span several chunks, so merge with what was read before
+            combined = pd.concat([partials, grouped])
+            partials = combined.groupby(level=keys, sort=False).agg({'sum': 'sum', 'count': 'sum', 'max': 'max'})
+
+    if partials is None or partials.empty:
+        raise ValueError("No valid rows with 'ds' and 'y' values were found")
+
+    values = partials['sum'] / partials['count'] if agg == 'mean' else partials[agg]
+    data = values.astype(np.float32).rename('y').sort_index().reset_index()
+    columns = (['series_id'] if by_series else []) + ['ds', 'y']
+
+    stats = {
+        'rows': rows,
+        'dropped_rows': dropped,
+        'periods': len(data),
+        'series': int(data['series_id'].nunique()) if by_series else 1,
+    }
+    return data[columns], stats
@@ -0,0 +1,274 @@
+"""Request latency, model phase timings and cache hit ratios.
+
+Every API request is timed into a latency histogram per endpoint, method
+and status, and code paths wrapped in `metrics.timer(phase)` (model
+loading, forecasting, scoring, serialization, plotting) into a histogram
+per phase. Registered caches report their hit and miss counters. All of
+it is rendered in the Prometheus text format by `/api/metrics`.
+
+Responses also carry a Server-Timing header with the request's phases.
+
+Slow requests can be profiled with cProfile, sampled to keep the overhead
+low (one profiled request at a time):
+
+    PROFILE_SAMPLE_RATE  share of requests profiled (0, the default, is off)
+    PROFILE_SLOW_MS      profiles of requests faster than this are dropped (500)
+    PROFILE_DIR          where .prof files are written (./profiles)
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+import cProfile
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations in seconds"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+
+    def samples(self):
+        """(le, cumulative count) per bucket, ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield (bound if bound == '+Inf' else repr(float(bound))), total
+
+
+class HitCounter:
+    """Hit/miss counters for a lookup that is not one of the LRU caches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+
+
+class Metrics:
+    """Thread-safe registry of the process's histograms and caches"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = defaultdict(self._histogram)  # (endpoint, method, status) -> Histogram
+        self._phases = defaultdict(self._histogram)  # phase -> Histogram
+        self._caches = {}  # name -> callable returning a stats() dict
+        self.profiles_written = 0
+
+    def _histogram(self):
+        return Histogram(self.buckets)
+
+    def observe_request(self, endpoint, method, status, seconds):
+        with self._lock:
+            self._requests[(endpoint, method, str(status))].observe(seconds)
+
+    def observe_phase(self, phase, seconds):
+        with self._lock:
+            self._phases[phase].observe(seconds)
+        if has_request_context():
+            g.setdefault('phase_timings', []).append((phase, seconds))
+
+    @contextmanager
+    def timer(self, phase):
+        """Time the enclosed block as one observation of `phase`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - start)
+
+    def register_cache(self, name, stats):
+        """Report a cache's hits and misses; stats returns a dict with
+        'hits' and 'misses' (and optionally 'entries')"""
+        with self._lock:
+            self._caches[name] = stats
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            requests = {key: (list(h.samples()), h.sum) for key, h in self._requests.items()}
+            phases = {key: (list(h.samples()), h.sum) for key, h in self._phases.items()}
+            caches = dict(self._caches)
+
+        lines = []
+        _histogram_family(lines, 'api_request_duration_seconds', "API request latency",
+                          ('endpoint', 'method', 'status'), requests)
+        _histogram_family(lines, 'model_phase_duration_seconds', "Time spent in model and serving phases",
+                          ('phase',), {(phase,): value for phase, value in phases.items()})
+
+        cache_stats = {name: stats() for name, stats in sorted(caches.items())}
+        for family, kind, field, help_text in (
+                ('cache_hits_total', 'counter', 'hits', "Cache lookups answered from the cache"),
+                ('cache_misses_total', 'counter', 'misses', "Cache lookups that missed"),
+                ('cache_hit_ratio', 'gauge', 'hit_ratio', "Share of cache lookups that hit"),
+                ('cache_entries', 'gauge', 'entries', "Entries held by the cache")):
+            samples = [(name, stats[field]) for name, stats in cache_stats.items() if field in stats]
+            if samples:
+                lines += [f"# HELP {family} {help_text}", f"# TYPE {family} {kind}"]
+                lines += [f'{family}{{cache="{_escape(name)}"}} {value}' for name, value in samples]
+
+        lines += ["# HELP profiles_written_total Slow request profiles written",
+                  "# TYPE profiles_written_total counter",
+                  f"profiles_written_total {self.profiles_written}"]
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_family(lines, family, help_text, label_names, histograms):
+    lines += [f"# HELP {family} {help_text}", f"# TYPE {family} histogram"]
+    for label_values, (buckets, total) in sorted(histograms.items()):
+        labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values))
+        for le, count in buckets:
+            lines.append(f'{family}_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'{family}_sum{{{labels}}} {total}')
+        lines.append(f'{family}_count{{{labels}}} {buckets[-1][1]}')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class RequestProfiler:
+    """Samples requests for cProfile and keeps the profiles of slow ones"""
+
+    def __init__(self, sample_rate=0.0, slow_ms=500, directory='profiles'):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.directory = directory
+        # cProfile cannot profile two threads' requests at once
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+                   slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 500)),
+                   directory=os.environ.get('PROFILE_DIR', 'profiles'))
+
+    def start(self):
+        """Return a running profiler if this request is sampled, else None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this process
+            self._active.release()
+            return None
+        return profiler
+
+    def finish(self, profiler, endpoint, seconds):
+        """Stop a profiler and write its stats if the request was slow"""
+        self.abort(profiler)
+        if seconds * 1000 < self.slow_ms:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = endpoint.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{seconds * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        metrics.profiles_written += 1
+        logger.warning("Slow request %s took %.0f ms, profile written to %s", endpoint, seconds * 1000, path)
+        return path
+
+    def abort(self, profiler):
+        """Stop a profiler without writing its stats"""
+        profiler.disable()
+        self._active.release()
+
+
+def init_app(app, profiler=None):
+    """Time every request of a Flask app, profile sampled slow requests and
+    serve the metrics at /api/metrics"""
+    profiler = profiler or RequestProfiler.from_env()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.profiler = profiler.start()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        seconds = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(endpoint, request.method, response.status_code, seconds)
+
+        timings = [f'{phase};dur={phase_seconds * 1000:.1f}'
+                   for phase, phase_seconds in g.pop('phase_timings', [])]
+        response.headers['Server-Timing'] = ', '.join(timings + [f'total;dur={seconds * 1000:.1f}'])
+
+        request_profiler = g.pop('profiler', None)
+        if request_profiler is not None:
+            profiler.finish(request_profiler, endpoint, seconds)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # A request that failed before after_request still releases the profiler
+        request_profiler = g.pop('profiler', None)
+        if request_profiler is not None:
+            profiler.abort(request_profiler)
+
+    @app.route('/api/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def print_profile(path, limit=30):
+    """Print the functions with the most cumulative time in a written profile"""
+    pstats.Stats(path).sort_stats('cumulative').print_stats(limit)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize a slow request profile")
+    parser.add_argument('path')
+    parser.add_argument('--limit', type=int, default=30)
+    args = parser.parse_args()
+    print_profile(args.path, args.limit)
@@ -0,0 +1,245 @@
+"""Bulk ingestion of recommender interactions.
+
+Interaction files (CSV, Parquet or NPY) with user_id, product_id and
+rating columns are read in chunks. The ids of every chunk are factorized
+into int32 codes against the ids seen so far, so all that is kept in memory
+is three compact arrays (int32 user and product codes, float32 ratings),
+about 12 bytes per interaction. Repeated (user, product) pairs are combined
+and the users x products CSR matrix is built straight from the arrays.
+
+Rows and columns of the matrix follow the sorted user and product ids.
+
+NPY files hold either a structured array with user_id, product_id and
+rating fields or a 2-D array with those three columns (integer ids are
+taken from a float array), and are memory-mapped.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+FORMATS = ('csv', 'parquet', 'npy')
+
+COLUMNS = ('user_id', 'product_id', 'rating')
+
+# How the ratings of a repeated (user, product) pair are combined
+AGGREGATIONS = ('sum', 'mean', 'max', 'last')
+
+
+def detect_format(filename):
+    """Return the interaction file format of a file name, or None"""
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return extension if extension in FORMATS else None
+
+
+class IdEncoder:
+    """Assigns int32 codes to ids in order of first appearance, a chunk at a time"""
+
+    def __init__(self):
+        self._index = None  # pd.Index of the ids seen so far, position = code
+
+    def __len__(self):
+        return 0 if self._index is None else len(self._index)
+
+    def encode(self, ids):
+        """int32 codes of an array of ids, adding the new ones"""
+        codes, uniques = pd.factorize(ids)
+        if self._index is None:
+            self._index = pd.Index(uniques)
+            return codes.astype(np.int32)
+
+        positions = self._index.get_indexer(uniques)
+        new = positions < 0
+        if new.any():
+            positions[new] = len(self._index) + np.arange(new.sum())
+            self._index = self._index.append(pd.Index(uniques[new]))
+        return positions.astype(np.int32)[codes]
+
+    def sorted_ids(self):
+        """The ids in sorted order and, per code, the id's sorted position"""
+        ids = self._index.to_numpy() if self._index is not None else np.array([], dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        rank = np.empty(len(ids), dtype=np.int32)
+        rank[order] = np.arange(len(ids), dtype=np.int32)
+        return ids[order], rank
+
+
+class InteractionMatrix:
+    """Ratings as a users x products CSR matrix, with the ids of its rows and columns"""
+
+    def __init__(self, matrix, user_ids, product_ids):
+        self.matrix = matrix
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+
+    @classmethod
+    def from_frame(cls, interactions_df, agg='sum'):
+        """Build the matrix of a frame with user_id, product_id and rating columns.
+        The ratings keep their dtype."""
+        builder = InteractionMatrixBuilder(agg, rating_dtype=None)
+        builder.add(pd.DataFrame(interactions_df))
+        return builder.build()
+
+
+class InteractionMatrixBuilder:
+    """Accumulates interaction chunks as codes and builds their matrix.
+
+    rating_dtype is the dtype ratings are stored with (None keeps the
+    chunks' own dtype).
+    """
+
+    def __init__(self, agg='sum', rating_dtype=np.float32):
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation {agg!r}, expected one of {', '.join(AGGREGATIONS)}")
+        self.agg = agg
+        self.rating_dtype = rating_dtype
+        self.users = IdEncoder()
+        self.products = IdEncoder()
+        self._chunks = []  # (user codes, product codes, ratings) per chunk
+        self.rows = 0
+        self.dropped_rows = 0
+
+    def add(self, chunk):
+        """Encode a chunk, dropping rows without both ids and a finite rating"""
+        missing = [column for column in COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Interactions must contain 'user_id', 'product_id' and 'rating' columns "
+                             f"(missing {missing})")
+
+        ratings = pd.to_numeric(chunk['rating'], errors='coerce').to_numpy()
+        if self.rating_dtype is not None:
+            ratings = ratings.astype(self.rating_dtype, copy=False)
+        valid = chunk['user_id'].notna().to_numpy() & chunk['product_id'].notna().to_numpy()
+        if ratings.dtype.kind == 'f':
+            valid &= np.isfinite(ratings)
+        if not valid.all():
+            self.dropped_rows += int((~valid).sum())
+            chunk, ratings = chunk[valid], ratings[valid]
+
+        self._chunks.append((self.users.encode(chunk['user_id'].to_numpy()),
+                             self.products.encode(chunk['product_id'].to_numpy()),
+                             ratings))
+        self.rows += len(ratings)
+
+    def build(self):
+        """The InteractionMatrix of every chunk added"""
+        user_ids, user_rank = self.users.sorted_ids()
+        product_ids, product_rank = self.products.sorted_ids()
+        rows = np.empty(self.rows, dtype=np.int32)
+        cols = np.empty(self.rows, dtype=np.int32)
+        dtype = self.rating_dtype or (np.result_type(*[chunk[2] for chunk in self._chunks])
+                                      if self._chunks else np.float64)
+        ratings = np.empty(self.rows, dtype=dtype)
+        # Codes are renumbered in id order into the joined arrays, and every
+        # chunk is released once copied
+        start = 0
+        while self._chunks:
+            users, products, chunk_ratings = self._chunks.pop(0)
+            stop = start + len(chunk_ratings)
+            rows[start:stop] = user_rank[users]
+            cols[start:stop] = product_rank[products]
+            ratings[start:stop] = chunk_ratings
+            start = stop
+            del users, products, chunk_ratings
+
+        matrix = build_csr(rows, cols, ratings, (len(user_ids), len(product_ids)), self.agg)
+        return InteractionMatrix(matrix, user_ids, product_ids)
+
+    def stats(self, interactions):
+        return {
+            'rows': self.rows,
+            'dropped_rows': self.dropped_rows,
+            'duplicates': self.rows - interactions.matrix.nnz,
+            'users': len(interactions.user_ids),
+            'products': len(interactions.product_ids),
+        }
+
+
+def build_csr(rows, cols, ratings, shape, agg='sum'):
+    """CSR matrix of (row, col, rating) triples, combining the ratings of a
+    repeated (row, col) pair with agg ('last' keeps the last one)"""
+    if agg == 'sum':
+        # scipy sums duplicates while converting, without sorting all entries
+        matrix = csr_matrix((ratings, (rows, cols)), shape=shape)
+        matrix.sum_duplicates()
+        return matrix
+
+    if not len(ratings):
+        return csr_matrix(shape, dtype=ratings.dtype)
+
+    # Sort by (row, col), keeping the input order of a pair's ratings
+    keys = rows.astype(np.int64) * shape[1] + cols
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    ratings = ratings[order]
+    del order
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+    if agg == 'max':
+        values = np.maximum.reduceat(ratings, starts)
+    elif agg == 'last':
+        values = ratings[np.r_[starts[1:], len(ratings)] - 1]
+    else:
+        values = np.add.reduceat(ratings.astype(np.float64), starts) / np.diff(np.r_[starts, len(ratings)])
+        if ratings.dtype.kind == 'f':
+            values = values.astype(ratings.dtype)
+    keys = keys[starts]
+
+    indptr = np.zeros(shape[0] + 1, dtype=np.int64 if len(keys) > np.iinfo(np.int32).max else np.int32)
+    np.cumsum(np.bincount(keys // shape[1], minlength=shape[0]), out=indptr[1:])
+    indices = (keys % shape[1]).astype(np.int32)
+    return csr_matrix((values, indices, indptr), shape=shape)
+
+
+def iter_chunks(source, fmt, chunk_size=1_000_000):
+    """Yield DataFrame chunks of at most chunk_size interactions from a file
+    path or a seekable binary file"""
+    if fmt == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_size, usecols=lambda column: column in COLUMNS)
+    elif fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet files require the pyarrow package")
+        parquet = pq.ParquetFile(source)
+        columns = [column for column in COLUMNS if column in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif fmt == 'npy':
+        array = np.load(source, mmap_mode='r' if isinstance(source, (str, os.PathLike)) else None)
+        if array.dtype.names is None and (array.ndim != 2 or array.shape[1] != len(COLUMNS)):
+            raise ValueError("NPY interactions must be a structured array with user_id, product_id "
+                             "and rating fields or a 2-D array with those three columns")
+        for start in range(0, len(array), chunk_size):
+            part = array[start:start + chunk_size]
+            if array.dtype.names is None:
+                part = np.asarray(part)
+                # Ids of a float array are whole numbers
+                ids = part[:, :2].astype(np.int64) if part.dtype.kind == 'f' else part[:, :2]
+                yield pd.DataFrame({'user_id': ids[:, 0], 'product_id': ids[:, 1], 'rating': part[:, 2]})
+            else:
+                yield pd.DataFrame({name: np.asarray(part[name]) for name in array.dtype.names})
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}")
+
+
+def read_interactions(source, fmt=None, agg='sum', chunk_size=1_000_000):
+    """Read an interaction file in chunks into an InteractionMatrix.
+
+    fmt defaults to the file extension of a path. Returns the matrix and
+    ingestion stats (rows read, rows dropped, duplicate pairs combined,
+    users and products).
+    """
+    fmt = fmt or detect_format(os.fspath(source) if isinstance(source, (str, os.PathLike)) else None)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown interaction file format, expected one of: {', '.join(FORMATS)}")
+
+    builder = InteractionMatrixBuilder(agg)
+    for chunk in iter_chunks(source, fmt, chunk_size):
+        builder.add(chunk)
+    if not builder.rows:
+        raise ValueError("No valid interactions with 'user_id', 'product_id' and 'rating' values were found")
+
+    interactions = builder.build()
+    return interactions, builder.stats(interactions)
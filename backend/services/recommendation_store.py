@@ -0,0 +1,188 @@
+"""Precomputed top-N recommendations in a memory-mapped binary file.
+
+The store is written offline from a trained recommender and read with
+np.memmap, so every serving process shares one copy of the pages and a
+lookup is a binary search plus a row slice.
+
+File layout: a HEADER_SIZE byte header (magic, format version, JSON
+description) followed by fixed-width sections, each aligned to 64 bytes:
+
+    user_keys       int64   [n_users]               sorted user ids
+    user_items      int32   [n_users, width]        positions into product_keys, -1 padded
+    user_scores     float64 [n_users, width]        predicted ratings
+    product_keys    int64   [n_products]            sorted product ids
+    product_items   int32   [n_products, width]     positions into product_keys, -1 padded
+    product_scores  float32 [n_products, width]     similarity scores
+
+Usage (from the backend directory):
+    python -m services.recommendation_store --width 50
+"""
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from models.scoring import top_k_indices
+
+MAGIC = b'RECSTORE'
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+
+def _layout(n_users, n_products, width):
+    """Return (name, dtype, shape, offset) for every section of the file"""
+    sections = [
+        ('user_keys', np.int64, (n_users,)),
+        ('user_items', np.int32, (n_users, width)),
+        ('user_scores', np.float64, (n_users, width)),
+        ('product_keys', np.int64, (n_products,)),
+        ('product_items', np.int32, (n_products, width)),
+        ('product_scores', np.float32, (n_products, width)),
+    ]
+    layout = []
+    offset = HEADER_SIZE
+    for name, dtype, shape in sections:
+        layout.append((name, dtype, shape, offset))
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += -(-size // ALIGNMENT) * ALIGNMENT
+    return layout, offset
+
+
+class RecommendationStore:
+    """Read-only view of a materialized recommendation file"""
+
+    def __init__(self, path, width, arrays, model_version=None):
+        self.path = path
+        self.width = width
+        self.arrays = arrays
+        self.model_version = model_version  # Version of the model the store was built from
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a store written by materialize"""
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a recommendation store")
+        version, length = struct.unpack_from('<II', header, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recommendation store version {version}")
+        meta = json.loads(header[len(MAGIC) + 8:len(MAGIC) + 8 + length])
+
+        layout, _ = _layout(meta['n_users'], meta['n_products'], meta['width'])
+        arrays = {}
+        for name, dtype, shape, offset in layout:
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+        return cls(path, meta['width'], arrays, meta.get('model_version'))
+
+    @classmethod
+    def materialize(cls, recommender, path, width=50, chunk_size=1024):
+        """Precompute the top `width` results for every user and product of a
+        trained model snapshot and atomically write them to path"""
+        user_keys = np.asarray(list(recommender.user_mapping.keys()), dtype=np.int64)
+        user_rows = np.asarray(list(recommender.user_mapping.values()))
+        user_order = np.argsort(user_keys, kind='stable')
+        product_keys = np.asarray(recommender.product_ids, dtype=np.int64)
+        product_order = np.argsort(product_keys, kind='stable')
+        # Model column index -> position in the sorted product_keys
+        position = np.empty(len(product_keys), dtype=np.int32)
+        position[product_order] = np.arange(len(product_keys), dtype=np.int32)
+
+        layout, size = _layout(len(user_keys), len(product_keys), width)
+        meta = json.dumps({
+            'n_users': len(user_keys),
+            'n_products': len(product_keys),
+            'width': width,
+            'model_version': recommender.model_version,
+        }).encode()
+
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(meta)) + meta)
+                f.truncate(size)
+
+            arrays = {}
+            for name, dtype, shape, offset in layout:
+                if int(np.prod(shape)) == 0:
+                    arrays[name] = np.empty(shape, dtype=dtype)
+                else:
+                    arrays[name] = np.memmap(tmp_path, dtype=dtype, mode='r+', offset=offset, shape=shape)
+
+            arrays['user_keys'][:] = user_keys[user_order]
+            arrays['user_items'][:] = -1
+            arrays['product_keys'][:] = product_keys[product_order]
+            arrays['product_items'][:] = -1
+
+            # Users are scored in chunks with the same code as live requests
+            for start in range(0, len(user_keys), chunk_size):
+                rows = user_rows[user_order[start:start + chunk_size]]
+                scored = recommender.score_users(rows)
+                for i, (candidates, predicted) in enumerate(scored, start):
+                    top = top_k_indices(predicted, width)
+                    arrays['user_items'][i, :len(top)] = position[candidates[top]]
+                    arrays['user_scores'][i, :len(top)] = predicted[top]
+
+            for i, col in enumerate(product_order):
+                neighbors, scores = recommender.similar_items(col, width)
+                arrays['product_items'][i, :len(neighbors)] = position[neighbors]
+                arrays['product_scores'][i, :len(neighbors)] = scores
+
+            for array in arrays.values():
+                if isinstance(array, np.memmap):
+                    array.flush()
+            del arrays
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return cls.open(path)
+
+    def _lookup(self, prefix, key, n):
+        if not 0 <= n <= self.width or not isinstance(key, (int, np.integer)):
+            return None
+        keys = self.arrays[f'{prefix}_keys']
+        row = np.searchsorted(keys, key)
+        if row == len(keys) or keys[row] != key:
+            return None
+
+        items = self.arrays[f'{prefix}_items'][row, :n]
+        items = items[items >= 0]
+        scores = self.arrays[f'{prefix}_scores'][row, :len(items)]
+        return self.arrays['product_keys'][items], scores
+
+    def recommend_for_user(self, user_id, n):
+        """Return (product_ids, predicted_ratings) for a user, or None when
+        the user is not in the store or n exceeds the stored width"""
+        return self._lookup('user', user_id, n)
+
+    def similar_products(self, product_id, n):
+        """Return (product_ids, similarity_scores) for a product, or None when
+        the product is not in the store or n exceeds the stored width"""
+        return self._lookup('product', product_id, n)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from models.recommender import RenewableEnergyRecommender
+
+    parser = argparse.ArgumentParser(description="Precompute recommendations for every user and product")
+    parser.add_argument('--width', type=int, default=50, help="Results stored per user and product")
+    args = parser.parse_args()
+
+    recommender = RenewableEnergyRecommender()
+    if not recommender.load_model():
+        recommender.train()
+    store = recommender.materialize(width=args.width)
+    print(f"Wrote {len(store.arrays['user_keys'])} users and "
+          f"{len(store.arrays['product_keys'])} products to {store.path}")
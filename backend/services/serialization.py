@@ -0,0 +1,61 @@
+"""Columnar JSON encoding of DataFrames.
+
+A frame is sent as one array per column instead of one object per row,
+built from the column's NumPy array. orjson is used when installed, since
+it encodes NumPy arrays natively; otherwise the standard json module is used.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def select_fields(frame, fields):
+    """Project a frame onto a comma-separated list of columns (None keeps all).
+    Raises ValueError naming any unknown column."""
+    if not fields:
+        return frame
+    columns = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in columns if name not in frame.columns]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return frame[columns]
+
+
+def to_columns(frame):
+    """Return {column: values} with one array per column.
+    Datetimes become ISO 8601 strings and missing values become null."""
+    columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            strings = np.datetime_as_string(values.to_numpy(), unit='s')
+            columns[name] = [None if pd.isna(v) else s for v, s in zip(values, strings)] \
+                if values.isna().any() else strings.tolist()
+        elif isinstance(values.dtype, np.dtype) and values.dtype.kind in 'fiu':
+            columns[name] = np.ascontiguousarray(values.to_numpy())
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            # Nullable extension dtypes
+            columns[name] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            columns[name] = [None if pd.isna(v) else v for v in values.tolist()]
+    return columns
+
+
+def dumps(payload):
+    """Encode a payload that may contain NumPy arrays to JSON bytes"""
+    if orjson is not None:
+        # orjson writes NaN as null
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_encode_default, allow_nan=False).encode()
+
+
+def _encode_default(obj):
+    if isinstance(obj, np.ndarray):
+        return [None if np.isnan(v) else v for v in obj.tolist()] if obj.dtype.kind == 'f' else obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,247 @@
+"""Background training (and NeuralProphet backtest) jobs run in a process pool.
+
+Every job has a JSON record in the jobs directory that the worker process
+updates as training progresses, so any server process can report a job's
+status. When a job finishes, the process that submitted it installs the new
+model; until then requests keep being served from the previous one.
+Records of jobs that completed or failed more than JOB_RECORD_TTL_SECONDS
+(7 days by default) ago are deleted whenever a job is submitted or finishes.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', 'saved_models', 'jobs')
+
+# Seconds the record of a finished job is kept for status requests
+RECORD_TTL_SECONDS = float(os.environ.get('JOB_RECORD_TTL_SECONDS', 7 * 24 * 3600))
+
+# Record of the job running in this worker process, used by report_progress
+_current_job = None
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _read_record(jobs_dir, job_id):
+    try:
+        with open(os.path.join(jobs_dir, f'{job_id}.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _update_record(jobs_dir, job_id, fields):
+    """Merge fields into a job record, replacing the file atomically"""
+    record = _read_record(jobs_dir, job_id) or {}
+    record.update(fields)
+    fd, tmp_path = tempfile.mkstemp(dir=jobs_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp_path, os.path.join(jobs_dir, f'{job_id}.json'))
+    return record
+
+
+def report_progress(**fields):
+    """Record progress of the job running in this process (no-op elsewhere).
+    Fields are added to those reported before, e.g. ingestion stats stay
+    while training reports its epochs."""
+    if _current_job is not None:
+        progress = (_read_record(*_current_job) or {}).get('progress', {})
+        _update_record(*_current_job, {'progress': {**progress, **fields}})
+
+
+def _run_job(jobs_dir, job_id, target, args):
+    """Entry point in the worker process"""
+    global _current_job
+    _current_job = (jobs_dir, job_id)
+    try:
+        _update_record(jobs_dir, job_id, {'status': 'running', 'started_at': _now()})
+        return target(*args)
+    finally:
+        _current_job = None
+
+
+def _prune_records(jobs_dir, ttl):
+    """Delete the records of jobs that completed or failed more than ttl
+    seconds ago. A record is last written when its job finishes, so only
+    the records modified before then are read."""
+    cutoff = time.time() - ttl
+    try:
+        names = os.listdir(jobs_dir)
+    except FileNotFoundError:
+        return
+    for name in names:
+        job_id, ext = os.path.splitext(name)
+        path = os.path.join(jobs_dir, name)
+        try:
+            if ext != '.json' or os.stat(path).st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        record = _read_record(jobs_dir, job_id)
+        if record is not None and record.get('status') in ('completed', 'failed'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class TrainingJobManager:
+    def __init__(self, jobs_dir=JOBS_DIR, max_workers=1, record_ttl=None):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self.record_ttl = RECORD_TTL_SECONDS if record_ttl is None else record_ttl
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the server's threads or locks
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def submit(self, kind, target, args=(), on_complete=None):
+        """Run target(*args) in the process pool and return the job id.
+
+        target must be a module-level function. on_complete(result) is called
+        in this process when the job succeeds.
+        """
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        _prune_records(self.jobs_dir, self.record_ttl)
+        job_id = uuid.uuid4().hex
+        _update_record(self.jobs_dir, job_id, {'job_id': job_id, 'kind': kind, 'status': 'queued',
+                                               'submitted_at': _now(), 'progress': {}})
+
+        try:
+            future = self._get_executor().submit(_run_job, self.jobs_dir, job_id, target, args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool
+            with self._lock:
+                self._executor = None
+            future = self._get_executor().submit(_run_job, self.jobs_dir, job_id, target, args)
+        future.add_done_callback(lambda f: self._finish(job_id, f, on_complete))
+        return job_id
+
+    def _finish(self, job_id, future, on_complete):
+        try:
+            result = future.result()
+            if on_complete is not None:
+                on_complete(result)
+            _update_record(self.jobs_dir, job_id, {'status': 'completed', 'finished_at': _now(),
+                                                   'result': result})
+        except Exception as e:
+            _update_record(self.jobs_dir, job_id, {'status': 'failed', 'finished_at': _now(),
+                                                   'error': str(e)})
+        _prune_records(self.jobs_dir, self.record_ttl)
+
+    def get(self, job_id):
+        """Return the job record, or None for an unknown job"""
+        if not job_id.isalnum():
+            return None
+        return _read_record(self.jobs_dir, job_id)
+
+
+def train_forecaster_job(model_dir, data):
+    """Train and save a forecaster, returning the new model version"""
+    from models.forecaster import EnergyDemandForecaster
+
+    forecaster = EnergyDemandForecaster()
+    forecaster.model_dir = model_dir
+    report_progress(stage='training')
+    forecaster.train(data, on_epoch_end=_report_epoch)
+    return forecaster.model_version
+
+
+def _report_epoch(epoch, epochs, loss):
+    report_progress(stage='training', epoch=epoch, epochs=epochs, loss=loss)
+
+
+def train_series_job(root, data):
+    """Train and save one forecaster per series, returning their metrics"""
+    from models.forecaster import MultiSeriesForecaster
+
+    series_forecaster = MultiSeriesForecaster()
+    series_forecaster.root = root
+    report_progress(stage='training', series=int(data['series_id'].nunique()))
+    return series_forecaster.train(data)
+
+
+def train_forecaster_file_job(model_dir, series_root, path, fmt, agg):
+    """Read an uploaded training file, which is deleted afterwards, and
+    train and save the forecaster, or one forecaster per series if the file
+    has a series_id column. Returns the ingestion stats with the new model
+    version or the metrics per series."""
+    from services.ingestion import read_training_data
+
+    try:
+        report_progress(stage='reading')
+        with open(path, 'rb') as f:
+            data, stats = read_training_data(f, fmt, agg=agg)
+        report_progress(stage='training', ingestion=stats)
+    finally:
+        os.remove(path)
+
+    if 'series_id' in data.columns:
+        return {'ingestion': stats, 'series': train_series_job(series_root, data)}
+    return {'ingestion': stats, 'model_version': train_forecaster_job(model_dir, data)}
+
+
+def backtest_job(model_dir, horizon, n_folds, step, initial):
+    """Backtest the forecaster saved in model_dir, returning the result"""
+    from models.forecaster import EnergyDemandForecaster
+
+    forecaster = EnergyDemandForecaster()
+    forecaster.model_dir = model_dir
+    if not forecaster.load_model():
+        raise ValueError("There is no trained forecaster to backtest")
+    report_progress(stage='backtesting', folds=n_folds)
+    return forecaster.backtest(horizon=horizon, n_folds=n_folds, step=step, initial=initial)
+
+
+def train_recommender_job(model_dir, interactions_df, products_df):
+    """Train and save a recommender, returning the new model version"""
+    from models.recommender import RenewableEnergyRecommender
+
+    recommender = RenewableEnergyRecommender()
+    recommender.model_dir = model_dir
+    report_progress(stage='training')
+    recommender.train(interactions_df, products_df)
+    return recommender.model_version
+
+
+def train_recommender_file_job(model_dir, path, fmt, agg, products_df=None):
+    """Train and save a recommender from an interaction file, which is
+    deleted afterwards. Without products_df, the products of the current
+    model are kept. Returns the new model version."""
+    from models.recommender import RenewableEnergyRecommender
+    from services.interactions import read_interactions
+
+    try:
+        recommender = RenewableEnergyRecommender()
+        recommender.model_dir = model_dir
+        if products_df is None:
+            if not recommender.load_model():
+                raise ValueError("No products were given and there is no trained model to take them from")
+            products_df = recommender.products
+
+        report_progress(stage='reading')
+        interactions, stats = read_interactions(path, fmt, agg=agg)
+        report_progress(stage='training', ingestion=stats)
+        recommender.train(interactions, products_df)
+        return recommender.model_version
+    finally:
+        os.remove(path)
+
+
+job_manager = TrainingJobManager()
@@ -0,0 +1,45 @@
+import os
+import time
+
+from api import recommender_routes
+from app import create_app, start_model_loading
+
+
+def _wait_healthy(client, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get('/api/health')
+        if response.status_code == 200:
+            return response
+        time.sleep(0.05)
+    return response
+
+
+def test_models_load_after_fork_once_started(tmp_path, monkeypatch):
+    # gunicorn.conf.py defers loading to post_fork, which starts it per worker
+    monkeypatch.setenv('LOAD_MODELS_AFTER_FORK', 'true')
+    monkeypatch.setattr(recommender_routes.recommender, 'model_dir', os.path.join(tmp_path, 'recommender'))
+    monkeypatch.setattr(recommender_routes.recommender, 'store_path', os.path.join(tmp_path, 'recommendations.bin'))
+    app = create_app(preload_models=False, services=['recommender'], warm_up=False)
+    client = app.test_client()
+    assert client.get('/api/health').status_code == 503
+
+    start_model_loading(app)
+    start_model_loading(app)
+    assert _wait_healthy(client).status_code == 200
+
+
+def test_module_level_app_is_created_once_on_first_access(monkeypatch):
+    import app as app_module
+
+    created = []
+    monkeypatch.setattr(app_module, 'create_app', lambda: created.append(object()) or created[-1])
+    monkeypatch.delitem(vars(app_module), 'app', raising=False)
+    assert not created
+
+    try:
+        assert app_module.app is created[0]
+        assert app_module.app is created[0]
+        assert len(created) == 1
+    finally:
+        vars(app_module).pop('app', None)
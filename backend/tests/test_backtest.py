@@ -0,0 +1,95 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from api import forecast_routes
+from models.forecaster import EnergyDemandForecaster
+
+
+def _forecaster(root):
+    forecaster = EnergyDemandForecaster(engine='linear')
+    forecaster.model_dir = os.path.join(root, 'forecaster')
+    forecaster.train()
+    return forecaster
+
+
+def test_cached_backtest_does_not_wait_for_a_running_one(tmp_path):
+    forecaster = _forecaster(str(tmp_path))
+    result = forecaster.backtest(horizon=12, n_folds=2)
+    # As if another backtest were running
+    with forecaster._backtest_lock:
+        assert forecaster.backtest(horizon=12, n_folds=2) is result
+
+
+class _SyncJobManager:
+    """Runs jobs in the calling thread"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, kind, target, args=(), on_complete=None):
+        self.submitted.append(kind)
+        on_complete(target(*args))
+        return f'job{len(self.submitted)}'
+
+    def get(self, job_id):
+        return None
+
+
+def test_neuralprophet_backtest_runs_as_a_job(tmp_path, monkeypatch):
+    forecaster = _forecaster(str(tmp_path))
+    # Only the routing depends on the engine; the job backtests the saved linear model
+    forecaster.snapshot().engine = 'neuralprophet'
+    jobs = _SyncJobManager()
+    monkeypatch.setattr(forecast_routes, 'forecaster', forecaster)
+    monkeypatch.setattr(forecast_routes, 'job_manager', jobs)
+    app = Flask(__name__)
+    app.register_blueprint(forecast_routes.forecast_bp, url_prefix='/api/forecast')
+    client = app.test_client()
+
+    response = client.get('/api/forecast/backtest?horizon=12&folds=2')
+    assert response.status_code == 202
+    assert response.get_json()['job_id'] == 'job1'
+
+    response = client.get('/api/forecast/backtest?horizon=12&folds=2')
+    assert response.status_code == 200
+    assert response.get_json()['backtest']['model_version'] == forecaster.model_version
+    assert jobs.submitted == ['forecaster_backtest']
+
+    assert client.get('/api/forecast/backtest?folds=0').status_code == 400
+
+
+class _SlowJobManager:
+    """Keeps every job running; submitting takes a while"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, kind, target, args=(), on_complete=None):
+        time.sleep(0.05)
+        self.submitted.append(kind)
+        return f'job{len(self.submitted)}'
+
+    def get(self, job_id):
+        return {'status': 'running'}
+
+
+def test_concurrent_requests_start_one_backtest_job(tmp_path, monkeypatch):
+    forecaster = _forecaster(str(tmp_path))
+    forecaster.snapshot().engine = 'neuralprophet'
+    jobs = _SlowJobManager()
+    monkeypatch.setattr(forecast_routes, 'forecaster', forecaster)
+    monkeypatch.setattr(forecast_routes, 'job_manager', jobs)
+    monkeypatch.setattr(forecast_routes, '_backtest_jobs', {})
+    app = Flask(__name__)
+    app.register_blueprint(forecast_routes.forecast_bp, url_prefix='/api/forecast')
+
+    def request_backtest(_):
+        return app.test_client().get('/api/forecast/backtest?horizon=12&folds=2').get_json()['job_id']
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        job_ids = set(pool.map(request_backtest, range(8)))
+    assert job_ids == {'job1'}
+    assert jobs.submitted == ['forecaster_backtest']
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from flask import Flask
+
+from api import forecast_routes
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(forecast_routes.series_forecaster, 'root', str(tmp_path))
+    app = Flask(__name__)
+    app.register_blueprint(forecast_routes.forecast_bp, url_prefix='/api/forecast')
+    return app.test_client()
+
+
+def test_unknown_series_is_not_found(client):
+    response = client.get('/api/forecast/predict?series_id=nowhere')
+    assert response.status_code == 404
+    assert response.get_json()['message'] == "No trained model for series nowhere"
+
+
+def test_key_error_inside_the_model_is_a_server_error(client, monkeypatch):
+    def forecast(*args, **kwargs):
+        raise KeyError('yhat1')
+
+    monkeypatch.setattr(forecast_routes.forecaster, 'forecast', forecast)
+    response = client.get('/api/forecast/predict')
+    assert response.status_code == 500
+    assert 'yhat1' in response.get_json()['message']
+
+
+def test_upload_is_parsed_and_trained_in_a_job(client, tmp_path, monkeypatch):
+    import time
+
+    from services.training_jobs import TrainingJobManager
+
+    monkeypatch.setenv('FORECASTER_ENGINE', 'linear')
+    jobs = TrainingJobManager(jobs_dir=str(tmp_path / 'jobs'))
+    monkeypatch.setattr(forecast_routes, 'job_manager', jobs)
+    monkeypatch.setattr(forecast_routes.forecaster, 'model_dir', str(tmp_path / 'forecaster'))
+    rows = '\n'.join(f'2024-01-{1 + h // 24:02d} {h % 24:02d}:30:00,{100 + h % 24}' for h in range(24 * 14))
+
+    response = client.post('/api/forecast/train/upload?format=csv', data=f'ds,y\n{rows}\nbad,row\n')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    for _ in range(600):
+        job = jobs.get(job_id)
+        if job['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.1)
+
+    assert job['status'] == 'completed', job.get('error')
+    assert job['progress']['ingestion']['dropped_rows'] == 1
+    assert job['result']['ingestion']['periods'] == 24 * 14
+    assert not [name for name in os.listdir(jobs.jobs_dir) if name.endswith('.csv')]
+
+
+def test_plot_validators_and_image_come_from_one_snapshot(client, tmp_path, monkeypatch):
+    from models.forecaster import EnergyDemandForecaster
+
+    forecaster = EnergyDemandForecaster(engine='linear')
+    forecaster.model_dir = str(tmp_path / 'forecaster')
+    forecaster.train()
+    monkeypatch.setattr(forecast_routes, 'forecaster', forecaster)
+    snapshots = []
+    snapshot = forecaster.snapshot
+    monkeypatch.setattr(forecaster, 'snapshot', lambda: snapshots.append(snapshot()) or snapshots[-1])
+
+    response = client.get('/api/forecast/plot?periods=12')
+    assert response.status_code == 200
+    assert response.get_etag()[0].startswith(snapshots[0].model_version)
+    assert len(snapshots) == 1
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+from models.recommender import RenewableEnergyRecommender
+
+
+def _recommender(root):
+    recommender = RenewableEnergyRecommender()
+    recommender.model_dir = os.path.join(root, 'recommender')
+    recommender.store_path = os.path.join(root, 'recommendations.bin')
+    return recommender
+
+
+def _index(recommender):
+    return recommender.neighbor_index.matrix.toarray()
+
+
+def test_removed_rating_updates_the_index_like_a_full_rebuild(tmp_path):
+    updated = _recommender(str(tmp_path / 'updated'))
+    updated.train()
+    products, interactions = updated._create_sample_data()
+    # User 1 rated products 1, 3 and 5; product 1 is also rated by user 3
+    updated.add_interactions([{'user_id': 1, 'product_id': 1, 'rating': 0}])
+
+    rebuilt = _recommender(str(tmp_path / 'rebuilt'))
+    remaining = interactions[~((interactions['user_id'] == 1) & (interactions['product_id'] == 1))]
+    rebuilt.train(remaining, products)
+
+    order = [updated.product_mapping[pid] for pid in rebuilt.product_ids]
+    np.testing.assert_allclose(_index(updated)[np.ix_(order, order)], _index(rebuilt), rtol=1e-5)
+
+
+def _versions(recommender):
+    return [name for name in os.listdir(recommender.model_dir) if name != 'CURRENT']
+
+
+def test_updates_are_served_at_once_and_saved_together(tmp_path):
+    recommender = _recommender(str(tmp_path))
+    recommender.save_interval = 60
+    recommender.train()
+    saved = _versions(recommender)
+
+    for user_id in (90, 91, 92):
+        recommender.add_interactions([{'user_id': user_id, 'product_id': 1, 'rating': 5}])
+        assert user_id in recommender.user_mapping
+    assert _versions(recommender) == saved
+
+    recommender.save()
+    assert len(_versions(recommender)) == len(saved) + 1
+    reader = _recommender(str(tmp_path))
+    assert {90, 91, 92} <= set(reader.snapshot().user_mapping)
+
+
+def test_store_keeps_serving_what_an_update_did_not_change(tmp_path):
+    recommender = _recommender(str(tmp_path))
+    recommender.train()
+    recommender.materialize(width=5)
+    # User 5 rated products 5, 7 and 10, which no rating below touches
+    recommender.add_interactions([{'user_id': 2, 'product_id': 8, 'rating': 1}])
+    snapshot = recommender.snapshot()
+
+    assert os.path.exists(recommender.store_path)
+    assert snapshot.stored_recommendations(5, 3) is not None
+    assert snapshot.stored_similar_products(7, 3) is not None
+    assert snapshot.stored_recommendations(2, 3) is None
+    assert snapshot.stored_similar_products(8, 3) is None
+
+    # Another process loading the saved update reuses the store the same way
+    recommender.save()
+    reader = _recommender(str(tmp_path)).snapshot()
+    assert reader.stored_recommendations(5, 3) is not None
+    assert reader.stored_recommendations(2, 3) is None
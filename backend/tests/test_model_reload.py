@@ -0,0 +1,62 @@
+import os
+
+from models.forecaster import EnergyDemandForecaster
+from models.recommender import RenewableEnergyRecommender
+
+
+def _recommender(root):
+    recommender = RenewableEnergyRecommender()
+    recommender.model_dir = os.path.join(root, 'recommender')
+    recommender.store_path = os.path.join(root, 'recommendations.bin')
+    return recommender
+
+
+def _forecaster(root):
+    forecaster = EnergyDemandForecaster(engine='linear')
+    forecaster.model_dir = os.path.join(root, 'forecaster')
+    return forecaster
+
+
+def test_recommender_picks_up_versions_saved_by_another_process(tmp_path):
+    # Two server workers sharing one model directory
+    writer, reader = _recommender(str(tmp_path)), _recommender(str(tmp_path))
+    writer.train()
+    assert reader.snapshot().model_version == writer.model_version
+
+    writer.add_interactions([{'user_id': 99, 'product_id': 1, 'rating': 5}])
+    writer.save()
+    assert reader.snapshot().model_version == writer.model_version
+    assert 99 in reader.snapshot().user_mapping
+
+
+def test_recommender_does_not_reload_its_own_save(tmp_path):
+    recommender = _recommender(str(tmp_path))
+    recommender.train()
+    snapshot = recommender.snapshot()
+    assert recommender.snapshot() is snapshot
+
+
+def test_forecaster_picks_up_versions_saved_by_another_process(tmp_path):
+    writer, reader = _forecaster(str(tmp_path)), _forecaster(str(tmp_path))
+    writer.train()
+    first = reader.forecast(periods=6)
+    assert reader.model_version == writer.model_version
+
+    writer.train(writer._create_sample_data(days=30))
+    assert reader.snapshot().model_version == writer.model_version
+    assert reader.forecast_cache.get(writer.model_version, 6) is None
+    assert len(reader.forecast(periods=6)) == len(first)
+
+
+def test_store_materialized_by_another_process_is_picked_up(tmp_path):
+    writer, reader = _recommender(str(tmp_path)), _recommender(str(tmp_path))
+    writer.train()
+    writer.materialize(width=5)
+    # A retrain leaves the store of the previous version on disk
+    writer.train()
+    snapshot = reader.snapshot()
+    assert snapshot.get_store() is None
+
+    writer.materialize(width=5)
+    assert snapshot.get_store() is not None
+    assert snapshot.stored_recommendations(1, 3) is not None
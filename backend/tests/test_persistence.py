@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+from models import persistence
+
+
+def _save(root, value, **kwargs):
+    return persistence.save_model(root, metadata={'value': value}, arrays={'values': np.arange(3) + value},
+                                  objects={'model': {'value': value}}, **kwargs)
+
+
+def test_replaced_version_stays_readable_after_later_saves(tmp_path):
+    root = str(tmp_path)
+    _save(root, 1)
+    # Another process opened version 1 and has not read its objects yet
+    saved = persistence.load_model(root)
+    _save(root, 2)
+    _save(root, 3)
+
+    assert saved.object('model') == {'value': 1}
+    assert list(saved.array('values')) == [1, 2, 3]
+    assert persistence.load_model(root).metadata == {'value': 3}
+
+
+def test_versions_are_pruned_after_the_retention_period(tmp_path):
+    root = str(tmp_path)
+    first = _save(root, 1)
+    second = _save(root, 2, retention=0)
+    third = _save(root, 3, retention=0)
+
+    versions = sorted(name for name in os.listdir(root) if name != persistence.CURRENT_FILE)
+    assert first not in versions
+    assert versions == [second, third]
+    assert persistence.current_version(root) == third
+
+
+def test_current_version_is_never_pruned(tmp_path):
+    root = str(tmp_path)
+    _save(root, 1)
+    latest = _save(root, 2, keep=1, retention=0)
+
+    assert persistence.current_version(root) == latest
+    assert persistence.load_model(root).object('model') == {'value': 2}
+
+
+def test_many_saves_keep_a_bounded_number_of_versions(tmp_path):
+    root = str(tmp_path)
+    for value in range(20):
+        _save(root, value, keep=2, max_retained=3)
+
+    versions = [name for name in os.listdir(root) if name != persistence.CURRENT_FILE]
+    assert len(versions) == 5
+    assert persistence.load_model(root).metadata == {'value': 19}
+
+
+def test_loaded_version_stays_readable_after_its_directory_is_deleted(tmp_path):
+    root = str(tmp_path)
+    _save(root, 1)
+    saved = persistence.load_model(root)
+    _save(root, 2, keep=1, retention=0)
+
+    assert not os.path.exists(saved.path)
+    assert saved.object('model') == {'value': 1}
+    assert list(saved.array('values')) == [1, 2, 3]
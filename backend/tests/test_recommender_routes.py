@@ -0,0 +1,19 @@
+import pytest
+from flask import Flask
+
+from api import recommender_routes
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(recommender_routes.recommender_bp, url_prefix='/api/recommender')
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path, ids', [('/similar/batch', 'product_ids'), ('/recommend/users', 'user_ids')])
+@pytest.mark.parametrize('count', [0, -1, 101, 2.5, '5', True, None])
+def test_batch_count_must_be_a_positive_int_within_the_limit(client, path, ids, count):
+    response = client.post(f'/api/recommender{path}', json={ids: [1], 'count': count})
+    assert response.status_code == 400
+    assert 'count' in response.get_json()['message']
@@ -0,0 +1,20 @@
+import numpy as np
+from scipy.sparse import random as sparse_random
+
+from models.scoring import chunk_rows, predict_user_scores
+
+
+def test_chunks_stay_within_the_cell_budget():
+    assert chunk_rows(100_000, max_cells=1 << 20) == 10
+    assert chunk_rows(10_000_000, max_cells=1 << 20) == 1
+    assert chunk_rows(0) >= 1
+
+
+def test_scores_do_not_depend_on_the_chunk_size():
+    ratings = sparse_random(50, 40, density=0.1, format='csr', random_state=0) * 5
+    similarity_t = sparse_random(40, 40, density=0.2, format='csr', random_state=1)
+
+    def scores(chunk_size):
+        return [(c.tolist(), p.tolist()) for c, p in predict_user_scores(similarity_t, ratings, chunk_size)]
+
+    assert scores(None) == scores(1) == scores(7)
@@ -0,0 +1,37 @@
+import os
+import time
+
+from services import training_jobs
+from services.training_jobs import TrainingJobManager
+
+
+def _record(jobs_dir, job_id, status, age):
+    training_jobs._update_record(jobs_dir, job_id, {'job_id': job_id, 'status': status})
+    modified = time.time() - age
+    os.utime(os.path.join(jobs_dir, f'{job_id}.json'), (modified, modified))
+
+
+def _wait_finished(jobs, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if jobs.get(job_id)['status'] in ('completed', 'failed'):
+            return
+        time.sleep(0.05)
+
+
+def test_old_records_of_finished_jobs_are_pruned(tmp_path):
+    jobs_dir = str(tmp_path)
+    jobs = TrainingJobManager(jobs_dir=jobs_dir, record_ttl=3600)
+    _record(jobs_dir, 'oldcompleted', 'completed', age=7200)
+    _record(jobs_dir, 'oldfailed', 'failed', age=7200)
+    _record(jobs_dir, 'oldrunning', 'running', age=7200)
+    _record(jobs_dir, 'recent', 'completed', age=60)
+
+    job_id = jobs.submit('test', os.getpid)
+    assert jobs.get('oldcompleted') is None
+    assert jobs.get('oldfailed') is None
+    assert jobs.get('oldrunning')['status'] == 'running'
+    assert jobs.get('recent')['status'] == 'completed'
+
+    _wait_finished(jobs, job_id)
+    assert jobs.get(job_id)['status'] == 'completed'